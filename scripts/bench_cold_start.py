@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of the first query in a fresh process, cold vs warm start.
+
+- cold: the query pays for loading the embedding model and the Chroma index,
+  as the API did before the model registry.
+- warm: the model registry is warmed first (as the FastAPI lifespan does),
+  then the first query is timed.
+
+Each run happens in a separate subprocess so nothing is shared between runs.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+QUESTION = "How do I add a stop loss with Portfolio.from_signals?"
+
+
+def child(mode, kb_id):
+    """Run inside the subprocess: time the first retrieval and print JSON timings."""
+    start = time.perf_counter()
+    from src import model_registry
+    from src.knowledge_bases import KnowledgeBaseManager
+
+    kb_config = KnowledgeBaseManager().get_knowledge_base(kb_id)
+    imported = time.perf_counter()
+
+    if mode == "warm":
+        model_registry.warm_up_models()
+        model_registry.load_index(kb_config.chroma_path, kb_config.collection_name)
+        model_registry.load_sparse_index(kb_config.chroma_path)
+        model_registry.load_symbol_index(kb_config.chroma_path)
+    warmed = time.perf_counter()
+
+    query_start = time.perf_counter()
+    index = model_registry.load_index(kb_config.chroma_path, kb_config.collection_name)
+    index.as_retriever(similarity_top_k=15).retrieve(QUESTION)
+    first_query = time.perf_counter() - query_start
+
+    print(json.dumps({
+        "imports": imported - start,
+        "warm_up": warmed - imported,
+        "first_query": first_query,
+    }))
+
+
+def run(mode, kb_id):
+    result = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--kb", kb_id],
+        capture_output=True, text=True, cwd=project_root, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm start benchmark")
+    parser.add_argument("--kb", default="vectorbt", help="Knowledge base to query")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode")
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.kb)
+        return
+
+    os.chdir(project_root)
+    for mode in ["cold", "warm"]:
+        timings = [run(mode, args.kb) for _ in range(args.runs)]
+        first_query = sorted(t["first_query"] for t in timings)[len(timings) // 2]
+        warm_up = sorted(t["warm_up"] for t in timings)[len(timings) // 2]
+        print(f"{mode:<5} first query: {first_query * 1000:8.1f} ms   (startup warm-up: {warm_up:.2f}s, median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
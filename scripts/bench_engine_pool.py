@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: requests per second on a knowledge base with and without
+the chat engine pool. A MockLLM is used so that only engine construction,
+retrieval and reranking are measured.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from llama_index.core.llms import MockLLM
+
+from src import model_registry
+from src.engine_pool import ChatEnginePool
+from src.knowledge_bases import KnowledgeBaseManager
+from src.llm_manager import EnhancedChatWrapper
+
+QUESTIONS = [
+    "How do I compute a simple moving average?",
+    "How to add a stop loss with Portfolio.from_signals?",
+    "What does rolling_split return?",
+    "How to compute the Sharpe ratio of a portfolio?",
+]
+
+
+class MockLLMManager:
+    """Minimal LLMManager returning the same MockLLM for a single configuration."""
+
+    def __init__(self):
+        self.configurations = [("mock-key", "mock-model")]
+        self.current_config = self.configurations[0]
+        self.llm = MockLLM(max_tokens=32)
+
+    def get_llm(self):
+        return self.llm
+
+
+def load_index(kb_id):
+    """Load a persisted knowledge base index from disk."""
+    kb_config = KnowledgeBaseManager().get_knowledge_base(kb_id)
+    return model_registry.load_index(kb_config.chroma_path, kb_config.collection_name)
+
+
+async def run(label, handler, requests, concurrency):
+    """Run `requests` calls of `handler` with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handler(QUESTIONS[i % len(QUESTIONS)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {requests / elapsed:8.2f} req/s  ({elapsed:.2f}s for {requests} requests)")
+    return requests / elapsed
+
+
+async def main_async(args):
+    index = load_index(args.kb)
+    llm_manager = MockLLMManager()
+    kb_manager = KnowledgeBaseManager()
+    pool = ChatEnginePool(kb_manager=kb_manager)
+    print(f"Reranker: {pool.get_reranker_kind(args.kb)}")
+
+    async def without_pool(question):
+        # Same work as the former handler: a new engine (and reranker) per request
+        engine = ChatEnginePool(kb_manager=kb_manager).build_engine(index, args.kb, llm_manager.get_llm())
+        await EnhancedChatWrapper(engine).achat(question)
+
+    async def with_pool(question):
+        with pool.lease(index, args.kb, llm_manager) as engine:
+            await EnhancedChatWrapper(engine).achat(question)
+
+    # Warm up the embedding model so it does not skew the first run
+    await with_pool(QUESTIONS[0])
+
+    baseline = await run("no pool", without_pool, args.requests, args.concurrency)
+    pooled = await run("pool", with_pool, args.requests, args.concurrency)
+    print(f"Speedup: x{pooled / baseline:.2f}  (pool stats: {pool.stats})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat engine pool")
+    parser.add_argument("--kb", default="vectorbt", help="Knowledge base to query")
+    parser.add_argument("--requests", type=int, default=50, help="Number of requests per run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests")
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
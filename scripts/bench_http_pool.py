@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: LLM call latency with a fresh OpenRouter client per request
+(new TCP/TLS connection each time) versus the shared pooled HTTP clients.
+
+Start the mock server first:
+    python scripts/mock_openai_server.py --port 8900
+    # or with TLS, trusting its certificate through SSL_CERT_FILE:
+    python scripts/mock_openai_server.py --port 8900 --ssl-certfile cert.pem --ssl-keyfile key.pem
+Then:
+    python scripts/bench_http_pool.py --base-url http://127.0.0.1:8900/v1
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from llama_index.llms.openrouter import OpenRouter
+
+from src import http_clients
+
+API_KEY = "mock-key"
+MODEL = "mock-model"
+
+
+def make_llm(base_url, pooled):
+    settings = {"model": MODEL, "api_key": API_KEY, "api_base": base_url, "max_tokens": 64}
+    if pooled:
+        settings["http_client"] = http_clients.get_sync_client(API_KEY)
+        settings["async_http_client"] = http_clients.get_async_client(API_KEY)
+    return OpenRouter(**settings)
+
+
+async def run(label, base_url, pooled, requests):
+    """Sequential requests, so that connection setup is not hidden by concurrency."""
+    latencies = []
+    shared_llm = make_llm(base_url, pooled=True) if pooled else None
+    for _ in range(requests):
+        start = time.perf_counter()
+        # Former behaviour: get_llm() built a new OpenRouter (and HTTP client) per request
+        llm = shared_llm or make_llm(base_url, pooled=False)
+        await llm.acomplete("ping")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    p50 = statistics.median(latencies)
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<8} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   ({requests} requests)")
+    return p50
+
+
+async def main_async(args):
+    # Warm-up (imports, first connection)
+    await make_llm(args.base_url, pooled=True).acomplete("ping")
+
+    fresh = await run("fresh", args.base_url, False, args.requests)
+    pooled = await run("pooled", args.base_url, True, args.requests)
+    print(f"Saved per request: {fresh - pooled:.2f} ms (p50), HTTP/2: {http_clients.HTTP2}")
+    await http_clients.aclose_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled HTTP clients against a mock server")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8900/v1", help="Mock OpenAI-compatible API")
+    parser.add_argument("--requests", type=int, default=100, help="Number of requests per run")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: reranking latency of the local cross-encoder versus the
+remote Cohere API, on the same 15 candidates retrieved from a knowledge base.
+Also reports how often both rerankers agree on the top-5.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from llama_index.core.schema import QueryBundle
+
+from src import model_registry
+from src.knowledge_bases import KnowledgeBaseManager
+from src.rerankers import build_reranker
+
+QUESTIONS = [
+    "How do I compute a simple moving average?",
+    "How to add a stop loss with Portfolio.from_signals?",
+    "What does rolling_split return?",
+    "How to compute the Sharpe ratio of a portfolio?",
+    "What is simulate_from_signal_func_nb used for?",
+    "How to use Portfolio.from_order_func with a custom order function?",
+]
+
+
+def retrieve_candidates(kb_id, top_k):
+    """Retrieve `top_k` candidates per question once, outside the timed section."""
+    kb_config = KnowledgeBaseManager().get_knowledge_base(kb_id)
+    index = model_registry.load_index(kb_config.chroma_path, kb_config.collection_name)
+    retriever = index.as_retriever(similarity_top_k=top_k)
+    return [(question, retriever.retrieve(question)) for question in QUESTIONS]
+
+
+def bench(label, reranker, candidates, rounds):
+    """Time `reranker` over all questions; returns the top-5 node ids per question."""
+    latencies = []
+    top = {}
+    for _ in range(rounds):
+        for question, nodes in candidates:
+            copies = [node.model_copy() if hasattr(node, "model_copy") else node.copy() for node in nodes]
+            start = time.perf_counter()
+            ranked = reranker.postprocess_nodes(copies, query_bundle=QueryBundle(question))
+            latencies.append((time.perf_counter() - start) * 1000)
+            top[question] = [node.node.node_id for node in ranked]
+
+    p50 = statistics.median(latencies)
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<14} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms   ({len(latencies)} reranks)")
+    return top
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local vs remote reranking")
+    parser.add_argument("--kb", default="vectorbt", help="Knowledge base to retrieve candidates from")
+    parser.add_argument("--top-k", type=int, default=15, help="Candidates per question")
+    parser.add_argument("--top-n", type=int, default=5, help="Nodes kept after reranking")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the question set")
+    args = parser.parse_args()
+
+    candidates = retrieve_candidates(args.kb, args.top_k)
+
+    local = build_reranker("cross_encoder", top_n=args.top_n)
+    # Warm-up: model load and first forward pass are not part of the per-query cost
+    local.postprocess_nodes(list(candidates[0][1]), query_bundle=QueryBundle(candidates[0][0]))
+    local_top = bench("cross_encoder", local, candidates, args.rounds)
+
+    if not os.getenv("COHERE_API_KEY"):
+        print("COHERE_API_KEY not set, skipping the remote Cohere run.")
+        return
+    remote_top = bench("cohere", build_reranker("cohere", top_n=args.top_n), candidates, args.rounds)
+
+    overlaps = [
+        len(set(local_top[q]) & set(remote_top[q])) / args.top_n for q in local_top
+    ]
+    print(f"Top-{args.top_n} agreement with Cohere: {statistics.mean(overlaps):.0%}")
+
+
+if __name__ == "__main__":
+    main()
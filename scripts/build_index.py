@@ -7,7 +7,15 @@ Using llama-index and chromadb.
 
 import os
 import sys
+import json
+import time
+import queue
+import hashlib
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -16,18 +24,38 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from llama_index.core import (
+    Document,
     SimpleDirectoryReader,
     VectorStoreIndex,
     StorageContext,
-    Settings,
+    load_index_from_storage,
 )
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.schema import MetadataMode, TextNode
+from pypdf import PdfReader
+from src.model_registry import get_embed_model
+from src.sparse_index import BM25Index, SPARSE_INDEX_FILE
+from src.symbol_index import SymbolIndex
+from src.text_cleaner import clean_extracted_text
+from src.code_chunker import PythonCodeSplitter
+
+MANIFEST_FILE = "build_manifest.json"
 
 # Load environment variables
 load_dotenv()
 
+@dataclass
+class BuildOptions:
+    """Parallelism of index builds: parse worker processes, embedding batch size and model replicas."""
+    parse_workers: int = int(os.getenv("BUILD_PARSE_WORKERS") or os.cpu_count() or 1)
+    embed_batch_size: int = int(os.getenv("BUILD_EMBED_BATCH_SIZE") or 128)
+    embed_workers: int = int(os.getenv("BUILD_EMBED_WORKERS") or 1)
+    queue_size: int = int(os.getenv("BUILD_QUEUE_SIZE") or 4)  # Node batches waiting to be embedded
+    pdf_pages_per_task: int = int(os.getenv("BUILD_PDF_PAGES_PER_TASK") or 16)
+
 # Knowledge base configurations
 KNOWLEDGE_BASES = {
     "vectorbt": {
@@ -62,183 +90,419 @@ KNOWLEDGE_BASES = {
     }
 }
 
-def setup_settings():
-    """Configure global settings for LlamaIndex."""
-    try:
-        # Use optimal chunk size for PDF content with long file paths
-        Settings.embed_model = HuggingFaceEmbedding(
-            model_name="BAAI/bge-small-en-v1.5",
-            max_length=512  # Ensure we don't exceed model limits
+def get_node_parser():
+    """
+    Node parser of the builds: Python sources are chunked per function / class,
+    other documents by sentences.
+    Builds pass it and the embedding model explicitly instead of setting the global
+    LlamaIndex `Settings`: in the API process those hold the query embedding service.
+    """
+    return PythonCodeSplitter(chunk_size=512, chunk_overlap=50)
+
+def open_collection(persist_dir, collection_name, reset=False):
+    """Open the Chroma collection of a knowledge base; `reset` drops its previous vectors."""
+    os.makedirs(persist_dir, exist_ok=True)
+    db_path = os.path.join(os.getcwd(), persist_dir)
+    chroma_client = chromadb.PersistentClient(path=db_path)
+    if reset:
+        try:
+            chroma_client.delete_collection(collection_name)
+            print(f"Dropped previous collection '{collection_name}'")
+        except Exception:
+            pass  # First build: nothing to drop
+    return chroma_client.get_or_create_collection(collection_name)
+
+def embed_nodes(nodes, batch_size, embed_pool=None):
+    """
+    Set the embedding of `nodes`, encoded in batches of `batch_size` by the shared
+    model, or spread across the model replicas of `embed_pool`.
+    """
+    model = get_embed_model()._model  # Underlying SentenceTransformer
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    # Same prompt and normalization as HuggingFaceEmbedding, so vectors match the query side
+    prompt_name = "text" if "text" in (getattr(model, "prompts", None) or {}) else None
+    normalize = getattr(get_embed_model(), "normalize", True)
+    if embed_pool is not None:
+        embeddings = model.encode_multi_process(
+            texts, embed_pool, prompt_name=prompt_name, batch_size=batch_size,
+            normalize_embeddings=normalize,
         )
-        Settings.chunk_size = 512  # Larger chunks to accommodate metadata
-        Settings.chunk_overlap = 50
-        print("✅ Configured HuggingFace embeddings with robust settings")
-    except Exception as e:
-        print(f"❌ Error setting up embeddings: {e}")
-        raise
+    else:
+        embeddings = model.encode(
+            texts, prompt_name=prompt_name, batch_size=batch_size,
+            normalize_embeddings=normalize, show_progress_bar=False,
+        )
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding.tolist()
 
-def build_index(documents, persist_dir, collection_name):
+def prefetch(iterable, maxsize):
     """
-    Build and persist a ChromaDB vector index using llama-index
+    Run `iterable` in a background thread, at most `maxsize` items ahead of the
+    consumer. Exceptions of the producer are raised in the consumer.
     """
-    print(f"Building and persisting index to {persist_dir}...")
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
     
-    # Ensure the directory exists
-    os.makedirs(persist_dir, exist_ok=True)
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put(done)
+        except BaseException as e:
+            put((None, e))
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            value, error = item
+            if error is not None:
+                raise error
+            yield value
+    finally:
+        stop.set()  # Consumer stopped early: let the producer thread exit
+
+def iter_node_batches(documents, docstore, batch_size, node_parser):
+    """Split a stream of documents into nodes, yielded in batches of `batch_size` nodes."""
+    batch = []
+    for doc in documents:
+        docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+        batch.extend(run_transformations([doc], [node_parser]))
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+class BuildRecord:
+    """
+    What a build keeps of each indexed node once its vector is stored: its ids
+    for the manifest, and its text for the BM25 index.
+    """
+    
+    def __init__(self, hashes):
+        self.entries = {path: {"hash": digest, "doc_ids": [], "node_ids": []} for path, digest in hashes.items()}
+        self.sparse_nodes = []
+    
+    def add(self, nodes):
+        for node in nodes:
+            entry = self.entries.get(file_key(node.metadata.get("file_path", "")))
+            if entry is not None:
+                if node.ref_doc_id not in entry["doc_ids"]:
+                    entry["doc_ids"].append(node.ref_doc_id)
+                entry["node_ids"].append(node.node_id)
+            # Text only: the embedding and relationships are not kept in memory
+            self.sparse_nodes.append(TextNode(id_=node.node_id, text=node.get_content(), metadata=node.metadata))
+
+def index_documents(index, documents, options, record, progress=None):
+    """
+    Streaming pipeline: documents are chunked into node batches in a background
+    thread (bounded queue), each batch is embedded and then inserted with one bulk
+    Chroma `add` on a writer thread while the next batch is embedded.
+    Documents, embeddings and node batches in flight are bounded by the queue
+    size. `record` still keeps the text of every indexed node until the BM25
+    index is written, and `update_index` loads the whole BM25 index: memory
+    grows with the text of the corpus, but not with its embeddings.
+    `progress`, if given, is called as progress(nodes_done, nodes_per_second).
+    Returns the number of indexed nodes.
+    """
+    embed_pool = None
+    if options.embed_workers > 1:
+        print(f"Starting {options.embed_workers} embedding model replicas...")
+        embed_pool = get_embed_model()._model.start_multi_process_pool(["cpu"] * options.embed_workers)
+    # One batch per replica per round trip to the pool
+    chunk = options.embed_batch_size * max(1, options.embed_workers)
+    batches = iter_node_batches(documents, index.storage_context.docstore, chunk, get_node_parser())
+    done = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+            for batch in prefetch(batches, options.queue_size):
+                embed_nodes(batch, options.embed_batch_size, embed_pool)
+                if pending is not None:
+                    pending[0].result()  # At most one batch waiting for Chroma
+                    record.add(pending[1])
+                pending = (writer.submit(index.insert_nodes, batch), batch)
+                done += len(batch)
+                rate = done / (time.perf_counter() - start)
+                print(f"  Embedded {done} nodes ({rate:.1f} nodes/s)")
+                if progress:
+                    progress(done, rate)
+            if pending is not None:
+                pending[0].result()
+                record.add(pending[1])
+    finally:
+        if embed_pool is not None:
+            get_embed_model()._model.stop_multi_process_pool(embed_pool)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Embedded and stored {done} nodes in {elapsed:.1f}s ({done / elapsed:.1f} nodes/s)")
+    return done
+
+def write_symbol_index(nodes, persist_dir):
+    """Symbol table (qualified name -> chunk ids) of the code chunks, next to the BM25 index."""
+    symbol_index = SymbolIndex.from_nodes(nodes)
+    symbol_path = symbol_index.persist(persist_dir)
+    print(f"Symbol index saved to {symbol_path} ({len(symbol_index)} symbols)")
+
+def build_index(documents, persist_dir, collection_name, record, options=None, progress=None):
+    """
+    Build and persist a ChromaDB vector index using llama-index, from a stream of documents.
+    The collection is recreated, so rebuilding never duplicates vectors.
+    Returns the number of indexed nodes.
+    """
+    options = options or BuildOptions()
+    print(f"Building and persisting index to {persist_dir}...")
     
     # Initialize ChromaDB client and specify the collection
-    db_path = os.path.join(os.getcwd(), persist_dir)
-    chroma_client = chromadb.PersistentClient(path=db_path)
-    chroma_collection = chroma_client.get_or_create_collection(collection_name) 
+    chroma_collection = open_collection(persist_dir, collection_name, reset=True)
     vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
 
     # Create StorageContext with the specific vector_store
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
     
-    # Build the index using the provided documents and storage context
-    index = VectorStoreIndex.from_documents(
-        documents,
-        storage_context=storage_context,
-        show_progress=True
-    )
+    # Empty index, filled batch by batch by the streaming pipeline
+    index = VectorStoreIndex([], storage_context=storage_context, embed_model=get_embed_model())
+    count = index_documents(index, documents, options, record, progress)
     
     # Persist the whole index (this will save Chroma's data via storage_context)
     index.storage_context.persist(persist_dir=persist_dir)
+    
+    # Sparse BM25 index next to docstore.json, for exact identifier matches
+    sparse_path = BM25Index.from_nodes(record.sparse_nodes).persist(persist_dir)
+    print(f"BM25 index saved to {sparse_path} ({count} nodes)")
+    write_symbol_index(record.sparse_nodes, persist_dir)
     print("Index built successfully.")
+    return count
+
+def without_previous_vectors(documents, vector_store):
+    """
+    Delete the Chroma vectors of each document before it is re-inserted.
+    Chroma writes are durable while the docstore, BM25 index and manifest are
+    only saved at the end of a build: a failed update leaves vectors that no
+    manifest knows about. Document ids come from the file path, so the next
+    run finds and deletes them instead of inserting duplicates.
+    """
+    for doc in documents:
+        vector_store.delete(doc.get_doc_id())
+        yield doc
 
-def load_documents_from_source(source_config):
-    """Load documents from a single source configuration."""
-    path = source_config["path"]
-    extensions = source_config["extensions"]
-    description = source_config["description"]
+def update_index(documents, persist_dir, collection_name, removed_entries, record, options=None, progress=None):
+    """
+    Apply a file-level diff to an existing index: the documents and nodes of
+    `removed_entries` (changed or deleted files) are removed from Chroma, the
+    docstore and the BM25 index, then `documents` are embedded and inserted,
+    replacing any vectors a failed previous run left for them.
+    Returns the number of inserted nodes.
+    """
+    options = options or BuildOptions()
+    print(f"Updating index in {persist_dir}...")
+    chroma_collection = open_collection(persist_dir, collection_name)
+    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store)
+    index = load_index_from_storage(storage_context=storage_context, embed_model=get_embed_model())
     
-    if not os.path.exists(path):
-        print(f"Warning: {description} directory '{path}' not found. Skipping.")
-        return []
+    removed_node_ids = set()
+    for entry in removed_entries:
+        for doc_id in entry["doc_ids"]:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        removed_node_ids.update(entry["node_ids"])
+    
+    documents = without_previous_vectors(documents, vector_store)
+    count = index_documents(index, documents, options, record, progress)
+    
+    index.storage_context.persist(persist_dir=persist_dir)
+    sparse_index = BM25Index.load(persist_dir).updated(removed_node_ids, record.sparse_nodes)
+    sparse_index.persist(persist_dir)
+    write_symbol_index(sparse_index.get_nodes(), persist_dir)
+    print(f"Index updated: {len(removed_node_ids)} nodes removed, {count} nodes added.")
+    return count
+
+def get_sources(kb_id, kb_config):
+    """Sources of a knowledge base, including the optional VectorBT codebase."""
+    sources = list(kb_config["sources"])
     
-    print(f"Loading {description} from '{path}'...")
+    # Handle additional code path for VectorBT
+    if kb_id == "vectorbt" and kb_config.get("additional_code_path"):
+        code_path = kb_config["additional_code_path"]
+        vectorbt_path = os.path.join(code_path, "vectorbt")
+        if not os.path.exists(code_path):
+            print(f"Warning: VECTORBT_CODEBASE_PATH '{code_path}' does not exist")
+        elif not os.path.exists(vectorbt_path):
+            print(f"Warning: vectorbt subdirectory not found in '{code_path}'")
+        else:
+            sources.append({
+                "path": vectorbt_path,
+                "extensions": [".py"],
+                "description": "additional VectorBT codebase",
+                "clean": False,  # Source code is indexed as is
+            })
+    return sources
+
+def file_key(path):
+    """Manifest key of a file: normalized path relative to the working directory."""
+    return os.path.relpath(os.path.abspath(path))
+
+def list_source_files(source_config):
+    """Files of a source, with the same filters as SimpleDirectoryReader (recursive, no hidden files)."""
+    files = []
+    if not os.path.exists(source_config["path"]):
+        return files
+    for root, dirs, filenames in os.walk(source_config["path"]):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for filename in sorted(filenames):
+            if not filename.startswith(".") and os.path.splitext(filename)[1] in source_config["extensions"]:
+                files.append(file_key(os.path.join(root, filename)))
+    return files
+
+def file_hash(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(persist_dir):
+    """Load the build manifest of an index, or None if the index cannot be updated incrementally."""
+    required = [MANIFEST_FILE, "docstore.json", SPARSE_INDEX_FILE]
+    if not all(os.path.exists(os.path.join(persist_dir, name)) for name in required):
+        return None
     try:
-        reader = SimpleDirectoryReader(
-            input_dir=path,
-            required_exts=extensions,
-            recursive=True,
-            exclude_hidden=True,
-        )
-        documents = reader.load_data()
-        
-        # Filter and clean documents
-        valid_documents = []
-        for doc in documents:
-            try:
-                # Check if document has valid text content
-                if hasattr(doc, 'text') and doc.text and isinstance(doc.text, str) and doc.text.strip():
-                    # Clean the text more thoroughly
-                    text = doc.text.strip()
-                    
-                    # Skip documents with null bytes
-                    if '\x00' in text:
-                        print(f"Warning: Skipping document with null bytes")
-                        continue
-                    
-                    # Skip documents that are too short or too long
-                    if len(text) < 10:
-                        print(f"Warning: Skipping document too short")
-                        continue
-                    
-                    if len(text) > 1000000:  # 1MB limit
-                        print(f"Warning: Truncating very large document")
-                        text = text[:1000000]
-                    
-                    # Clean up common PDF extraction artifacts
-                    import re
-                    
-                    # Remove image placeholders and artifacts
-                    text = re.sub(r'<image[^>]*>', '', text, flags=re.IGNORECASE)
-                    text = re.sub(r'\[image[^\]]*\]', '', text, flags=re.IGNORECASE)
-                    text = re.sub(r'Figure \d+[^\n]*\n', '', text)
-                    text = re.sub(r'Table \d+[^\n]*\n', '', text)
-                    
-                    # Clean up LaTeX artifacts
-                    text = re.sub(r'\$[^$]*\$', '[MATH]', text)  # Replace inline math
-                    text = re.sub(r'\$\$[^$]*\$\$', '[EQUATION]', text)  # Replace display math
-                    text = re.sub(r'\\[a-zA-Z]+\{[^}]*\}', '', text)  # Remove LaTeX commands
-                    text = re.sub(r'\\[a-zA-Z]+', '', text)  # Remove simple LaTeX commands
-                    
-                    # Remove excessive whitespace and control characters
-                    text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-                    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text)  # Remove control chars
-                    
-                    # Remove lines that are mostly non-alphabetic (likely artifacts)
-                    lines = text.split('\n')
-                    clean_lines = []
-                    for line in lines:
-                        line = line.strip()
-                        if len(line) > 5:  # Only check lines with some content
-                            alpha_ratio = sum(c.isalpha() for c in line) / len(line)
-                            if alpha_ratio > 0.3:  # At least 30% alphabetic characters
-                                clean_lines.append(line)
-                        elif len(line) > 0:
-                            clean_lines.append(line)
-                    
-                    text = '\n'.join(clean_lines).strip()
-                    
-                    # Final validation
-                    if len(text) < 50:  # Skip very short documents after cleaning
-                        print(f"Warning: Skipping document too short after cleaning")
-                        continue
-                    
-                    # Check for valid UTF-8 encoding
-                    try:
-                        text.encode('utf-8')
-                    except UnicodeEncodeError:
-                        print(f"Warning: Skipping document with encoding issues")
-                        continue
-                    
-                    # Check if text is mostly readable (not binary artifacts)
-                    printable_ratio = sum(c.isprintable() or c.isspace() for c in text) / len(text)
-                    if printable_ratio < 0.8:
-                        print(f"Warning: Skipping document with too many non-printable characters")
-                        continue
-                    
-                    # Final check: ensure text doesn't contain problematic sequences
-                    # that could break the tokenizer
-                    problematic_patterns = [
-                        r'[\x00-\x08\x0B\x0C\x0E-\x1F]',  # Control characters
-                        r'[\uFFFE\uFFFF]',  # Invalid Unicode
-                        r'[\uD800-\uDFFF]',  # Surrogate pairs (should be paired)
-                    ]
-                    
-                    for pattern in problematic_patterns:
-                        if re.search(pattern, text):
-                            print(f"Warning: Skipping document with problematic characters")
-                            text = None
-                            break
-                    
-                    if text is None:
-                        continue
-                    
-                    # Create a new document with cleaned text
-                    from llama_index.core import Document
-                    cleaned_doc = Document(
-                        text=text,
-                        metadata=doc.metadata if hasattr(doc, 'metadata') else {}
-                    )
-                    valid_documents.append(cleaned_doc)
-                    
-            except Exception as e:
-                print(f"Warning: Skipping problematic document: {e}")
-                continue
-        
-        print(f"✅ Loaded {len(valid_documents)} valid files from {description}")
-        return valid_documents
+        with open(os.path.join(persist_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == 1 else None
+
+def save_manifest(persist_dir, files):
+    """Persist the manifest: content hash, document ids and node ids of each indexed file."""
+    with open(os.path.join(persist_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1)
+
+def diff_manifest(previous, hashes):
+    """
+    Files added, changed (different content hash) and deleted since the build
+    recorded in `previous` (manifest files), given the current `hashes`.
+    """
+    added = [p for p in hashes if p not in previous]
+    changed = [p for p in hashes if p in previous and previous[p]["hash"] != hashes[p]]
+    deleted = [p for p in previous if p not in hashes]
+    return added, changed, deleted
+
+def clean_document(doc):
+    """
+    Clean the text of a loaded document (PDF extraction artifacts, LaTeX, control
+    characters). Returns a new document with the same id, or None if it should be skipped.
+    """
+    text, reason = clean_extracted_text(getattr(doc, "text", None))
+    if text is None:
+        print(f"Warning: Skipping document ({reason})")
+        return None
+    return Document(id_=doc.id_, text=text, metadata=doc.metadata if hasattr(doc, 'metadata') else {})
+
+def read_pdf_pages(path, start, stop):
+    """
+    Documents of pages [start, stop) of a PDF, one per page, with the ids and
+    metadata SimpleDirectoryReader gives them. Pages are extracted one at a time.
+    """
+    reader = PdfReader(path)
+    metadata = default_file_metadata_func(path)
+    labels = reader.page_labels
+    documents = []
+    for i in range(start, stop):
+        documents.append(Document(
+            id_=f"{path}_part_{i}",
+            text=reader.pages[i].extract_text(),
+            metadata={"page_label": labels[i], **metadata},
+        ))
+    return documents
+
+def parse_task(path, clean=True, start=None, stop=None):
+    """
+    Read one file, or pages [start, stop) of a PDF, and clean its documents.
+    Runs in the parse worker processes: it must stay a module-level function.
+    """
+    try:
+        if start is not None:
+            documents = read_pdf_pages(path, start, stop)
+        else:
+            documents = SimpleDirectoryReader(input_files=[path], filename_as_id=True).load_data()
     except Exception as e:
-        print(f"Warning: Could not load {description} from '{path}': {e}")
+        print(f"Warning: Could not load '{path}': {e}")
         return []
+    if not clean:
+        return documents
+    return [doc for doc in map(clean_document, documents) if doc is not None]
+
+def parse_tasks(paths, files, pages_per_task=16):
+    """
+    Parse tasks (path, clean, start, stop) of `paths`; `files` maps each path to its source.
+    PDFs are split into windows of `pages_per_task` pages, so a huge PDF never
+    sits in memory as a whole list of pages.
+    """
+    tasks = []
+    for path in paths:
+        clean = files[path].get("clean", True)
+        pages = None
+        if path.lower().endswith(".pdf"):
+            try:
+                pages = len(PdfReader(path).pages)
+            except Exception:
+                pass  # Let SimpleDirectoryReader report the error
+        if pages is None:
+            tasks.append((path, clean, None, None))
+        else:
+            tasks.extend((path, clean, start, min(start + pages_per_task, pages))
+                         for start in range(0, pages, pages_per_task))
+    return tasks
 
-def build_knowledge_base(kb_id):
-    """Build a specific knowledge base."""
-    # Always setup settings to ensure proper configuration
-    setup_settings()
+def iter_documents(tasks, pool=None, max_pending=8, on_task_done=None):
+    """
+    Yield the cleaned documents of `tasks`, in order. With a process `pool`, at most
+    `max_pending` tasks are parsed ahead of the consumer.
+    """
+    pending = deque()
+    for task in tasks:
+        if pool is None:
+            yield from parse_task(*task)
+        else:
+            pending.append(pool.submit(parse_task, *task))
+            if len(pending) < max_pending:
+                continue
+            yield from pending.popleft().result()
+        if on_task_done:
+            on_task_done()
+    while pending:
+        yield from pending.popleft().result()
+        if on_task_done:
+            on_task_done()
+
+def build_knowledge_base(kb_id, progress=None, full=False, options=None):
+    """
+    Build a specific knowledge base.
+    Only files added, changed or deleted since the last build (according to the
+    build manifest) are re-embedded, unless `full` is set.
+    `options` sets the build parallelism (BuildOptions from the environment by default).
+    `progress`, if given, is called as progress(fraction, message) at each stage.
+    """
+    options = options or BuildOptions()
+    def report(fraction, message):
+        if progress:
+            progress(fraction, message)
     
     if kb_id not in KNOWLEDGE_BASES:
         print(f"❌ Error: Unknown knowledge base '{kb_id}'")
@@ -250,54 +514,72 @@ def build_knowledge_base(kb_id):
     print(f"Building {kb_config['name']}")
     print(f"{'='*60}")
     
-    all_documents = []
+    persist_dir = kb_config["chroma_path"]
     
-    # Load documents from all sources
-    for source in kb_config["sources"]:
-        documents = load_documents_from_source(source)
-        all_documents.extend(documents)
+    # Hash every source file to find what changed since the last build
+    sources = get_sources(kb_id, kb_config)
+    files = {}  # file -> source
+    for source in sources:
+        for path in list_source_files(source):
+            files.setdefault(path, source)
+    report(0.05, f"Hashing {len(files)} files")
+    hashes = {path: file_hash(path) for path in files}
     
-    # Handle additional code path for VectorBT
-    if kb_id == "vectorbt" and kb_config.get("additional_code_path"):
-        code_path = kb_config["additional_code_path"]
-        if os.path.exists(code_path):
-            vectorbt_path = os.path.join(code_path, "vectorbt")
-            if os.path.exists(vectorbt_path):
-                print(f"Loading additional VectorBT codebase from '{vectorbt_path}'...")
-                try:
-                    code_reader = SimpleDirectoryReader(
-                        input_dir=vectorbt_path,
-                        required_exts=[".py"],
-                        recursive=True,
-                        exclude_hidden=True,
-                    )
-                    additional_docs = code_reader.load_data()
-                    all_documents.extend(additional_docs)
-                    print(f"✅ Loaded {len(additional_docs)} additional code files")
-                except Exception as e:
-                    print(f"Warning: Could not load from '{vectorbt_path}': {e}")
-            else:
-                print(f"Warning: vectorbt subdirectory not found in '{code_path}'")
-        else:
-            print(f"Warning: VECTORBT_CODEBASE_PATH '{code_path}' does not exist")
+    manifest = None if full else load_manifest(persist_dir)
+    if manifest is None:
+        print("Full build" + (" (requested)" if full else " (no previous build manifest)"))
+        to_load = list(files)
+        removed = []
+    else:
+        previous = manifest["files"]
+        added, changed, deleted = diff_manifest(previous, hashes)
+        print(f"Incremental build: {len(added)} added, {len(changed)} changed, {len(deleted)} deleted files")
+        if not (added or changed or deleted):
+            print(f"\n✅ {kb_config['name']} is up to date.")
+            report(1.0, "Index up to date")
+            return True
+        to_load = added + changed
+        removed = [previous[p] for p in changed + deleted]
     
-    if not all_documents:
+    if manifest is None and not to_load:
         print("❌ Error: No documents found to index. Aborting.")
         return False
     
-    print(f"\n📊 Total documents to be indexed: {len(all_documents)}")
+    # Files are parsed and cleaned in worker processes, then streamed to the index
+    tasks = parse_tasks(to_load, files, options.pdf_pages_per_task)
+    print(f"\n📊 Files to be indexed: {len(to_load)} ({len(tasks)} parse tasks)")
+    report(0.1, f"Indexing {len(to_load)} files")
+    record = BuildRecord({p: hashes[p] for p in to_load})
+    tasks_done = [0]
+    
+    def task_done():
+        tasks_done[0] += 1
+    
+    def embed_progress(nodes_done, rate):
+        report(0.1 + 0.85 * tasks_done[0] / max(1, len(tasks)), f"Indexed {nodes_done} chunks ({rate:.0f} nodes/s)")
     
-    # Build the index
+    parse_pool = None
+    if options.parse_workers > 1 and len(tasks) > 1:
+        parse_pool = ProcessPoolExecutor(max_workers=min(options.parse_workers, len(tasks)))
+    
+    # Build the index, or apply the diff to the existing one
     try:
-        build_index(
-            all_documents, 
-            kb_config["chroma_path"], 
-            kb_config["collection_name"]
-        )
+        documents = iter_documents(tasks, parse_pool, 2 * options.parse_workers, task_done)
+        if manifest is None:
+            build_index(documents, persist_dir, kb_config["collection_name"], record, options, embed_progress)
+            entries = record.entries
+        else:
+            update_index(
+                documents, persist_dir, kb_config["collection_name"], removed, record, options, embed_progress
+            )
+            entries = {p: e for p, e in manifest["files"].items() if p in hashes}
+            entries.update(record.entries)
+        save_manifest(persist_dir, entries)
         
         print(f"\n✅ {kb_config['name']} index built successfully!")
-        print(f"📁 Index saved to: {kb_config['chroma_path']}")
+        print(f"📁 Index saved to: {persist_dir}")
         print(f"🔍 Collection: {kb_config['collection_name']}")
+        report(1.0, "Index built")
         return True
         
     except Exception as e:
@@ -305,6 +587,9 @@ def build_knowledge_base(kb_id):
         import traceback
         traceback.print_exc()
         return False
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
 
 def main():
     """
@@ -318,6 +603,7 @@ Examples:
   python scripts/build_index.py vectorbt           # Build VectorBT index
   python scripts/build_index.py trading_papers     # Build trading papers index
   python scripts/build_index.py --all              # Build all available indices
+  python scripts/build_index.py vectorbt --full    # Rebuild from scratch
   python scripts/build_index.py --list             # List available knowledge bases
         """
     )
@@ -337,11 +623,37 @@ Examples:
         action="store_true",
         help="List available knowledge bases"
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild from scratch instead of re-embedding only changed files"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BuildOptions.parse_workers,
+        help="Processes parsing and cleaning documents (default: BUILD_PARSE_WORKERS or CPU count)"
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=BuildOptions.embed_batch_size,
+        help="Chunks per embedding batch (default: BUILD_EMBED_BATCH_SIZE or 128)"
+    )
+    parser.add_argument(
+        "--embed-workers",
+        type=int,
+        default=BuildOptions.embed_workers,
+        help="Embedding model replicas, one process each; set OMP_NUM_THREADS to "
+             "cores / replicas to avoid oversubscription (default: BUILD_EMBED_WORKERS or 1)"
+    )
     
     args = parser.parse_args()
-    
-    # Setup global settings
-    setup_settings()
+    options = BuildOptions(
+        parse_workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        embed_workers=args.embed_workers,
+    )
     
     if args.list:
         print("Available Knowledge Bases:")
@@ -357,7 +669,7 @@ Examples:
         print("🚀 Building all knowledge bases...")
         success_count = 0
         for kb_id in KNOWLEDGE_BASES.keys():
-            if build_knowledge_base(kb_id):
+            if build_knowledge_base(kb_id, full=args.full, options=options):
                 success_count += 1
         
         print(f"\n{'='*60}")
@@ -372,7 +684,7 @@ Examples:
         sys.exit(1)
     
     # Build specific knowledge base
-    if build_knowledge_base(args.knowledge_base):
+    if build_knowledge_base(args.knowledge_base, full=args.full, options=options):
         print(f"\n🚀 You can now use the '{args.knowledge_base}' knowledge base!")
     else:
         sys.exit(1)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Load test: requests per second of the API against worker count.
+
+For each worker count, starts `src/serve.py` on a local port with the LLM
+pointed at the mock OpenAI-compatible server (started here too), warms it up,
+then keeps `--concurrency` requests in flight for `--duration` seconds. The LLM
+answers after a fixed latency, so the measured throughput is bounded by what
+the API itself does per request (embedding, retrieval, reranking, prompt).
+
+The knowledge base must be built first (python scripts/build_index.py).
+
+Usage:
+    python scripts/load_test.py --workers 1,2,4 --kb vectorbt --concurrency 32
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+
+QUESTIONS = [
+    "How do I add a stop loss with Portfolio.from_signals?",
+    "How do I compute the Sharpe ratio of a portfolio?",
+    "What does the init_cash parameter do?",
+    "How can I run a parameter sweep over moving average windows?",
+]
+CODE = "import vectorbt as vbt\n\nprice = vbt.YFData.download('BTC-USD').get('Close')\n"
+
+
+def start_process(args, env=None):
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=project_root, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def stop_process(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def server_env(mock_port):
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_API_BASE": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENROUTER_API_KEY_1": "mock-key",
+        "OPENROUTER_MODELS": "mock-model",
+        # No client-side rate limit against the mock server
+        "OPENROUTER_RPM": "1000000",
+        "OPENROUTER_BURST": "10000",
+        # Every request goes through retrieval and the LLM
+        "ANSWER_CACHE_PATH": "",
+        "ANSWER_CACHE_THRESHOLD": "2",
+    })
+    return env
+
+
+async def wait_until_ready(client, base_url, kb_id, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get(f"{base_url}/knowledge-bases")
+            if response.status_code == 200:
+                status = {kb["id"]: kb["status"] for kb in response.json()["knowledge_bases"]}
+                if status.get(kb_id) == "ready":
+                    return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(1)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+async def send(client, base_url, kb_id, i):
+    """One request; a new session per request so histories do not grow."""
+    data = {"question": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "session_id": f"load-{i}"}
+    if kb_id == "code_review":
+        data["code"] = CODE
+        return await client.post(f"{base_url}/review/code", data=data)
+    return await client.post(f"{base_url}/query/{kb_id}", data=data)
+
+
+async def run_load(base_url, kb_id, concurrency, duration):
+    latencies = []
+    errors = 0
+    counter = iter(range(10 ** 9))
+    async with httpx.AsyncClient(timeout=120) as client:
+        await wait_until_ready(client, base_url, kb_id)
+        # Warm-up: each worker loads its Chroma index on its first requests
+        await asyncio.gather(*(send(client, base_url, kb_id, next(counter)) for _ in range(concurrency * 2)))
+
+        deadline = time.monotonic() + duration
+
+        async def user():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await send(client, base_url, kb_id, next(counter))
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second against worker count, with a mock LLM")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--kb", default="vectorbt", help="Knowledge base to query (code_review: /review/code)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per worker count")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mock LLM latency")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mock-port", type=int, default=8900)
+    args = parser.parse_args()
+
+    mock = start_process([
+        "scripts/mock_openai_server.py", "--port", str(args.mock_port), "--latency-ms", str(args.latency_ms)
+    ])
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            server = start_process(
+                ["src/serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(args.port)],
+                env=server_env(args.mock_port),
+            )
+            try:
+                result = asyncio.run(run_load(base_url, args.kb, args.concurrency, args.duration))
+            finally:
+                stop_process(server)
+            results.append((workers, result))
+            print(f"{workers} workers: {result['rps']:7.1f} req/s   p50 {result['p50'] * 1000:7.1f} ms   "
+                  f"p95 {result['p95'] * 1000:7.1f} ms   errors {result['errors']}")
+    finally:
+        stop_process(mock)
+
+    baseline = results[0][1]["rps"] if results else 0
+    if baseline:
+        print("\nScaling: " + "   ".join(f"{w} workers x{r['rps'] / baseline:.2f}" for w, r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Minimal OpenAI-compatible server for local benchmarks and load tests.
+Answers /v1/chat/completions (streaming or not) and /v1/completions with a
+fixed text after an optional artificial latency, without calling any provider.
+
+Usage:
+    python scripts/mock_openai_server.py --port 8900 --latency-ms 50
+    # TLS, to include the handshake in measurements (self-signed certificate):
+    python scripts/mock_openai_server.py --ssl-certfile cert.pem --ssl-keyfile key.pem
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ANSWER = "This is a mock answer. Use `vbt.Portfolio.from_signals` to backtest signals."
+
+app = FastAPI(title="Mock OpenAI-compatible server")
+app.state.latency = 0.0
+
+
+def completion_id():
+    return f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock-model")
+    await asyncio.sleep(app.state.latency)
+
+    if body.get("stream"):
+        async def stream():
+            cid = completion_id()
+            for word in ANSWER.split(" "):
+                chunk = {
+                    "id": cid,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": word + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id(),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30},
+    }
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(app.state.latency)
+    return {
+        "id": completion_id(),
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock-model"),
+        "choices": [{"index": 0, "text": ANSWER, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency per request")
+    parser.add_argument("--ssl-certfile", default=None)
+    parser.add_argument("--ssl-keyfile", default=None)
+    args = parser.parse_args()
+
+    app.state.latency = args.latency_ms / 1000
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        ssl_certfile=args.ssl_certfile,
+        ssl_keyfile=args.ssl_keyfile,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Cache sémantique des réponses.
+Une question proche (similarité cosinus) d'une question déjà posée sur la même
+knowledge base et la même version du corpus réutilise la réponse, sans
+retrieval ni appel LLM. Les entrées expirent (TTL), sont évincées en LRU et
+persistées dans SQLite. Le fichier SQLite peut être partagé par plusieurs
+workers : SQLite attribue les ids, et la table (pas la mémoire d'un worker)
+décide des lignes à garder. Avant chaque recherche, un worker applique à sa
+mémoire les écritures des autres (réponses ajoutées, évictions, `clear`),
+détectées par `PRAGMA data_version`.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Cache de réponses indexé par (kb_id, version du corpus, embedding de la question)."""
+
+    def __init__(self, path=None, threshold=0.95, ttl=86400, max_entries=1000):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._entries = OrderedDict()  # id -> entrée, du moins au plus récemment utilisé
+        self._lock = threading.Lock()
+        self._next_id = 1  # Sans SQLite ; sinon les ids sont attribués par SQLite
+        self._db = None
+        self._data_version = None  # Version de la base lors de la dernière synchronisation
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id INTEGER PRIMARY KEY, kb_id TEXT, corpus_version TEXT, question TEXT, "
+                "embedding BLOB, response TEXT, created_at REAL, last_used REAL)"
+            )
+            self._db.commit()
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        """Construit le cache depuis les variables d'environnement ANSWER_CACHE_*."""
+        return cls(
+            path=os.getenv("ANSWER_CACHE_PATH", "data/cache/answers.sqlite") or None,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+        )
+
+    def _load(self):
+        """Recharge les entrées encore valides depuis le disque, dans l'ordre LRU."""
+        self._db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        self._sync()
+        self._evict()
+
+    def _sync(self):
+        """
+        Aligne la mémoire sur la table quand un autre worker l'a modifiée : les
+        entrées dont la ligne a disparu (éviction, expiration, `clear`) sont
+        oubliées, les lignes ajoutées sont chargées. Un id réattribué par SQLite
+        après une suppression est reconnu à sa date de création.
+        """
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        rows = dict(self._db.execute("SELECT id, created_at FROM answers").fetchall())
+        for entry_id in [i for i, e in self._entries.items() if rows.get(i) != e["created_at"]]:
+            del self._entries[entry_id]
+        new_ids = [entry_id for entry_id in rows if entry_id not in self._entries]
+        if not new_ids:
+            return
+        new_rows = self._db.execute(
+            "SELECT id, kb_id, corpus_version, question, embedding, response, created_at "
+            f"FROM answers WHERE id IN ({','.join('?' * len(new_ids))}) ORDER BY last_used",
+            new_ids
+        ).fetchall()
+        for entry_id, kb_id, version, question, embedding, response, created_at in new_rows:
+            self._entries[entry_id] = {
+                "kb_id": kb_id,
+                "corpus_version": version,
+                "question": question,
+                "embedding": np.frombuffer(embedding, dtype=np.float32),
+                "response": response,
+                "created_at": created_at,
+            }
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict(self):
+        """Évince les entrées les moins récemment utilisées au-delà de `max_entries`."""
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self.stats["evictions"] += evicted
+            if self._db:
+                # LRU de la table partagée, pas de la mémoire de ce worker : une ligne
+                # encore récente pour un autre worker n'est pas supprimée
+                self._db.execute(
+                    "DELETE FROM answers WHERE id NOT IN "
+                    "(SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+
+    def _expire(self, now):
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired and self._db:
+            # Le TTL est le même pour tous les workers : une ligne expirée l'est partout
+            self._db.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            self._db.commit()
+
+    def lookup(self, kb_id, corpus_version, embedding):
+        """Retourne la réponse de la question la plus proche au-dessus du seuil, sinon None."""
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._db:
+                self._sync()
+            self._expire(now)
+            candidates = [
+                (entry_id, entry) for entry_id, entry in self._entries.items()
+                if entry["kb_id"] == kb_id and entry["corpus_version"] == corpus_version
+            ]
+            if candidates:
+                similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.stats["hits"] += 1
+                    if self._db:
+                        self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, entry_id))
+                        self._db.commit()
+                    return entry["response"]
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, kb_id, corpus_version, question, embedding, response):
+        """Ajoute une réponse au cache."""
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._db:
+                cursor = self._db.execute(
+                    "INSERT INTO answers (kb_id, corpus_version, question, embedding, response, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kb_id, corpus_version, question, vector.tobytes(), response, now, now)
+                )
+                self._db.commit()
+                entry_id = cursor.lastrowid
+            else:
+                entry_id = self._next_id
+                self._next_id += 1
+            self._entries[entry_id] = {
+                "kb_id": kb_id,
+                "corpus_version": corpus_version,
+                "question": question,
+                "embedding": vector,
+                "response": response,
+                "created_at": now,
+            }
+            self.stats["stores"] += 1
+            self._evict()
+
+    def clear(self, kb_id=None):
+        """Vide le cache, pour une knowledge base ou entièrement (pour tous les workers avec SQLite)."""
+        with self._lock:
+            for entry_id in [i for i, e in self._entries.items() if kb_id is None or e["kb_id"] == kb_id]:
+                del self._entries[entry_id]
+            if self._db:
+                if kb_id is None:
+                    self._db.execute("DELETE FROM answers")
+                else:
+                    self._db.execute("DELETE FROM answers WHERE kb_id = ?", (kb_id,))
+                self._db.commit()
+
+    def get_stats(self):
+        """Compteurs hit/miss et taille courante."""
+        with self._lock:
+            if self._db:
+                self._sync()
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
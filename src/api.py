@@ -5,33 +5,113 @@ FastAPI application to expose the RAG assistant as an API.
 
 from fastapi import FastAPI, HTTPException, Form, File, UploadFile
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import uvicorn
 from openai import RateLimitError
 from typing import List, Optional
-import base64
-import io
 import os
-from PIL import Image
-from llama_index.postprocessor.cohere_rerank import CohereRerank
+import json
+import math
+import time
+import asyncio
+import threading
 from .assistant import (
     vectorbt_mode,
     review_mode,
     load_knowledge_base,
+    CodeReviewChat,
 )
-from .llm_manager import LLMManager, managed_chat_request, EnhancedChatWrapper
+from .llm_manager import LLMManager, managed_chat_request, managed_stream_request, EnhancedChatWrapper
 from .knowledge_bases import KnowledgeBaseManager, KnowledgeBaseType
+from .engine_pool import ChatEnginePool
+from .answer_cache import SemanticAnswerCache
+from .build_jobs import BuildJobManager, BuildStatus
+from .history_summarizer import ConversationHistory, HistorySummarizer
+from .session_store import SessionStore
+from .executors import ExecutorSaturated
+from .llm_dispatcher import CircuitsOpen, DispatcherSaturated
+from .image_processing import ImageCache, ImageTooLarge, transcode_image
+from . import model_registry, http_clients, executors, telemetry
 from contextlib import asynccontextmanager
 
+telemetry.configure_logging()
+logger = telemetry.get_logger("api")
+
 # In-memory store for chat engines and the LLM manager
 STATE = {
     "knowledge_bases": {},  # Cache for loaded knowledge bases
     "llm_manager": None,
-    "review_sessions": {},
     "kb_manager": None,
-    "chat_histories": {}  # Historique de conversation par knowledge base
+    "engine_pool": None,  # Chat engines réutilisés entre les requêtes
+    "answer_cache": None,  # Cache sémantique des réponses
+    "preload_task": None,  # Préchargement des index en arrière-plan
+    "build_jobs": None,  # Constructions d'index en arrière-plan
+    "history_summarizer": None,  # Résumé des vieux échanges après chaque réponse
+    "sessions": None,  # Historiques de chat et sessions de review, par session_id
+    "image_cache": ImageCache()  # Images déjà transcodées, par empreinte du contenu
 }
+_kb_load_locks = {}  # kb_id -> lock serializing the loads of that knowledge base
+_kb_load_locks_guard = threading.Lock()
+
+def _kb_load_lock(kb_id: str):
+    """Lock of one knowledge base: different knowledge bases load in parallel."""
+    with _kb_load_locks_guard:
+        return _kb_load_locks.setdefault(kb_id, threading.Lock())
+
+def preload_knowledge_bases():
+    """
+    Load every already-built knowledge base so the first query does not pay for it.
+    Missing indices are skipped (they are built on demand).
+    """
+    for kb in STATE["kb_manager"].get_available_knowledge_bases():
+        if kb.type == KnowledgeBaseType.CODE_REVIEW or get_knowledge_base_status(kb.id) != BuildStatus.READY:
+            continue
+        try:
+            get_knowledge_base_index(kb.id)
+        except ValueError as e:
+            logger.warning("Could not preload '%s': %s", kb.id, e)
+    print("Knowledge bases preloaded")
+
+def on_build_complete(job):
+    """
+    Drop everything loaded from a rebuilt index so the next query uses the new one.
+    """
+    if job.status != BuildStatus.READY:
+        return
+    kb_config = STATE["kb_manager"].get_knowledge_base(job.kb_id)
+    model_registry.forget_index(kb_config.chroma_path)
+    STATE["engine_pool"].clear(job.kb_id)
+    for kb_id in list(STATE["knowledge_bases"]):
+        if job.kb_id in STATE["kb_manager"].get_build_dependencies(kb_id):
+            with _kb_load_lock(kb_id):
+                STATE["engine_pool"].clear(kb_id)
+                STATE["knowledge_bases"].pop(kb_id, None)
+
+def get_knowledge_base_status(kb_id: str, auto_build: bool = False) -> str:
+    """
+    Status of a knowledge base: ready, building, failed or missing.
+    With `auto_build`, missing indices are queued for a background build.
+    """
+    statuses = set()
+    for dependency in STATE["kb_manager"].get_build_dependencies(kb_id):
+        job = STATE["build_jobs"].latest_job(dependency)
+        if job and job.status in (BuildStatus.QUEUED, BuildStatus.BUILDING):
+            statuses.add(BuildStatus.BUILDING)
+        elif STATE["kb_manager"].knowledge_base_exists(dependency):
+            statuses.add(BuildStatus.READY)
+        elif job and job.status == BuildStatus.FAILED:
+            statuses.add(BuildStatus.FAILED)
+        elif auto_build:
+            STATE["build_jobs"].submit(dependency)
+            statuses.add(BuildStatus.BUILDING)
+        else:
+            statuses.add("missing")
+    
+    for status in (BuildStatus.BUILDING, BuildStatus.FAILED, "missing"):
+        if status in statuses:
+            return status
+    return BuildStatus.READY
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,9 +120,21 @@ async def lifespan(app: FastAPI):
     try:
         STATE["llm_manager"] = LLMManager()
         STATE["kb_manager"] = KnowledgeBaseManager()
+        STATE["engine_pool"] = ChatEnginePool(kb_manager=STATE["kb_manager"])
+        STATE["answer_cache"] = SemanticAnswerCache.from_env()
+        STATE["history_summarizer"] = HistorySummarizer(STATE["llm_manager"])
+        STATE["sessions"] = SessionStore.from_env()
+        STATE["build_jobs"] = BuildJobManager(STATE["kb_manager"].build_knowledge_base, on_complete=on_build_complete)
         print(f"Available knowledge bases: {[kb.name for kb in STATE['kb_manager'].get_available_knowledge_bases()]}")
+        
+        # Embedding model loaded once for the whole process, before serving
+        await asyncio.to_thread(model_registry.warm_up_models)
+        
+        # Indices are loaded in the background so startup stays fast
+        if os.getenv("PRELOAD_INDEXES", "1") == "1":
+            STATE["preload_task"] = asyncio.create_task(asyncio.to_thread(preload_knowledge_bases))
     except ValueError as e:
-        print(f"Error initializing managers: {e}")
+        logger.error("Error initializing managers: %s", e)
         # This is a critical error, so we might want to stop the app from starting.
         # For now, we print and let it continue, but it will fail on the first request.
         # In a production setup, you might `raise` here to stop the server.
@@ -50,6 +142,12 @@ async def lifespan(app: FastAPI):
     yield
     # Code to run on shutdown (if any)
     print("Shutting down...")
+    if STATE["history_summarizer"]:
+        await STATE["history_summarizer"].drain()
+    if STATE["build_jobs"]:
+        STATE["build_jobs"].shutdown()
+    executors.shutdown()
+    await http_clients.aclose_all()
 
 # Initialize FastAPI app with the lifespan manager
 app = FastAPI(
@@ -59,6 +157,23 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    """Worker pools are full: ask the client to retry instead of queueing behind heavy requests."""
+    return JSONResponse(status_code=503, content={"detail": f"Server busy: {exc}"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(DispatcherSaturated)
+async def dispatcher_saturated_handler(request, exc: DispatcherSaturated):
+    """Every LLM configuration is rate-limited for longer than the queue wait: the client retries later."""
+    retry_after = str(max(1, math.ceil(exc.retry_after)))
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": retry_after})
+
+@app.exception_handler(CircuitsOpen)
+async def circuits_open_handler(request, exc: CircuitsOpen):
+    """Every model is failing: fail fast until the first circuit breaker lets a probe through."""
+    retry_after = str(max(1, math.ceil(exc.retry_after)))
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": retry_after})
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -80,6 +195,7 @@ class ChatCompletionRequest(BaseModel):
     messages: List[ChatMessage]
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 1024
+    stream: Optional[bool] = False
 
 class ChatCompletionResponse(BaseModel):
     id: str = "chatcmpl-xxx"
@@ -96,26 +212,100 @@ async def read_index():
     return FileResponse('static/index.html')
 
 @app.post("/clear-history/{kb_id}")
-async def clear_chat_history(kb_id: str):
-    """Clear conversation history for a specific knowledge base."""
-    if kb_id in STATE["chat_histories"]:
-        STATE["chat_histories"][kb_id] = []
+async def clear_chat_history(kb_id: str, session_id: Optional[str] = None):
+    """Clear the conversation history of a session for a specific knowledge base."""
+    if not STATE["sessions"]:
+        raise HTTPException(status_code=503, detail="Session store is not initialized")
+    keys = [chat_session_key(kb_id, session_id)]
+    if kb_id == "code_review":
+        keys.append(review_session_key(session_id))
+    found = False
+    for key in keys:
+        if STATE["sessions"].get(key) is not None:
+            STATE["sessions"].delete(key)
+            found = True
+    if found:
         return {"message": f"Chat history cleared for {kb_id}"}
     return {"message": "No history found"}
 
+@app.get("/sessions/stats")
+async def get_session_stats():
+    """Session store statistics (sessions, bytes, evictions)."""
+    if not STATE["sessions"]:
+        raise HTTPException(status_code=503, detail="Session store is not initialized")
+    return STATE["sessions"].get_stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the semantic answer cache."""
+    if not STATE["answer_cache"]:
+        raise HTTPException(status_code=500, detail="Answer cache not initialized")
+    return STATE["answer_cache"].get_stats()
+
+@app.post("/cache/clear")
+async def clear_answer_cache(kb_id: Optional[str] = None):
+    """Empty the semantic answer cache, for one knowledge base or all of them."""
+    if not STATE["answer_cache"]:
+        raise HTTPException(status_code=500, detail="Answer cache not initialized")
+    STATE["answer_cache"].clear(kb_id)
+    return {"message": f"Answer cache cleared for {kb_id or 'all knowledge bases'}"}
+
+@app.get("/executors/stats")
+async def get_executor_stats():
+    """Thread and process pool usage (pending tasks, rejections)."""
+    return executors.get_stats()
+
+@app.get("/images/stats")
+async def get_image_stats():
+    """Transcoded image cache statistics."""
+    return STATE["image_cache"].get_stats()
+
+@app.get("/embedding/stats")
+async def get_embedding_stats():
+    """Batching and cache counters of the query embedding service."""
+    return model_registry.get_embedding_service().stats
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics of this process: request and per-stage latency histograms,
+    token and cache counters, and the counters of the caches and pools as gauges.
+    """
+    extra = []
+    for prefix, component in (("answer_cache", STATE["answer_cache"]), ("sessions", STATE["sessions"]),
+                              ("image_cache", STATE["image_cache"])):
+        if component is not None:
+            extra += telemetry.render_gauges(prefix, component.get_stats())
+    extra += telemetry.render_gauges("embedding", model_registry.get_embedding_stats())
+    if STATE["engine_pool"] is not None:
+        extra += telemetry.render_gauges("engine_pool", STATE["engine_pool"].stats)
+    extra += telemetry.render_gauges("executor", executors.get_stats(), label="pool")
+    return PlainTextResponse(telemetry.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm/status")
+async def get_llm_status():
+    """Health, in-flight requests and rate-limit state of each API key and model."""
+    return STATE["llm_manager"].dispatcher.snapshot()
+
+@app.get("/llm/breakers")
+async def get_llm_breakers():
+    """Circuit breaker state of each model (closed, open or half_open)."""
+    return STATE["llm_manager"].dispatcher.snapshot()["breakers"]
+
 @app.get("/knowledge-bases")
 async def get_knowledge_bases():
     """
-    Get all available knowledge bases.
-    Auto-builds missing indices.
+    Get all available knowledge bases with their status (ready, building, failed).
+    Missing indices are built in the background; this endpoint never waits for them.
     """
     if not STATE["kb_manager"]:
         raise HTTPException(status_code=500, detail="Knowledge base manager not initialized")
     
     kb_list = []
     for kb in STATE["kb_manager"].get_available_knowledge_bases():
-        # Auto-build if missing (except code review)
-        available = STATE["kb_manager"].auto_build_knowledge_base(kb.id)
+        # Queue a background build if missing (except code review, and not with several workers)
+        status = get_knowledge_base_status(kb.id, auto_build=os.getenv("AUTO_BUILD_INDEXES", "1") == "1")
+        jobs = [STATE["build_jobs"].latest_job(dep) for dep in STATE["kb_manager"].get_build_dependencies(kb.id)]
         
         kb_list.append({
             "id": kb.id,
@@ -124,16 +314,51 @@ async def get_knowledge_bases():
             "type": kb.type.value,
             "supports_images": kb.supports_images,
             "icon": kb.icon,
-            "available": available
+            "status": status,
+            "available": status == BuildStatus.READY,
+            "build_jobs": [job.to_dict() for job in jobs if job]
         })
     
     return {"knowledge_bases": kb_list}
 
+@app.post("/knowledge-bases/{kb_id}/build")
+async def build_knowledge_base(kb_id: str):
+    """Start (or rejoin) a background build of a knowledge base index."""
+    if not STATE["kb_manager"] or not STATE["kb_manager"].get_knowledge_base(kb_id):
+        raise HTTPException(status_code=404, detail=f"Knowledge base '{kb_id}' not found")
+    
+    jobs = [STATE["build_jobs"].submit(dep) for dep in STATE["kb_manager"].get_build_dependencies(kb_id)]
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+@app.get("/jobs")
+async def list_build_jobs():
+    """List index build jobs, most recent first."""
+    return {"jobs": [job.to_dict() for job in STATE["build_jobs"].list_jobs()]}
+
+@app.get("/jobs/{job_id}")
+async def get_build_job(job_id: str):
+    """Status and progress of an index build job."""
+    job = STATE["build_jobs"].get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
+
 def get_knowledge_base_index(kb_id: str):
     """
     Manages the creation and retrieval of knowledge base indices.
-    Auto-builds missing indices.
+    Auto-builds missing indices. Loads of the same knowledge base are serialized,
+    other knowledge bases are served or loaded meanwhile.
     """
+    with _kb_load_lock(kb_id):
+        return _get_knowledge_base_index(kb_id)
+
+async def aget_knowledge_base_index(kb_id: str):
+    """`get_knowledge_base_index` without blocking the event loop while an index loads."""
+    if kb_id in STATE["knowledge_bases"]:
+        return STATE["knowledge_bases"][kb_id]
+    return await executors.run_io(get_knowledge_base_index, kb_id)
+
+def _get_knowledge_base_index(kb_id: str):
     if kb_id not in STATE["knowledge_bases"]:
         print(f"Loading knowledge base: {kb_id}")
         kb_config = STATE["kb_manager"].get_knowledge_base(kb_id)
@@ -155,72 +380,187 @@ def get_knowledge_base_index(kb_id: str):
             
             STATE["knowledge_bases"][kb_id] = index
         except Exception as e:
-            print(f"Failed to load knowledge base '{kb_id}': {e}")
+            logger.exception("Failed to load knowledge base '%s'", kb_id)
             raise ValueError(f"Failed to load knowledge base '{kb_id}': {e}")
     
     return STATE["knowledge_bases"][kb_id]
 
-def process_images(images: List[UploadFile]) -> List[str]:
+async def process_images(images: List[UploadFile]) -> List[str]:
     """
     Process uploaded images and return base64 encoded strings.
+    Uploads are read without blocking the event loop and transcoded in the process pool;
+    an image already seen (same bytes) is served from the image cache.
     """
-    processed_images = []
-    for image in images:
+    async def process_one(image):
         try:
-            # Read image data
-            image_data = image.file.read()
-            
-            # Open with PIL to validate and potentially resize
-            pil_image = Image.open(io.BytesIO(image_data))
-            
-            # Convert to RGB if necessary
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # Resize if too large (max 1024x1024)
-            max_size = 1024
-            if pil_image.width > max_size or pil_image.height > max_size:
-                pil_image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # Convert back to bytes
-            img_buffer = io.BytesIO()
-            pil_image.save(img_buffer, format='JPEG', quality=85)
-            img_buffer.seek(0)
-            
-            # Encode to base64
-            base64_image = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
-            processed_images.append(f"data:image/jpeg;base64,{base64_image}")
-            
+            image_data = await image.read()
+            key = ImageCache.key(image_data)
+            data_url = STATE["image_cache"].get(key)
+            telemetry.record_cache("image", data_url is not None)
+            if data_url is None:
+                data_url = await executors.run_cpu(transcode_image, image_data)
+                STATE["image_cache"].put(key, data_url)
+            return data_url
+        except ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"Image {image.filename} is too large: {e}")
+        except ExecutorSaturated:
+            raise
         except Exception as e:
-            print(f"Error processing image {image.filename}: {e}")
-            continue
-    
-    return processed_images
+            logger.warning("Error processing image %s: %s", image.filename, e)
+            return None
+
+    processed_images = await asyncio.gather(*(process_one(image) for image in images))
+    return [image for image in processed_images if image]
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(payload) -> str:
+    """
+    Format a payload as a Server-Sent Events `data:` frame.
+    """
+    data = payload if isinstance(payload, str) else json.dumps(payload)
+    return f"data: {data}\n\n"
+
+async def stream_sse(token_stream, metadata):
+    """
+    Turn a token stream into SSE frames: one `delta` per token, then a final `done` frame.
+    """
+    try:
+        async for token in token_stream:
+            yield sse_event({"delta": token})
+    except Exception as e:
+        logger.exception("Streaming error")
+        yield sse_event({"error": str(e)})
+        return
+    yield sse_event({"done": True, **metadata})
+
+async def single_token(text):
+    """
+    Stream an already complete answer as a single token.
+    """
+    yield text
+
+def store_answer(cache_entry, response):
+    """
+    Store an answer in the answer cache. A cache failure (e.g. a locked SQLite
+    file) is logged and never fails an answer that was already generated.
+    """
+    try:
+        STATE["answer_cache"].store(*cache_entry, response)
+    except Exception as e:
+        logger.warning("Could not store the answer in the answer cache: %s", e)
+
+async def store_answer_when_complete(token_stream, cache_entry):
+    """
+    Pass tokens through and store the full answer in the answer cache at the end.
+    """
+    parts = []
+    async for token in token_stream:
+        parts.append(token)
+        yield token
+    store_answer(cache_entry, "".join(parts))
+
+def chat_session_key(kb_id, session_id):
+    return f"chat:{kb_id}:{session_id or 'default'}"
+
+def review_session_key(session_id):
+    return f"review:{session_id or 'default'}"
+
+def store_summary(key, summary, folded):
+    """
+    Apply a background summary to the stored session, unless the session was
+    cleared or replaced while the summary was being generated.
+    """
+    state = STATE["sessions"].get(key)
+    if state is None:
+        return
+    history = state.get("history", state)
+    if history.get("turns", [])[:len(folded)] != [list(turn) for turn in folded]:
+        return
+    del history["turns"][:len(folded)]
+    history["summary"] = summary
+    STATE["sessions"].put(key, state)
+
+def save_session(key, state_fn, history):
+    """
+    Store the session state, then condense the oldest turns of `history` in
+    the background: the response is not delayed, and the next request carries
+    a fixed-size summary.
+    """
+    STATE["sessions"].put(key, state_fn())
+    if STATE["history_summarizer"] is not None and history is not None:
+        STATE["history_summarizer"].schedule(
+            history, on_done=lambda folded: store_summary(key, history.summary, folded)
+        )
+
+async def finish_trace_when_complete(token_stream, trace, metadata):
+    """
+    Pass tokens through and close the request trace at the end of the stream;
+    its per-stage timings are added to the final `done` frame.
+    """
+    status = "error"
+    try:
+        async for token in token_stream:
+            yield token
+        status = "ok"
+    finally:
+        summary = trace.finish(status)
+        if summary is not None:
+            metadata["timings_ms"] = summary["stages_ms"]
+
+async def save_session_when_complete(token_stream, key, state_fn, history):
+    """
+    Pass tokens through and store the session once the answer is complete.
+    """
+    async for token in token_stream:
+        yield token
+    save_session(key, state_fn, history)
 
 @app.post("/query/{kb_id}", summary="Query a specific knowledge base")
 async def query_knowledge_base(
     kb_id: str,
     question: str = Form(""),
-    images: List[UploadFile] = File(default=[])
+    images: List[UploadFile] = File(default=[]),
+    stream: bool = Form(False),
+    session_id: str = Form(None)
 ):
     """
     Ask a question about a specific knowledge base, optionally with images.
+    With `stream=true` the answer is sent as Server-Sent Events while it is generated.
     """
     if not STATE["llm_manager"] or not STATE["kb_manager"]:
         raise HTTPException(status_code=500, detail="Managers not initialized. Check server logs.")
 
+    trace = telemetry.start_trace("query", kb_id=kb_id, stream=stream)
+    try:
+        response = await _query_knowledge_base(trace, kb_id, question, images, stream, session_id)
+    except BaseException:
+        trace.finish("error")
+        raise
+    if not stream:
+        trace.finish()  # Streaming responses finish their trace at the end of the stream
+    return response
+
+async def _query_knowledge_base(trace, kb_id, question, images, stream, session_id):
+    """
+    Body of `query_knowledge_base`, run inside the request trace.
+    """
     # Validate knowledge base
     kb_config = STATE["kb_manager"].get_knowledge_base(kb_id)
     if not kb_config:
         raise HTTPException(status_code=404, detail=f"Knowledge base '{kb_id}' not found")
     
-    if not STATE["kb_manager"].knowledge_base_exists(kb_id):
+    status = get_knowledge_base_status(kb_id)
+    if status == BuildStatus.BUILDING:
+        raise HTTPException(status_code=503, detail=f"Building index for '{kb_id}', please retry in a few minutes")
+    if status != BuildStatus.READY:
         raise HTTPException(status_code=404, detail=f"Knowledge base '{kb_id}' is not available")
 
     # Process images if any (only for multimodal-capable knowledge bases)
     processed_images = []
     if images and kb_config.supports_images:
-        processed_images = process_images([img for img in images if img.filename])
+        with telemetry.span("image_processing"):
+            processed_images = await process_images([img for img in images if img.filename])
 
     # Build the query with images
     full_query = question
@@ -229,45 +569,90 @@ async def query_knowledge_base(
         full_query += image_context
 
     try:
-        print(f"🔍 [DEBUG] Querying knowledge base: {kb_id}")
-        print(f"🔍 [DEBUG] Question length: {len(question)}")
-        print(f"🔍 [DEBUG] Images provided: {len(processed_images)}")
+        logger.debug("Querying knowledge base %s: question length %d, %d image(s)",
+                     kb_id, len(question), len(processed_images))
         
-        index = get_knowledge_base_index(kb_id)
+        with telemetry.span("index_load"):
+            index = await aget_knowledge_base_index(kb_id)
         
-        # Récupérer ou créer l'historique pour cette knowledge base
-        if kb_id not in STATE["chat_histories"]:
-            STATE["chat_histories"][kb_id] = []
-            print(f"🔍 [DEBUG] Created new chat history for {kb_id}")
+        # Historique de cette session pour cette knowledge base (nouveau s'il a expiré)
+        session_key = chat_session_key(kb_id, session_id)
+        history = ConversationHistory.from_state(STATE["sessions"].get(session_key))
         
-        # Créer un wrapper avec historique si c'est un index
+        # Les index passent par le pool d'engines, avec historique par session
         if hasattr(index, 'as_chat_engine'):
-            print(f"🔍 [DEBUG] Using standard index with EnhancedChatWrapper")
-            llm = STATE["llm_manager"].get_llm()
-            base_chat_engine = index.as_chat_engine(
-                chat_mode="context",
-                similarity_top_k=15,
-                node_postprocessors=[
-                    CohereRerank(api_key=os.getenv("COHERE_API_KEY"), top_n=5)
-                ],
-                llm=llm
-            )
-            enhanced_engine = EnhancedChatWrapper(base_chat_engine, STATE["chat_histories"][kb_id])
-            response = await enhanced_engine.achat(question)
-            response_dict = {"response": response.response}
+            logger.debug("Using pooled chat engine with EnhancedChatWrapper")
+            request_args = (index, question, STATE["llm_manager"])
+            request_kwargs = {
+                "engine_pool": STATE["engine_pool"],
+                "kb_id": kb_id,
+                "conversation_history": history,
+            }
         else:
-            print(f"🔍 [DEBUG] Using custom chat engine (CodeReviewChat or UnifiedStrategyChat)")
-            response_dict = await managed_chat_request(index, full_query, STATE["llm_manager"])
+            logger.debug("Using custom chat engine (CodeReviewChat or UnifiedStrategyChat)")
+            request_args = (index, full_query, STATE["llm_manager"])
+            request_kwargs = {"conversation_history": history}
+        if processed_images:
+            # Sent as image blocks to vision models, mentioned in the question otherwise
+            request_kwargs["images"] = processed_images
         
-        # Add metadata to response
-        response_dict["knowledge_base"] = kb_config.name
-        response_dict["supports_images"] = kb_config.supports_images
+        # Metadata added to the response
+        metadata = {
+            "knowledge_base": kb_config.name,
+            "supports_images": kb_config.supports_images,
+        }
         if processed_images:
-            response_dict["images_processed"] = len(processed_images)
-            
+            metadata["images_processed"] = len(processed_images)
+        
+        # Semantic answer cache: a near-identical question skips retrieval and the LLM.
+        # Only for the first question of a session: a follow-up ("and for EMA?") depends
+        # on its conversation, and must neither match nor produce another session's answer
+        cache_entry = None
+        first_question = not history and not history.summary
+        if STATE["answer_cache"] is not None and question.strip() and not processed_images and first_question:
+            with telemetry.span("answer_cache"):
+                corpus_version = STATE["kb_manager"].get_corpus_version(kb_id)
+                question_embedding = await model_registry.get_embedding_service().aembed(question)
+                cached_response = STATE["answer_cache"].lookup(kb_id, corpus_version, question_embedding)
+                telemetry.record_cache("answer", cached_response is not None)
+            if cached_response is not None:
+                logger.debug("Answer cache hit for %s", kb_id)
+                history.append((question, cached_response))
+                save_session(session_key, history.to_state, history)
+                metadata["cached"] = True
+                if stream:
+                    return StreamingResponse(
+                        stream_sse(finish_trace_when_complete(single_token(cached_response), trace, metadata), metadata),
+                        media_type="text/event-stream",
+                        headers=SSE_HEADERS
+                    )
+                metadata["timings_ms"] = trace.finish()["stages_ms"]
+                return {"response": cached_response, **metadata}
+            cache_entry = (kb_id, corpus_version, question, question_embedding)
+        
+        if stream:
+            token_stream = managed_stream_request(*request_args, **request_kwargs)
+            if cache_entry:
+                token_stream = store_answer_when_complete(token_stream, cache_entry)
+            token_stream = save_session_when_complete(token_stream, session_key, history.to_state, history)
+            token_stream = finish_trace_when_complete(token_stream, trace, metadata)
+            return StreamingResponse(
+                stream_sse(token_stream, metadata),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
+        
+        response_dict = await managed_chat_request(*request_args, **request_kwargs)
+        if cache_entry:
+            store_answer(cache_entry, response_dict["response"])
+        save_session(session_key, history.to_state, history)
+        metadata["timings_ms"] = trace.finish()["stages_ms"]
+        response_dict.update(metadata)
         return response_dict
     except RateLimitError as e:
         raise HTTPException(status_code=429, detail=f"All API configurations are rate-limited. Last error: {e}")
+    except (ExecutorSaturated, DispatcherSaturated, CircuitsOpen):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
@@ -275,13 +660,14 @@ async def query_knowledge_base(
 @app.post("/vectorbt/query", summary="Query the VectorBT documentation (deprecated)")
 async def query_vectorbt(
     question: str = Form(""),
-    images: List[UploadFile] = File(default=[])
+    images: List[UploadFile] = File(default=[]),
+    session_id: str = Form(None)
 ):
     """
     Ask a question about the VectorBT documentation and codebase, optionally with images.
     This endpoint is deprecated. Use /query/vectorbt instead.
     """
-    return await query_knowledge_base("vectorbt", question, images)
+    return await query_knowledge_base("vectorbt", question, images, stream=False, session_id=session_id)
 
 @app.post("/review/code")
 async def review_code(
@@ -296,10 +682,24 @@ async def review_code(
     if not STATE["llm_manager"]:
         raise HTTPException(status_code=500, detail="LLM Manager is not initialized. Check server logs.")
 
+    trace = telemetry.start_trace("review")
+    try:
+        response = await _review_code(trace, code, question, session_id, images)
+    except BaseException:
+        trace.finish("error")
+        raise
+    trace.finish()
+    return response
+
+async def _review_code(trace, code, question, session_id, images):
+    """
+    Body of `review_code`, run inside the request trace.
+    """
     # Process images if any
     processed_images = []
     if images:
-        processed_images = process_images([img for img in images if img.filename])
+        with telemetry.span("image_processing"):
+            processed_images = await process_images([img for img in images if img.filename])
 
     # Build the query with images
     full_question = question
@@ -307,22 +707,27 @@ async def review_code(
         image_context = f"\n\nImages provided: {len(processed_images)} image(s) for additional context"
         full_question += image_context
 
-    # Utilisez session_id pour retrouver ou créer l'historique
-    session_id = session_id or "default"
-    if session_id not in STATE["review_sessions"]:
-        engine = review_mode(api_mode=True, code_snippet=code)
-        STATE["review_sessions"][session_id] = engine
+    # Utilisez session_id pour retrouver ou créer la session de review
+    session_key = review_session_key(session_id)
+    state = STATE["sessions"].get(session_key)
+    if state is None:
+        engine = review_mode(api_mode=True, code_snippet=code, llm_manager=STATE["llm_manager"])
     else:
-        engine = STATE["review_sessions"][session_id]
+        engine = CodeReviewChat.from_state(state, STATE["llm_manager"])
+        engine.code = code
 
     try:
-        response = await managed_chat_request(engine, full_question, STATE["llm_manager"])
+        response = await managed_chat_request(engine, full_question, STATE["llm_manager"], images=processed_images)
+        save_session(session_key, engine.to_state, engine.conversation_history)
         
         # Add image information to response if images were provided (response is a dict)
         if processed_images:
             response["images_processed"] = len(processed_images)
+        response["timings_ms"] = trace.finish()["stages_ms"]
             
         return response
+    except (ExecutorSaturated, DispatcherSaturated, CircuitsOpen):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
@@ -334,26 +739,71 @@ from fastapi import Request
 async def openai_compatible_chat(req: ChatCompletionRequest, request: Request):
     """
     OpenAI-compatible chat endpoint for integration with Continue or other clients.
+    `model` selects the knowledge base (defaults to vectorbt); `stream: true` follows
+    the `chat.completion.chunk` protocol.
     """
-    if not STATE["llm_manager"]:
+    if not STATE["llm_manager"] or not STATE["kb_manager"]:
         raise HTTPException(status_code=500, detail="LLM Manager is not initialized.")
 
     # Extraire tous les messages user pour les concaténer
     user_query = "\n".join(msg.content for msg in req.messages if msg.role == "user").strip()
 
-    index = get_index()
+    kb_id = req.model if STATE["kb_manager"].get_knowledge_base(req.model) else "vectorbt"
+    if get_knowledge_base_status(kb_id) != BuildStatus.READY:
+        raise HTTPException(status_code=503, detail=f"Knowledge base '{kb_id}' is not ready")
+    try:
+        index = await aget_knowledge_base_index(kb_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=400, detail=f"Knowledge base '{kb_id}' cannot be used for chat completions")
+
+    request_kwargs = {"engine_pool": STATE["engine_pool"], "kb_id": kb_id} if hasattr(index, 'as_chat_engine') else {}
+    completion_id = f"chatcmpl-{uuid4()}"
+    trace = telemetry.start_trace("chat_completions", kb_id=kb_id, stream=bool(req.stream))
+
+    if req.stream:
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": req.model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        async def event_stream():
+            yield sse_event(chunk({"role": "assistant"}))
+            status = "error"
+            try:
+                async for token in managed_stream_request(index, user_query, STATE["llm_manager"], **request_kwargs):
+                    yield sse_event(chunk({"content": token}))
+                status = "ok"
+            except Exception as e:
+                logger.exception("Streaming error")
+                yield sse_event({"error": {"message": str(e)}})
+                return
+            finally:
+                trace.finish(status)
+            yield sse_event(chunk({}, finish_reason="stop"))
+            yield sse_event("[DONE]")
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
     try:
-        response = await managed_chat_request(index, user_query, STATE["llm_manager"])
+        response = await managed_chat_request(index, user_query, STATE["llm_manager"], **request_kwargs)
+        trace.finish()
         return ChatCompletionResponse(
-            id=f"chatcmpl-{uuid4()}",
+            id=completion_id,
             object="chat.completion",
             choices=[
                 {
                     "index": 0,
                     "message": {
                         "role": "assistant",
-                        "content": response.response
+                        "content": response["response"]
                     },
                     "finish_reason": "stop"
                 }
@@ -362,8 +812,12 @@ async def openai_compatible_chat(req: ChatCompletionRequest, request: Request):
         )
     except RateLimitError as e:
         raise HTTPException(status_code=429, detail=f"Rate limit: {e}")
+    except (ExecutorSaturated, DispatcherSaturated, CircuitsOpen):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+    finally:
+        trace.finish("error")  # Sans effet si la réponse est déjà partie
 
 if __name__ == "__main__":
     uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
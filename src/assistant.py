@@ -5,19 +5,17 @@ Unified RAG assistant supporting multiple knowledge bases and multimodal capabil
 
 import os
 import sys
+import copy
 from dotenv import load_dotenv
 
-from llama_index.core import (
-    Settings,
-    StorageContext,
-    load_index_from_storage,
-)
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.postprocessor.cohere_rerank import CohereRerank
-import chromadb
-from llm_manager import LLMManager
-from knowledge_bases import KnowledgeBaseManager, KnowledgeBaseType
+from llama_index.core import Settings
+from .llm_manager import LLMManager, acomplete_prompt, astream_prompt
+from .knowledge_bases import KnowledgeBaseManager, KnowledgeBaseType
+from .retrieval import FanOutRetriever
+from .prompt_packer import PromptPacker
+from .history_summarizer import ConversationHistory
+from .rerankers import build_reranker
+from . import model_registry, telemetry
 
 # Load environment variables
 load_dotenv()
@@ -42,15 +40,8 @@ def setup_global_settings(llm_manager, llm_settings_override=None):
     # Set the initial LLM
     Settings.llm = llm_manager.get_llm()
     
-    # Set other global settings
-    Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-    Settings.chunk_size = 512
-    Settings.chunk_overlap = 50
-        
-    if not os.getenv("COHERE_API_KEY"):
-        print("Error: COHERE_API_KEY environment variable not set.", file=sys.stderr)
-        print("Please get your key from https://dashboard.cohere.com/api-keys", file=sys.stderr)
-        sys.exit(1)
+    # Embedding model and chunking settings are shared process-wide
+    model_registry.configure_settings()
 
 def get_multiline_input(prompt):
     """
@@ -139,31 +130,19 @@ def load_knowledge_base(kb_id: str, api_mode=False, llm_manager=None):
         else:
             sys.exit(1)
     
-    # Use the configured path (should exist after auto-build)
-    actual_path = kb_config.chroma_path
-
     try:
-        chroma_client = chromadb.PersistentClient(path=actual_path)
-        chroma_collection = chroma_client.get_collection(kb_config.collection_name)
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-        
-        storage_context = StorageContext.from_defaults(
-            persist_dir=actual_path,
-            vector_store=vector_store
-        )
-        
-        index = load_index_from_storage(storage_context=storage_context)
+        # Loaded once per process, then shared
+        index = model_registry.load_index(kb_config.chroma_path, kb_config.collection_name)
 
         if api_mode:
             return index
 
-        # Create chat engine with reranking for CLI mode
+        # Create chat engine with the knowledge base's reranker for CLI mode
+        reranker = build_reranker(kb_config.reranker, top_n=5)
         chat_engine = index.as_chat_engine(
             chat_mode="context",
-            similarity_top_k=15,
-            node_postprocessors=[
-                CohereRerank(api_key=os.getenv("COHERE_API_KEY"), top_n=5)
-            ],
+            similarity_top_k=15 if reranker else 10,
+            node_postprocessors=[reranker] if reranker else [],
             llm=llm_manager.get_llm()
         )
 
@@ -205,30 +184,13 @@ def load_unified_strategy_assistant(api_mode=False, llm_manager=None):
         print(error_msg, file=sys.stderr)
         sys.exit(1)
     
-    # Use configured paths (should exist after auto-build)
-    vectorbt_path = os.getenv("CHROMA_PATH", "data/chroma_db")
-    trading_path = os.getenv("TRADING_CHROMA_PATH", "data/chroma/trading_db")
+    vectorbt_config = kb_manager.get_knowledge_base("vectorbt")
+    trading_config = kb_manager.get_knowledge_base("trading_papers")
 
     try:
-        # Load VectorBT index
-        vectorbt_client = chromadb.PersistentClient(path=vectorbt_path)
-        vectorbt_collection = vectorbt_client.get_collection("vectorbt_docs")
-        vectorbt_vector_store = ChromaVectorStore(chroma_collection=vectorbt_collection)
-        vectorbt_storage_context = StorageContext.from_defaults(
-            persist_dir=vectorbt_path,
-            vector_store=vectorbt_vector_store
-        )
-        vectorbt_index = load_index_from_storage(storage_context=vectorbt_storage_context)
-        
-        # Load Trading Papers index
-        trading_client = chromadb.PersistentClient(path=trading_path)
-        trading_collection = trading_client.get_collection("trading_papers_docs")
-        trading_vector_store = ChromaVectorStore(chroma_collection=trading_collection)
-        trading_storage_context = StorageContext.from_defaults(
-            persist_dir=trading_path,
-            vector_store=trading_vector_store
-        )
-        trading_index = load_index_from_storage(storage_context=trading_storage_context)
+        # Both indices are loaded once per process, then shared
+        vectorbt_index = model_registry.load_index(vectorbt_config.chroma_path, vectorbt_config.collection_name)
+        trading_index = model_registry.load_index(trading_config.chroma_path, trading_config.collection_name)
 
         if api_mode:
             # Return a unified chat engine for API mode
@@ -256,38 +218,53 @@ class UnifiedStrategyChat:
         self.vectorbt_index = vectorbt_index
         self.trading_index = trading_index
         self.llm_manager = llm_manager
-        self.conversation_history = []
+        self.conversation_history = ConversationHistory()
+        self.packer = PromptPacker()
         
-        # Create retrieval engines
+        # Create retrieval engines, queried in parallel and fused by rank
         self.vectorbt_retriever = vectorbt_index.as_retriever(similarity_top_k=8)
         self.trading_retriever = trading_index.as_retriever(similarity_top_k=7)
+        self.retriever = FanOutRetriever(
+            {"VBT": self.vectorbt_retriever, "PAPER": self.trading_retriever},
+            top_n=10
+        )
+    
+    def with_history(self, conversation_history):
+        """Same retrievers, with the history of one session."""
+        chat = copy.copy(self)
+        chat.conversation_history = conversation_history
+        return chat
+    
+    def _format_context(self, chunks):
+        """Format (source, text) chunks, best first, labelled by source."""
+        if not chunks:
+            return ""
         
-    def _retrieve_context(self, question):
-        """Retrieve context from both knowledge bases."""
-        # Get relevant nodes from both indices
-        vectorbt_nodes = self.vectorbt_retriever.retrieve(question)
-        trading_nodes = self.trading_retriever.retrieve(question)
-        
-        # Combine and format context
-        context_parts = []
-        
-        if vectorbt_nodes:
-            context_parts.append("=== VectorBT Technical Documentation ===")
-            for i, node in enumerate(vectorbt_nodes[:5], 1):
-                context_parts.append(f"VBT-{i}: {node.text}")
-        
-        if trading_nodes:
-            context_parts.append("\n=== Trading Research Papers ===")
-            for i, node in enumerate(trading_nodes[:5], 1):
-                context_parts.append(f"PAPER-{i}: {node.text}")
+        context_parts = [
+            "Sources: VBT = VectorBT Technical Documentation, PAPER = Trading Research Papers (most relevant first)"
+        ]
+        counters = {}
+        for source, text in chunks:
+            counters[source] = counters.get(source, 0) + 1
+            context_parts.append(f"{source}-{counters[source]}: {text}")
         
         return "\n".join(context_parts)
     
-    def _build_prompt(self, question):
-        """Build the full prompt with context and conversation history."""
-        context = self._retrieve_context(question)
-        
-        prompt_parts = [
+    def _retrieve_context(self, question):
+        """Retrieve fused (source, node, score) results from both knowledge bases."""
+        return self.retriever.retrieve_fused(question)
+    
+    async def _aretrieve_context(self, question):
+        """Retrieve context from both knowledge bases without blocking the event loop."""
+        return await self.retriever.aretrieve_fused(question)
+    
+    @telemetry.span("prompt_build")
+    def _build_prompt(self, question, fused_nodes):
+        """
+        Build the full prompt within the token budget: instructions and question
+        first, then the best deduplicated chunks, then the most recent history.
+        """
+        instructions = [
             "You are a unified strategy development assistant with access to both VectorBT technical documentation and trading research papers.",
             "Use the VectorBT documentation for technical implementation details and the trading papers for theoretical insights and strategy concepts.",
             "Provide comprehensive answers that combine both technical implementation and theoretical background.",
@@ -299,16 +276,27 @@ class UnifiedStrategyChat:
             "```",
             "For inline code, use single backticks like `vbt.Portfolio`.",
             "",
+        ]
+        sources = {}
+        for source, node, _score in fused_nodes:
+            sources.setdefault(node.text, source)
+        packed = self.packer.pack(
+            question, "\n".join(instructions), list(sources), self.conversation_history
+        )
+        
+        prompt_parts = instructions + [
             "=== KNOWLEDGE BASE CONTEXT ===",
-            context,
+            self._format_context([(sources[text], text) for text in packed.context]),
             "=== END CONTEXT ===",
             ""
         ]
         
         # Add conversation history
-        if self.conversation_history:
+        if packed.summary or packed.history:
             prompt_parts.append("=== CONVERSATION HISTORY ===")
-            for i, (q, a) in enumerate(self.conversation_history[-2:], 1):
+            if packed.summary:
+                prompt_parts.append(f"Summary of the earlier conversation: {packed.summary}")
+            for i, (q, a) in enumerate(packed.history, 1):
                 prompt_parts.append(f"Q{i}: {q}")
                 prompt_parts.append(f"A{i}: {a}")
             prompt_parts.append("=== END HISTORY ===\n")
@@ -319,7 +307,7 @@ class UnifiedStrategyChat:
     
     def chat(self, question):
         """Synchronous chat method for CLI usage."""
-        full_prompt = self._build_prompt(question)
+        full_prompt = self._build_prompt(question, self._retrieve_context(question))
         
         llm = self.llm_manager.get_llm()
         response = llm.complete(full_prompt)
@@ -334,13 +322,12 @@ class UnifiedStrategyChat:
         
         return SimpleResponse(response_text)
     
-    async def achat(self, question):
-        """Async chat method for API usage."""
-        full_prompt = self._build_prompt(question)
+    async def achat(self, question, images=None):
+        """Async chat method for API usage (images are sent to vision models)."""
+        full_prompt = self._build_prompt(question, await self._aretrieve_context(question))
         
         llm = self.llm_manager.get_llm()
-        response = await llm.acomplete(full_prompt)
-        response_text = str(response)
+        response_text = await acomplete_prompt(llm, full_prompt, images)
         
         # Store in conversation history
         self.conversation_history.append((question, response_text))
@@ -350,6 +337,125 @@ class UnifiedStrategyChat:
                 self.response = text
         
         return SimpleResponse(response_text)
+    
+    async def astream_chat(self, question, images=None):
+        """Async streaming chat method: yields tokens as the LLM generates them."""
+        full_prompt = self._build_prompt(question, await self._aretrieve_context(question))
+        
+        llm = self.llm_manager.get_llm()
+        parts = []
+        async for token in astream_prompt(llm, full_prompt, images):
+            parts.append(token)
+            yield token
+        
+        # Store in conversation history
+        self.conversation_history.append((question, "".join(parts)))
+
+class CodeReviewChat:
+    """Simple chat interface for code review without RAG overhead."""
+
+    def __init__(self, code, llm_manager, conversation_history=None):
+        self.code = code
+        self.llm_manager = llm_manager
+        self.conversation_history = conversation_history if conversation_history is not None else ConversationHistory()
+        self.packer = PromptPacker()
+    
+    def to_state(self):
+        """JSON state of the session (code and history), for the session store."""
+        return {"code": self.code, "history": self.conversation_history.to_state()}
+    
+    @classmethod
+    def from_state(cls, state, llm_manager):
+        return cls(state["code"], llm_manager, ConversationHistory.from_state(state.get("history")))
+
+    @telemetry.span("prompt_build")
+    def _build_context(self, question):
+        """
+        Build the prompt within the token budget: the whole code if it fits,
+        otherwise the definitions most related to the question, then history.
+        """
+        instructions = [
+            "You are a code review assistant. Please analyze the following code and answer questions about it.",
+            "",
+            "IMPORTANT: When showing code in your responses, ALWAYS use proper markdown code blocks with triple backticks (```) and specify the language. For example:",
+            "```python",
+            "def example():",
+            "    return 'code here'",
+            "```",
+            "",
+            "For inline code references, use single backticks like `variable_name`.",
+            "",
+        ]
+        packed = self.packer.pack_code(
+            question, self.code, "\n".join(instructions), self.conversation_history
+        )
+        code = "".join(packed.context).rstrip("\n")
+        if packed.dropped_context:
+            code += f"\n# ... {packed.dropped_context} blocks omitted (not related to the question)"
+        context_parts = instructions + [f"--- CODE TO REVIEW ---\n{code}\n--- END CODE ---"]
+
+        # Add conversation history for context
+        if packed.summary or packed.history:
+            context_parts.append("\n--- CONVERSATION HISTORY ---")
+            if packed.summary:
+                context_parts.append(f"Summary of the earlier conversation: {packed.summary}")
+            for i, (q, a) in enumerate(packed.history):
+                context_parts.append(f"Q{i+1}: {q}")
+                context_parts.append(f"A{i+1}: {a}")
+            context_parts.append("--- END HISTORY ---\n")
+
+        context_parts.append(f"Current question: {question}")
+        return "\n".join(context_parts)
+
+    def chat(self, question):
+        """Synchronous chat method for CLI usage."""
+        full_prompt = self._build_context(question)
+
+        # Get response from LLM
+        llm = self.llm_manager.get_llm()
+        response = llm.complete(full_prompt)
+        response_text = str(response)
+
+        # Store in conversation history
+        self.conversation_history.append((question, response_text))
+
+        # Return response in expected format
+        class SimpleResponse:
+            def __init__(self, text):
+                self.response = text
+
+        return SimpleResponse(response_text)
+
+    async def achat(self, question, images=None):
+        """Async chat method for API usage (images are sent to vision models)."""
+        full_prompt = self._build_context(question)
+
+        # Get response from LLM
+        llm = self.llm_manager.get_llm()
+        response_text = await acomplete_prompt(llm, full_prompt, images)
+
+        # Store in conversation history
+        self.conversation_history.append((question, response_text))
+
+        # Return response in expected format
+        class SimpleResponse:
+            def __init__(self, text):
+                self.response = text
+
+        return SimpleResponse(response_text)
+
+    async def astream_chat(self, question, images=None):
+        """Async streaming chat method: yields tokens as the LLM generates them."""
+        full_prompt = self._build_context(question)
+
+        llm = self.llm_manager.get_llm()
+        parts = []
+        async for token in astream_prompt(llm, full_prompt, images):
+            parts.append(token)
+            yield token
+
+        # Store in conversation history
+        self.conversation_history.append((question, "".join(parts)))
 
 def vectorbt_mode(api_mode=False, llm_manager=None):
     """
@@ -379,80 +485,6 @@ def review_mode(api_mode=False, code_snippet=None, llm_manager=None):
         print("No code provided. Returning to main menu.", file=sys.stderr)
         return
     
-    # Create a simple chat interface that includes the code in context
-    class CodeReviewChat:
-        """Simple chat interface for code review without RAG overhead."""
-        
-        def __init__(self, code, llm_manager):
-            self.code = code
-            self.llm_manager = llm_manager
-            self.conversation_history = []
-            
-        def _build_context(self, question):
-            """Build the full context including code and conversation history."""
-            context_parts = [
-                "You are a code review assistant. Please analyze the following code and answer questions about it.",
-                "",
-                "IMPORTANT: When showing code in your responses, ALWAYS use proper markdown code blocks with triple backticks (```) and specify the language. For example:",
-                "```python",
-                "def example():",
-                "    return 'code here'",
-                "```",
-                "",
-                "For inline code references, use single backticks like `variable_name`.",
-                "",
-                f"--- CODE TO REVIEW ---\n{self.code}\n--- END CODE ---"
-            ]
-            
-            # Add conversation history for context
-            if self.conversation_history:
-                context_parts.append("\n--- CONVERSATION HISTORY ---")
-                for i, (q, a) in enumerate(self.conversation_history[-3:]):  # Keep last 3 exchanges
-                    context_parts.append(f"Q{i+1}: {q}")
-                    context_parts.append(f"A{i+1}: {a}")
-                context_parts.append("--- END HISTORY ---\n")
-            
-            context_parts.append(f"Current question: {question}")
-            return "\n".join(context_parts)
-            
-        def chat(self, question):
-            """Synchronous chat method for CLI usage."""
-            full_prompt = self._build_context(question)
-            
-            # Get response from LLM
-            llm = self.llm_manager.get_llm()
-            response = llm.complete(full_prompt)
-            response_text = str(response)
-            
-            # Store in conversation history
-            self.conversation_history.append((question, response_text))
-            
-            # Return response in expected format
-            class SimpleResponse:
-                def __init__(self, text):
-                    self.response = text
-            
-            return SimpleResponse(response_text)
-            
-        async def achat(self, question):
-            """Async chat method for API usage."""
-            full_prompt = self._build_context(question)
-            
-            # Get response from LLM
-            llm = self.llm_manager.get_llm()
-            response = await llm.acomplete(full_prompt)
-            response_text = str(response)
-            
-            # Store in conversation history
-            self.conversation_history.append((question, response_text))
-            
-            # Return response in expected format
-            class SimpleResponse:
-                def __init__(self, text):
-                    self.response = text
-            
-            return SimpleResponse(response_text)
-    
     chat_engine = CodeReviewChat(code_to_review, llm_manager)
 
     if api_mode:
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Construction des index en arrière-plan.
+Chaque construction est un job (id, statut, progression) exécuté dans un thread
+dédié, hors de la boucle d'événements : l'API continue de répondre pendant
+qu'un index se construit.
+"""
+
+import time
+import uuid
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from . import telemetry
+
+logger = telemetry.get_logger("build_jobs")
+
+
+class BuildStatus:
+    QUEUED = "queued"
+    BUILDING = "building"
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass
+class BuildJob:
+    """État d'une construction d'index."""
+    id: str
+    kb_id: str
+    status: str = BuildStatus.QUEUED
+    progress: float = 0.0
+    message: str = ""
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class BuildJobManager:
+    """Soumet et suit les constructions d'index ; une seule construction active par knowledge base."""
+
+    def __init__(self, build_fn: Callable, on_complete: Optional[Callable] = None, max_workers: int = 1):
+        self.build_fn = build_fn  # build_fn(kb_id, progress) -> bool
+        self.on_complete = on_complete  # on_complete(job), appelé après chaque job terminé
+        self.jobs: Dict[str, BuildJob] = {}
+        self._latest: Dict[str, str] = {}  # kb_id -> id du dernier job
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="index-build")
+
+    def submit(self, kb_id: str) -> BuildJob:
+        """Lance la construction de `kb_id`, ou retourne le job déjà en cours."""
+        with self._lock:
+            current = self.latest_job(kb_id)
+            if current and current.status in (BuildStatus.QUEUED, BuildStatus.BUILDING):
+                return current
+            job = BuildJob(id=uuid.uuid4().hex, kb_id=kb_id)
+            self.jobs[job.id] = job
+            self._latest[kb_id] = job.id
+
+        print(f"Queued index build for '{kb_id}' (job {job.id})")
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: BuildJob):
+        def progress(fraction, message):
+            job.progress = round(min(max(fraction, 0.0), 1.0), 3)
+            job.message = message
+
+        job.status = BuildStatus.BUILDING
+        job.started_at = time.time()
+        try:
+            if self.build_fn(job.kb_id, progress):
+                job.status = BuildStatus.READY
+                job.progress = 1.0
+            else:
+                job.status = BuildStatus.FAILED
+                job.error = "Build returned no index (see server logs)"
+        except Exception as e:
+            logger.exception("Index build for '%s' failed", job.kb_id)
+            job.status = BuildStatus.FAILED
+            job.error = str(e)
+        job.finished_at = time.time()
+        print(f"Index build for '{job.kb_id}' finished: {job.status}")
+
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception:
+                logger.exception("Build completion hook failed for '%s'", job.kb_id)
+
+    def get(self, job_id: str) -> Optional[BuildJob]:
+        return self.jobs.get(job_id)
+
+    def latest_job(self, kb_id: str) -> Optional[BuildJob]:
+        job_id = self._latest.get(kb_id)
+        return self.jobs.get(job_id) if job_id else None
+
+    def list_jobs(self) -> List[BuildJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Découpage des sources Python par l'AST : un chunk par fonction, méthode ou
+classe au lieu de fenêtres de 512 tokens qui coupent les fonctions en plein
+corps. Chaque chunk porte son nom qualifié, sa signature, la première ligne de
+sa docstring et ses lignes de début et de fin.
+Les définitions trop longues sont découpées hiérarchiquement : une classe en
+en-tête + méthodes, une fonction en groupes d'instructions de premier niveau,
+une instruction énorme en fenêtres de lignes.
+"""
+
+import os
+import ast
+from dataclasses import dataclass
+from typing import Any, List, Sequence
+
+from pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser, SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+
+# Taille maximale d'un chunk de code (≈ 512 tokens du modèle d'embedding)
+CODE_CHUNK_MAX_CHARS = int(os.getenv("CODE_CHUNK_MAX_CHARS", "2000"))
+
+# Longueur maximale de la signature et de la docstring en métadonnées
+METADATA_MAX_CHARS = 300
+
+# Métadonnées utiles au LLM mais pas à l'embedding
+POSITION_METADATA_KEYS = ["start_line", "end_line", "part", "parts"]
+
+
+@dataclass
+class CodeChunk:
+    """Un morceau de source : une définition entière ou une partie d'une définition trop longue."""
+
+    text: str
+    qualified_name: str
+    kind: str  # module, class, function, method
+    signature: str
+    docstring: str
+    start_line: int
+    end_line: int
+    part: int = 1
+    parts: int = 1
+
+    def metadata(self):
+        return {
+            "qualified_name": self.qualified_name,
+            "symbol_kind": self.kind,
+            "signature": _truncate(self.signature),
+            "docstring": _truncate(self.docstring),
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "part": self.part,
+            "parts": self.parts,
+        }
+
+
+def _truncate(text, max_chars=METADATA_MAX_CHARS):
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+
+def module_name(path):
+    """Nom pointé du module de `path`, en remontant tant que les dossiers sont des packages."""
+    path = os.path.abspath(path)
+    directory, filename = os.path.split(path)
+    parts = [] if filename == "__init__.py" else [os.path.splitext(filename)[0]]
+    while os.path.exists(os.path.join(directory, "__init__.py")):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return ".".join(parts)
+
+
+def _signature(node):
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(base) for base in node.bases] + [ast.unparse(kw) for kw in node.keywords]
+        return f"class {node.name}({', '.join(bases)})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _docstring_summary(node):
+    docstring = ast.get_docstring(node)
+    return docstring.strip().split("\n\n")[0].replace("\n", " ") if docstring else ""
+
+
+def _first_line(node):
+    """Première ligne d'une instruction, décorateurs compris."""
+    decorators = getattr(node, "decorator_list", None)
+    return min([node.lineno] + [d.lineno for d in decorators]) if decorators else node.lineno
+
+
+def _child_statements(node):
+    """Instructions filles d'une instruction composée, dans l'ordre du source."""
+    children = []
+    for field in ("body", "orelse", "finalbody"):
+        children.extend(getattr(node, field, None) or [])
+    for handler in getattr(node, "handlers", None) or []:
+        children.extend(handler.body)
+    for case in getattr(node, "cases", None) or []:
+        children.extend(case.body)
+    return sorted(children, key=_first_line)
+
+
+def _is_definition(node):
+    return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+
+
+class _Chunker:
+    """Découpe un fichier ; `lines` sont les lignes du source (1-indexées via start - 1)."""
+
+    def __init__(self, source, module, max_chars):
+        self.lines = source.splitlines(keepends=True)
+        self.module = module
+        self.max_chars = max_chars
+
+    def text(self, start, end):
+        return "".join(self.lines[start - 1:end])
+
+    def size(self, start, end):
+        return sum(len(line) for line in self.lines[start - 1:end])
+
+    def spans(self, statements, start):
+        """
+        Étendue (début, fin, instruction) de chaque instruction ; les commentaires
+        et lignes vides qui la précèdent lui sont rattachés, pour que les étendues se suivent.
+        """
+        spans = []
+        for statement in statements:
+            spans.append((start, statement.end_lineno, statement))
+            start = statement.end_lineno + 1
+        return spans
+
+    def split_lines(self, start, end):
+        """Fenêtres de lignes consécutives d'au plus `max_chars` caractères (au moins une ligne)."""
+        windows = []
+        window_start, size = start, 0
+        for line_no in range(start, end + 1):
+            line_size = len(self.lines[line_no - 1])
+            if size and size + line_size > self.max_chars:
+                windows.append((window_start, line_no - 1))
+                window_start, size = line_no, 0
+            size += line_size
+        windows.append((window_start, end))
+        return windows
+
+    def expand(self, start, end, statement):
+        """
+        Découpe une instruction trop longue : une instruction composée (for, if,
+        with, try...) en son en-tête puis ses instructions filles, récursivement ;
+        sinon en fenêtres de lignes.
+        """
+        children = _child_statements(statement) if statement is not None else []
+        if not children:
+            return self.split_lines(start, end)
+        child_start = _first_line(children[0])
+        spans = [(start, child_start - 1, None)] if child_start > start else []
+        spans += self.spans(children, max(child_start, start))
+        if spans[-1][1] < end:
+            spans.append((spans[-1][1] + 1, end, None))
+        return self.group(spans)
+
+    def group(self, spans):
+        """Regroupe les étendues qui se suivent en blocs d'au plus `max_chars` caractères."""
+        groups = []
+        current = None
+        size = 0
+        for start, end, statement in spans:
+            span_size = self.size(start, end)
+            if span_size > self.max_chars:
+                if current:
+                    groups.append(current)
+                    current = None
+                groups.extend(self.expand(start, end, statement))
+                continue
+            if current and (size + span_size > self.max_chars or start != current[1] + 1):
+                groups.append(current)
+                current = None
+            if current is None:
+                current, size = (start, end), 0
+            current = (current[0], end)
+            size += span_size
+        if current:
+            groups.append(current)
+        return groups
+
+    def parts(self, groups, qualified_name, kind, signature, docstring):
+        """Un chunk par groupe ; les parties suivantes rappellent de quelle définition elles viennent."""
+        chunks = []
+        for i, (start, end) in enumerate(groups, start=1):
+            text = self.text(start, end)
+            if i > 1:
+                text = f"# {qualified_name} (part {i}/{len(groups)})\n{text}"
+            chunks.append(CodeChunk(
+                text, qualified_name, kind, signature, docstring, start, end, part=i, parts=len(groups),
+            ))
+        return chunks
+
+    def definition(self, node, prefix, in_class=False):
+        qualified_name = f"{prefix}.{node.name}" if prefix else node.name
+        kind = "class" if isinstance(node, ast.ClassDef) else ("method" if in_class else "function")
+        signature = _signature(node)
+        docstring = _docstring_summary(node)
+        start, end = _first_line(node), node.end_lineno
+
+        if self.size(start, end) <= self.max_chars:
+            return [CodeChunk(self.text(start, end), qualified_name, kind, signature, docstring, start, end)]
+
+        body_start = _first_line(node.body[0])
+        if kind == "class":
+            # En-tête de classe (docstring, attributs) puis des chunks par méthode
+            spans = [(start, body_start - 1, None)] if body_start > start else []
+            methods = []
+            for statement, span in zip(node.body, self.spans(node.body, body_start)):
+                if _is_definition(statement):
+                    methods.extend(self.definition(statement, qualified_name, in_class=True))
+                else:
+                    spans.append(span)
+            return self.parts(self.group(spans), qualified_name, kind, signature, docstring) + methods
+
+        # Fonction : en-tête + instructions du corps, regroupées
+        spans = [(start, body_start - 1, None)] if body_start > start else []
+        spans += self.spans(node.body, body_start)
+        return self.parts(self.group(spans), qualified_name, kind, signature, docstring)
+
+    def chunk(self, tree):
+        """Définitions de premier niveau, et le code de module entre elles (imports, constantes)."""
+        module_docstring = _docstring_summary(tree)
+        module_spans = []
+        definitions = []
+        start = 1
+        for statement in tree.body:
+            if _is_definition(statement):
+                definitions.extend(self.definition(statement, self.module))
+            else:
+                module_spans.append((start, statement.end_lineno, statement))
+            start = statement.end_lineno + 1
+        module_chunks = self.parts(
+            self.group(module_spans), self.module or "<module>", "module", "", module_docstring
+        )
+        # Ordre du fichier
+        return sorted(module_chunks + definitions, key=lambda chunk: chunk.start_line)
+
+
+def chunk_python_source(source, module="", max_chars=CODE_CHUNK_MAX_CHARS):
+    """
+    Découpe un source Python en CodeChunk, dans l'ordre du fichier.
+    Lève SyntaxError si le source ne se parse pas.
+    """
+    tree = ast.parse(source)
+    return _Chunker(source, module, max_chars).chunk(tree)
+
+
+class PythonCodeSplitter(NodeParser):
+    """
+    Node parser des knowledge bases : les fichiers .py sont découpés par l'AST,
+    les autres documents (et le code qui ne se parse pas) par un SentenceSplitter.
+    """
+
+    chunk_size: int = Field(default=512, description="Chunk size of the text splitter (tokens).")
+    chunk_overlap: int = Field(default=50, description="Chunk overlap of the text splitter (tokens).")
+    max_chars: int = Field(default=CODE_CHUNK_MAX_CHARS, description="Maximum size of a code chunk.")
+    _text_splitter: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls):
+        return "PythonCodeSplitter"
+
+    def _get_text_splitter(self):
+        # Recréé si Settings.chunk_size / chunk_overlap ont changé
+        splitter = self._text_splitter
+        if splitter is None or (splitter.chunk_size, splitter.chunk_overlap) != (self.chunk_size, self.chunk_overlap):
+            splitter = SentenceSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+            self._text_splitter = splitter
+        return splitter
+
+    def _parse_code(self, node):
+        path = node.metadata.get("file_path", "")
+        chunks = chunk_python_source(node.get_content(), module_name(path) if path else "", self.max_chars)
+        nodes = build_nodes_from_splits([chunk.text for chunk in chunks], node, id_func=self.id_func)
+        for text_node, chunk in zip(nodes, chunks):
+            text_node.metadata.update(chunk.metadata())
+            text_node.excluded_embed_metadata_keys = list(text_node.excluded_embed_metadata_keys) + POSITION_METADATA_KEYS
+        return nodes
+
+    def _parse_nodes(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> List[BaseNode]:
+        parsed = []
+        for node in nodes:
+            if node.metadata.get("file_path", "").endswith(".py"):
+                try:
+                    parsed.extend(self._parse_code(node))
+                    continue
+                except SyntaxError:
+                    pass  # Source Python 2 ou invalide : découpage texte
+            parsed.extend(self._get_text_splitter()._parse_nodes([node], show_progress=False))
+        return parsed
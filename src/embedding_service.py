@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Service d'embedding des questions pour le process API.
+Les questions arrivant dans une courte fenêtre sont regroupées en un seul
+forward pass, les embeddings récents sont gardés en cache LRU, et le modèle
+tourne dans un thread dédié, hors de la boucle d'événements.
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+
+from . import telemetry
+
+
+class EmbeddingService:
+    """Embedding des questions par lots, avec cache LRU, dans un thread worker dédié."""
+
+    def __init__(self, embed_model, window_ms=5, max_batch=32, cache_size=2048):
+        self.embed_model = embed_model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.stats = {"requests": 0, "cache_hits": 0, "batches": 0, "embedded": 0}
+        self._cache = OrderedDict()  # question -> embedding
+        self._pending = {}  # question -> Future, partagé par les requêtes identiques en cours
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Retourne un Future résolu avec l'embedding de la question."""
+        with self._lock:
+            self.stats["requests"] += 1
+            hit = text in self._cache
+            if hit:
+                self._cache.move_to_end(text)
+                self.stats["cache_hits"] += 1
+                future = Future()
+                future.set_result(self._cache[text])
+            elif text in self._pending:
+                future = self._pending[text]
+            else:
+                future = Future()
+                self._pending[text] = future
+                self._queue.put(text)
+        telemetry.record_cache("embedding", hit)
+        return future
+
+    def embed(self, text):
+        """Embedding synchrone (appelé depuis les threads de retrieval)."""
+        with telemetry.span("embedding"):
+            return self.submit(text).result()
+
+    async def aembed(self, text):
+        """Embedding asynchrone, sans bloquer la boucle d'événements."""
+        with telemetry.span("embedding"):
+            return await asyncio.wrap_future(self.submit(text))
+
+    def _run(self):
+        """Boucle du worker : attend une question, puis collecte le lot pendant la fenêtre."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, texts):
+        try:
+            embeddings = self._query_embeddings(texts)
+        except Exception as e:
+            with self._lock:
+                futures = [self._pending.pop(text) for text in texts]
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["embedded"] += len(texts)
+            futures = []
+            for text, embedding in zip(texts, embeddings):
+                self._cache[text] = embedding
+                futures.append(self._pending.pop(text))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        for future, embedding in zip(futures, embeddings):
+            future.set_result(embedding)
+
+    def _query_embeddings(self, texts):
+        """Un seul forward pass pour toutes les questions du lot."""
+        if hasattr(self.embed_model, "_embed"):
+            # HuggingFaceEmbedding : encode() en lot avec le prompt de requête
+            return self.embed_model._embed(texts, prompt_name="query")
+        return [self.embed_model.get_query_embedding(text) for text in texts]
+
+
+class ServiceQueryEmbedding(BaseEmbedding):
+    """Embedding LlamaIndex : questions via le service (cache + lots), documents via le modèle."""
+
+    _service: EmbeddingService = PrivateAttr()
+
+    def __init__(self, service, **kwargs):
+        super().__init__(
+            model_name=service.embed_model.model_name,
+            embed_batch_size=service.embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._service = service
+
+    @classmethod
+    def class_name(cls):
+        return "ServiceQueryEmbedding"
+
+    def _get_query_embedding(self, query):
+        return self._service.embed(query)
+
+    async def _aget_query_embedding(self, query):
+        return await self._service.aembed(query)
+
+    def _get_text_embedding(self, text):
+        return self._service.embed_model._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts):
+        return self._service.embed_model._get_text_embeddings(texts)
+
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Pool de chat engines réutilisables pour les knowledge bases.
+Les retrievers et postprocessors sont construits une seule fois par
+(kb_id, configuration LLM) ; seule la conversation est propre à la requête.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from llama_index.core.chat_engine import ContextChatEngine
+
+from . import model_registry, telemetry
+from .prompt_packer import CODE_FORMAT_INSTRUCTIONS
+from .rerankers import build_reranker
+from .sparse_index import BM25Retriever, HybridRetriever
+from .symbol_index import SymbolFirstRetriever, SymbolRetriever
+
+logger = telemetry.get_logger("engine_pool")
+
+
+class ChatEnginePool:
+    """Pool de chat engines indexé par (kb_id, clé API, modèle)."""
+
+    def __init__(self, similarity_top_k=15, rerank_top_n=5, max_idle_per_key=8, kb_manager=None):
+        self.similarity_top_k = similarity_top_k
+        self.rerank_top_n = rerank_top_n
+        self.max_idle_per_key = max_idle_per_key
+        self.kb_manager = kb_manager  # fournit le reranker et l'index BM25 de chaque knowledge base
+        # Recherche hybride : candidats dense + BM25, fusionnés avant reranking
+        self.hybrid_dense_top_k = int(os.getenv("HYBRID_DENSE_TOP_K") or 8)
+        self.hybrid_sparse_top_k = int(os.getenv("HYBRID_SPARSE_TOP_K") or 8)
+        self.hybrid_top_n = int(os.getenv("HYBRID_TOP_N") or 10)
+        self._idle = {}  # (kb_id, api_key, model) -> engines libres
+        self._postprocessors = {}  # kb_id -> postprocessors partagés
+        self._lock = threading.Lock()
+        self.stats = {"built": 0, "reused": 0}
+
+    def get_reranker_kind(self, kb_id):
+        """Reranker configuré pour la knowledge base (Cohere si une clé est définie, à défaut)."""
+        kb_config = self.kb_manager.get_knowledge_base(kb_id) if self.kb_manager else None
+        if kb_config:
+            return kb_config.reranker
+        cohere_key = os.getenv("COHERE_API_KEY")
+        return "cohere" if cohere_key and cohere_key.strip() else "none"
+
+    def get_sparse_index(self, kb_id):
+        """Index BM25 de la knowledge base, ou None s'il n'existe pas."""
+        kb_config = self.kb_manager.get_knowledge_base(kb_id) if self.kb_manager else None
+        if not kb_config or not kb_config.chroma_path:
+            return None
+        return model_registry.load_sparse_index(kb_config.chroma_path)
+
+    def get_symbol_index(self, kb_id):
+        """Table des symboles du code de la knowledge base, ou None si elle n'existe pas."""
+        kb_config = self.kb_manager.get_knowledge_base(kb_id) if self.kb_manager else None
+        if not kb_config or not kb_config.chroma_path:
+            return None
+        return model_registry.load_symbol_index(kb_config.chroma_path)
+
+    def get_postprocessors(self, kb_id):
+        """Retourne les postprocessors de la knowledge base, construits une seule fois."""
+        with self._lock:
+            if kb_id not in self._postprocessors:
+                kind = self.get_reranker_kind(kb_id)
+                try:
+                    reranker = build_reranker(kind, top_n=self.rerank_top_n)
+                except Exception as e:
+                    logger.warning("Could not use %s reranking for '%s': %s", kind, kb_id, e)
+                    reranker = None
+                self._postprocessors[kb_id] = [reranker] if reranker else []
+            return self._postprocessors[kb_id]
+
+    def build_engine(self, index, kb_id, llm):
+        """
+        Construit un chat engine 'context' pour l'index, avec reranking si disponible.
+        Si un index BM25 a été construit pour la knowledge base, la recherche est
+        hybride (dense + BM25) et moins de candidats partent au reranking.
+        Si la table des symboles du code existe, les questions qui nomment un symbole
+        (`Portfolio.from_signals`) reçoivent directement ses chunks, sans recherche ni reranking.
+        """
+        postprocessors = self.get_postprocessors(kb_id)
+        sparse_index = self.get_sparse_index(kb_id)
+        if sparse_index is not None:
+            retriever = HybridRetriever(
+                index.as_retriever(similarity_top_k=self.hybrid_dense_top_k),
+                BM25Retriever(sparse_index, similarity_top_k=self.hybrid_sparse_top_k),
+                top_n=self.hybrid_top_n,
+            )
+            symbol_index = self.get_symbol_index(kb_id)
+            if symbol_index:
+                # Le reranking passe dans le retriever, pour être sauté sur un symbole
+                retriever = SymbolFirstRetriever(
+                    SymbolRetriever(symbol_index, sparse_index, top_n=self.rerank_top_n),
+                    retriever,
+                    postprocessors,
+                )
+                postprocessors = []
+            return ContextChatEngine.from_defaults(
+                retriever=retriever,
+                node_postprocessors=postprocessors,
+                system_prompt=CODE_FORMAT_INSTRUCTIONS,
+                llm=llm
+            )
+        if postprocessors:
+            return index.as_chat_engine(
+                chat_mode="context",
+                similarity_top_k=self.similarity_top_k,
+                node_postprocessors=postprocessors,
+                system_prompt=CODE_FORMAT_INSTRUCTIONS,
+                llm=llm
+            )
+        return index.as_chat_engine(
+            chat_mode="context",
+            similarity_top_k=10,
+            system_prompt=CODE_FORMAT_INSTRUCTIONS,
+            llm=llm
+        )
+
+    def acquire(self, index, kb_id, llm_manager):
+        """Récupère un engine libre pour la config courante, ou en construit un nouveau."""
+        key = (kb_id, *llm_manager.current_config)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats["reused"] += 1
+                return key, idle.pop()
+
+        engine = self.build_engine(index, kb_id, llm_manager.get_llm())
+        with self._lock:
+            self.stats["built"] += 1
+        return key, engine
+
+    def release(self, key, engine):
+        """Remet un engine dans le pool après avoir vidé sa mémoire de conversation."""
+        engine.reset()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(engine)
+
+    @contextmanager
+    def lease(self, index, kb_id, llm_manager):
+        """Prête un engine le temps d'une requête."""
+        key, engine = self.acquire(index, kb_id, llm_manager)
+        try:
+            yield engine
+        finally:
+            self.release(key, engine)
+
+    def clear(self, kb_id=None):
+        """Oublie les engines (et postprocessors) d'une knowledge base, ou de toutes."""
+        with self._lock:
+            if kb_id is None:
+                self._idle.clear()
+                self._postprocessors.clear()
+                return
+            for key in [k for k in self._idle if k[0] == kb_id]:
+                del self._idle[key]
+            self._postprocessors.pop(kb_id, None)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Pools d'exécution partagés par les handlers asynchrones.
+Les appels synchrones (Chroma, chargement d'index, reranking) passent par un
+pool de threads, le transcodage d'images par un pool de process ; la boucle
+d'événements ne fait plus de travail bloquant. Chaque pool a un nombre maximal
+de tâches en attente : au-delà, `ExecutorSaturated` est levée et l'API répond
+503 au lieu d'empiler des requêtes qui ralentiraient toutes les autres.
+"""
+
+import os
+import asyncio
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+IO_EXECUTOR_THREADS = int(os.getenv("IO_EXECUTOR_THREADS", "16"))
+IO_EXECUTOR_MAX_PENDING = int(os.getenv("IO_EXECUTOR_MAX_PENDING", "64"))
+CPU_EXECUTOR_PROCESSES = int(os.getenv("CPU_EXECUTOR_PROCESSES") or min(2, os.cpu_count() or 1))
+CPU_EXECUTOR_MAX_PENDING = int(os.getenv("CPU_EXECUTOR_MAX_PENDING", "8"))
+
+
+class ExecutorSaturated(Exception):
+    """Le pool a déjà `max_pending` tâches en cours ou en attente."""
+
+
+class BoundedExecutor:
+    """Executor concurrent.futures avec un nombre borné de tâches en cours ou en attente."""
+
+    def __init__(self, name, executor, max_pending, copy_context=False):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self.copy_context = copy_context  # Threads : la trace de la requête suit la tâche
+        self.pending = 0
+        self.stats = {"submitted": 0, "rejected": 0, "peak_pending": 0}
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise ExecutorSaturated(f"{self.name} pool saturated ({self.pending} tasks pending)")
+            self.pending += 1
+            self.stats["submitted"] += 1
+            self.stats["peak_pending"] = max(self.stats["peak_pending"], self.pending)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args):
+        """Comme `Executor.submit`, ou `ExecutorSaturated` si le pool est plein."""
+        self._acquire()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Libéré à la fin de la tâche, même si l'appelant a abandonné (timeout, client parti)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        """Exécute `fn(*args)` dans le pool sans bloquer la boucle d'événements."""
+        if self.copy_context:
+            return await asyncio.wrap_future(self.submit(contextvars.copy_context().run, fn, *args))
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "pending": self.pending, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_lock = threading.Lock()
+_io_executor = None
+_cpu_executor = None
+
+
+def get_io_executor():
+    """Pool de threads des appels synchrones, créé au premier appel."""
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            _io_executor = BoundedExecutor(
+                "io",
+                ThreadPoolExecutor(max_workers=IO_EXECUTOR_THREADS, thread_name_prefix="io"),
+                IO_EXECUTOR_MAX_PENDING,
+                copy_context=True,
+            )
+        return _io_executor
+
+
+def get_cpu_executor():
+    """
+    Pool de process du travail CPU en Python pur (transcodage d'images), créé au
+    premier appel. Les process sont lancés en `spawn` : un fork du process API
+    copierait ses threads et l'état de torch.
+    """
+    global _cpu_executor
+    with _lock:
+        if _cpu_executor is None:
+            _cpu_executor = BoundedExecutor(
+                "cpu",
+                ProcessPoolExecutor(
+                    max_workers=CPU_EXECUTOR_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                ),
+                CPU_EXECUTOR_MAX_PENDING,
+            )
+        return _cpu_executor
+
+
+async def run_io(fn, *args):
+    return await get_io_executor().run(fn, *args)
+
+
+async def run_cpu(fn, *args):
+    return await get_cpu_executor().run(fn, *args)
+
+
+def get_stats():
+    with _lock:
+        executors = [e for e in (_io_executor, _cpu_executor) if e is not None]
+    return {executor.name: executor.get_stats() for executor in executors}
+
+
+def shutdown():
+    global _io_executor, _cpu_executor
+    with _lock:
+        executors = [e for e in (_io_executor, _cpu_executor) if e is not None]
+        _io_executor = _cpu_executor = None
+    for executor in executors:
+        executor.shutdown()
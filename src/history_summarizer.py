@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Résumé glissant des historiques de conversation.
+Après chaque réponse, les échanges les plus anciens sont condensés en tâche de
+fond dans un résumé de taille fixe ; seuls les derniers échanges restent en
+clair. La requête suivante envoie ce résumé au lieu des transcriptions, et la
+mémoire d'une conversation ne grossit plus avec sa longueur.
+"""
+
+import os
+import asyncio
+
+from . import telemetry
+from .prompt_packer import PromptPacker
+
+logger = telemetry.get_logger("history")
+
+# Échanges gardés en clair, échanges condensés à la fois, taille du résumé
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "2"))
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "2"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+# Si le résumé échoue (LLM indisponible), les plus vieux échanges sont abandonnés au-delà
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "20"))
+# Taille d'une réponse passée envoyée au résumé
+SUMMARY_ANSWER_TOKENS = 600
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and a "
+    "trading / VectorBT assistant. Update the summary with the new exchanges. "
+    "Keep the user's goals, the code, APIs, parameters and decisions discussed, "
+    "and any open question. Drop greetings and repeated explanations. "
+    "Answer with the updated summary only, in at most {words} words."
+)
+
+
+class ConversationHistory(list):
+    """
+    Liste de (question, réponse) avec le résumé des échanges plus anciens.
+    Reste une liste : le code qui fait `append` ou itère sur l'historique ne change pas.
+    """
+
+    def __init__(self, turns=(), summary=""):
+        super().__init__(turns)
+        self.summary = summary
+        self.summarizing = False
+        self.generation = 0  # Incrémenté par clear() : un résumé en cours est alors ignoré
+
+    def copy(self):
+        return ConversationHistory(self, self.summary)
+
+    def to_state(self):
+        """État JSON, pour le stockage des sessions."""
+        return {"turns": [list(turn) for turn in self], "summary": self.summary}
+
+    @classmethod
+    def from_state(cls, state):
+        state = state or {}
+        return cls((tuple(turn) for turn in state.get("turns", [])), state.get("summary", ""))
+
+    def clear(self):
+        super().clear()
+        self.summary = ""
+        self.generation += 1
+
+    def fold(self, count, summary, generation):
+        """Remplace les `count` premiers échanges par `summary` (sauf si l'historique a été vidé entre-temps)."""
+        if generation != self.generation:
+            return False
+        del self[:count]
+        self.summary = summary
+        return True
+
+
+class HistorySummarizer:
+    """Condense les vieux échanges d'un ConversationHistory avec le LLM, hors du chemin des requêtes."""
+
+    def __init__(self, llm_manager, keep_turns=HISTORY_KEEP_TURNS, batch=HISTORY_SUMMARY_BATCH,
+                 summary_tokens=HISTORY_SUMMARY_TOKENS, max_turns=HISTORY_MAX_TURNS, packer=None):
+        self.llm_manager = llm_manager
+        self.keep_turns = keep_turns
+        self.batch = max(1, batch)
+        self.summary_tokens = summary_tokens
+        self.max_turns = max(max_turns, keep_turns + self.batch)
+        self.packer = packer or PromptPacker()
+        self.stats = {"summaries": 0, "failures": 0, "dropped_turns": 0}
+        self._tasks = set()  # Références des tâches en cours (sinon collectées par le GC)
+
+    def needs_summary(self, history):
+        return (
+            isinstance(history, ConversationHistory)
+            and not history.summarizing
+            and len(history) >= self.keep_turns + self.batch
+        )
+
+    def build_prompt(self, summary, turns):
+        parts = [SUMMARY_INSTRUCTIONS.format(words=self.summary_tokens * 3 // 4), ""]
+        parts.append(f"Current summary:\n{summary or '(empty)'}")
+        parts.append("\nNew exchanges:")
+        for question, answer in turns:
+            parts.append(f"User: {question}")
+            parts.append(f"Assistant: {self.packer.truncate(answer, SUMMARY_ANSWER_TOKENS)}")
+        return "\n".join(parts)
+
+    async def summarize(self, history):
+        """
+        Condense tous les échanges sauf les `keep_turns` derniers. Retourne les
+        échanges condensés, ou None si le résumé n'a pas changé.
+        """
+        if not self.needs_summary(history):
+            return None
+        history.summarizing = True
+        generation = history.generation
+        count = len(history) - self.keep_turns
+        folded = history[:count]
+        prompt = self.build_prompt(history.summary, folded)
+        try:
+            # Tâche de fond : sa propre configuration, comptée par le dispatcher
+            self.llm_manager.begin_request()
+            try:
+                response = await self.llm_manager.get_llm().acomplete(prompt)
+            except Exception as e:
+                self.llm_manager.report_result(error=e)
+                raise
+            self.llm_manager.report_result()
+            summary = self.packer.truncate(str(response).strip(), self.summary_tokens)
+            if history.fold(count, summary, generation):
+                self.stats["summaries"] += 1
+                return folded
+            return None
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.warning("Conversation summary failed: %.100s", e)
+            # Mémoire bornée même sans résumé
+            overflow = len(history) - self.max_turns
+            if overflow > 0:
+                del history[:overflow]
+                self.stats["dropped_turns"] += overflow
+            return None
+        finally:
+            history.summarizing = False
+
+    async def _summarize_then(self, history, on_done):
+        folded = await self.summarize(history)
+        if folded and on_done is not None:
+            on_done(folded)
+        return folded
+
+    def schedule(self, history, on_done=None):
+        """
+        Lance `summarize` en tâche de fond si l'historique en a besoin ; retourne la
+        tâche ou None. `on_done(échanges condensés)` est appelé si le résumé a changé
+        (enregistrement de la session).
+        """
+        if not self.needs_summary(history):
+            return None
+        task = asyncio.get_running_loop().create_task(self._summarize_then(history, on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self):
+        """Attend les résumés en cours (arrêt du serveur, tests)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Clients HTTP partagés pour les appels OpenRouter et Cohere.
+Un client (sync et async) par clé API, créé une seule fois par process : les
+connexions TLS restent ouvertes (keep-alive, HTTP/2 si `h2` est installé) au
+lieu d'être renégociées à chaque requête.
+"""
+
+import os
+import threading
+import httpx
+
+from . import telemetry
+
+logger = telemetry.get_logger("http")
+
+
+def _http2_available():
+    if os.getenv("HTTP2_ENABLED", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401  (installé par httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+HTTP2 = _http2_available()
+
+_async_clients = {}  # clé API -> httpx.AsyncClient
+_sync_clients = {}  # clé API -> httpx.Client
+_lock = threading.Lock()
+
+
+def _client_options():
+    return {
+        "http2": HTTP2,
+        "timeout": httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "60")), connect=10.0),
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120")),
+        ),
+    }
+
+
+def get_async_client(api_key):
+    """Client async partagé pour la clé API `api_key`."""
+    with _lock:
+        client = _async_clients.get(api_key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options())
+            _async_clients[api_key] = client
+        return client
+
+
+def get_sync_client(api_key):
+    """Client sync partagé pour `api_key` (CLI, retrieval dans les threads)."""
+    with _lock:
+        client = _sync_clients.get(api_key)
+        if client is None or client.is_closed:
+            client = httpx.Client(**_client_options())
+            _sync_clients[api_key] = client
+        return client
+
+
+def get_cohere_client(api_key):
+    """Client Cohere utilisant le client HTTP partagé, ou None si le SDK ne le permet pas."""
+    try:
+        import cohere
+        return cohere.Client(api_key=api_key, httpx_client=get_sync_client(f"cohere:{api_key}"))
+    except Exception as e:
+        logger.warning("Could not create pooled Cohere client: %s", e)
+        return None
+
+
+async def aclose_all():
+    """Ferme toutes les connexions (arrêt de l'API)."""
+    with _lock:
+        async_clients = list(_async_clients.values())
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+    for client in async_clients:
+        await client.aclose()
+    for client in sync_clients:
+        client.close()
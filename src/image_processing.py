@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Transcodage des images envoyées avec une question.
+`transcode_image` est une fonction de module sans état, exécutée dans le pool
+de process de `executors` : le décodage et le redimensionnement ne prennent pas
+le GIL du process API. Les grands JPEG sont réduits dès le décodage (`draft`),
+chaque image est ramenée à un budget de pixels, et le résultat est gardé en
+cache par empreinte du contenu dans le process API (`ImageCache`) : une même
+capture d'écran renvoyée à chaque question n'est transcodée qu'une fois.
+"""
+
+import io
+import os
+import math
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# Pixels envoyés au modèle (~1 mégapixel, la résolution utile des modèles de vision)
+IMAGE_PIXEL_BUDGET = int(os.getenv("IMAGE_PIXEL_BUDGET", str(1024 * 1024)))
+# Au-delà, l'image est refusée sans être décodée (image piégée ou scan inutilement grand)
+IMAGE_MAX_INPUT_PIXELS = int(os.getenv("IMAGE_MAX_INPUT_PIXELS", str(40_000_000)))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+JPEG_QUALITY = 85
+
+
+class ImageTooLarge(ValueError):
+    """Image dont les dimensions dépassent IMAGE_MAX_INPUT_PIXELS."""
+
+
+def fit_pixel_budget(width, height, pixel_budget=IMAGE_PIXEL_BUDGET):
+    """Dimensions réduites (même ratio) pour tenir dans `pixel_budget` pixels, ou inchangées."""
+    if width * height <= pixel_budget:
+        return width, height
+    scale = math.sqrt(pixel_budget / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def transcode_image(image_data, pixel_budget=IMAGE_PIXEL_BUDGET, max_input_pixels=IMAGE_MAX_INPUT_PIXELS):
+    """
+    Image en JPEG RGB d'au plus `pixel_budget` pixels : retourne une data URL base64.
+    Un JPEG RGB déjà dans le budget est renvoyé tel quel, sans être décodé.
+    """
+    # Open ne lit que l'en-tête : les dimensions sont vérifiées avant tout décodage
+    pil_image = Image.open(io.BytesIO(image_data))
+    width, height = pil_image.size
+    if width * height > max_input_pixels:
+        raise ImageTooLarge(f"{width}x{height} image exceeds {max_input_pixels} pixels")
+
+    size = fit_pixel_budget(width, height, pixel_budget)
+    if pil_image.format == 'JPEG' and pil_image.mode == 'RGB' and size == (width, height):
+        return "data:image/jpeg;base64," + base64.b64encode(image_data).decode('utf-8')
+
+    if pil_image.format == 'JPEG' and size != (width, height):
+        # Décodage JPEG à 1/2, 1/4 ou 1/8 de la taille, directement depuis la DCT
+        pil_image.draft('RGB', size)
+
+    # Convert to RGB if necessary (after draft, which only applies before decoding)
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+
+    if pil_image.size != size:
+        # reducing_gap : réduction entière rapide (`reduce`) puis LANCZOS sur le reste
+        pil_image = pil_image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    img_buffer = io.BytesIO()
+    pil_image.save(img_buffer, format='JPEG', quality=JPEG_QUALITY)
+    base64_image = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+    return f"data:image/jpeg;base64,{base64_image}"
+
+
+class ImageCache:
+    """Data URLs transcodées par empreinte du contenu, en LRU borné en octets."""
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0}
+        self._items = OrderedDict()  # empreinte -> data URL
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_data, pixel_budget=IMAGE_PIXEL_BUDGET):
+        return f"{hashlib.blake2b(image_data, digest_size=16).hexdigest()}:{pixel_budget}"
+
+    def get(self, key):
+        with self._lock:
+            data_url = self._items.get(key)
+            if data_url is None:
+                self.stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats["hits"] += 1
+            return data_url
+
+    def put(self, key, data_url):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data_url
+            self._bytes += len(data_url)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._items), "bytes": self._bytes}
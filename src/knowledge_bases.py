@@ -5,6 +5,7 @@ Supports multiple data sources and modes.
 """
 
 import os
+import hashlib
 from dataclasses import dataclass
 from typing import Dict, List, Optional
 from enum import Enum
@@ -26,10 +27,13 @@ class KnowledgeBaseConfig:
     collection_name: str = None
     supports_images: bool = False
     icon: str = "📚"
+    reranker: str = None  # "cross_encoder", "cohere" ou "none" (voir src/rerankers.py)
     
     def __post_init__(self):
         if self.collection_name is None:
             self.collection_name = f"{self.id}_docs"
+        if self.reranker is None:
+            self.reranker = os.getenv("RERANKER", "cross_encoder")
 
 class KnowledgeBaseManager:
     """Manages multiple knowledge bases and their configurations."""
@@ -118,12 +122,31 @@ class KnowledgeBaseManager:
         
         if kb_id == "unified_strategy":
             # Unified strategy needs both VectorBT and Trading Papers
-            vectorbt_path = os.getenv("CHROMA_PATH", "data/chroma_db")
-            trading_path = os.getenv("TRADING_CHROMA_PATH", "data/chroma/trading_db")
-            return os.path.exists(vectorbt_path) and os.path.exists(trading_path)
+            return self.knowledge_base_exists("vectorbt") and self.knowledge_base_exists("trading_papers")
             
         return os.path.exists(config.chroma_path)
     
+    def get_corpus_version(self, kb_id: str) -> str:
+        """Identifier of the indexed corpus; changes every time the index is rebuilt."""
+        config = self.get_knowledge_base(kb_id)
+        if not config or config.type == KnowledgeBaseType.CODE_REVIEW:
+            return ""
+        
+        if kb_id == "unified_strategy":
+            paths = [self.knowledge_bases["vectorbt"].chroma_path, self.knowledge_bases["trading_papers"].chroma_path]
+        else:
+            paths = [config.chroma_path]
+        
+        parts = []
+        for path in paths:
+            docstore = os.path.join(path, "docstore.json")
+            if os.path.exists(docstore):
+                stat = os.stat(docstore)
+                parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+            else:
+                parts.append("missing")
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+    
     def auto_build_knowledge_base(self, kb_id: str) -> bool:
         """Automatically build a knowledge base if it doesn't exist."""
         if self.knowledge_base_exists(kb_id):
@@ -136,17 +159,25 @@ class KnowledgeBaseManager:
         print(f"Knowledge base '{kb_id}' not found. Building automatically...")
         
         try:
-            # Ensure proper embedding setup before building
-            from llama_index.core import Settings
-            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-            
-            # Force HuggingFace embeddings
-            Settings.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
-            Settings.chunk_size = 512
-            Settings.chunk_overlap = 50
-            
-            from scripts.build_index import build_knowledge_base
-            return build_knowledge_base(kb_id)
+            return self.build_knowledge_base(kb_id)
         except Exception as e:
             print(f"Failed to auto-build knowledge base '{kb_id}': {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def build_knowledge_base(self, kb_id: str, progress=None) -> bool:
+        """(Re)build the index of a knowledge base; `progress(fraction, message)` reports stages."""
+        # Ensure proper embedding setup before building (shared model, loaded once)
+        from .model_registry import configure_settings
+        configure_settings()
+        
+        from scripts.build_index import build_knowledge_base
+        return build_knowledge_base(kb_id, progress=progress)
+    
+    def get_build_dependencies(self, kb_id: str) -> List[str]:
+        """Knowledge bases whose index must be built for `kb_id` to be usable."""
+        config = self.get_knowledge_base(kb_id)
+        if not config or config.type == KnowledgeBaseType.CODE_REVIEW:
+            return []
+        if kb_id == "unified_strategy":
+            return ["vectorbt", "trading_papers"]
+        return [kb_id]
\ No newline at end of file
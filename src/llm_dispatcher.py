@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Répartiteur des requêtes LLM sur les configurations (clé API, modèle).
+Chaque clé a son token bucket et sa période de refroidissement après un 429,
+chaque modèle son circuit breaker ; les requêtes concurrentes sont réparties
+sur les clés les moins chargées du modèle prioritaire disponible. Quand
+toutes les configurations sont saturées, `acquire` lève `DispatcherSaturated`
+avec le délai avant la première disponible : l'appelant attend ce délai (au
+plus `max_wait` secondes) ou l'API répond 429. Les modèles dont le circuit
+breaker est ouvert ne sont jamais choisis : si ce sont les seuls restants,
+`CircuitsOpen` est levée sans attendre et l'API répond 503.
+"""
+
+import time
+import threading
+from dataclasses import dataclass, field
+
+from .resilience import CircuitBreaker, ErrorClass
+
+
+class DispatcherSaturated(Exception):
+    """Aucune configuration utilisable avant `retry_after` secondes (rate limits, refroidissements)."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitsOpen(Exception):
+    """Les circuit breakers de tous les modèles candidats sont ouverts pour encore `retry_after` secondes."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Limiteur de débit : `rate` jetons par seconde, au plus `capacity` en réserve."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def time_until_token(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate else float("inf")
+
+    def drain(self, now):
+        """Vide la réserve (le fournisseur vient de répondre 429)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclass
+class KeyState:
+    """État d'une clé API, partagé par tous ses modèles."""
+    bucket: TokenBucket
+    cooldown_until: float = 0.0
+    inflight: int = 0
+    requests: int = 0
+    rate_limits: int = 0
+
+
+@dataclass
+class ConfigState:
+    """État d'une configuration (clé, modèle)."""
+    cooldown_until: float = 0.0
+    inflight: int = 0
+    successes: int = 0
+    failures: int = 0
+    latency_ewma: float = field(default=0.0)
+
+
+class LLMDispatcher:
+    """Choisit la configuration de chaque requête selon la santé et le débit de chaque clé."""
+
+    def __init__(self, configurations, requests_per_minute=60, burst=5,
+                 rate_limit_cooldown=20.0, model_error_cooldown=60.0, auth_cooldown=600.0,
+                 breaker_failures=3, breaker_cooldown=30.0, max_wait=10.0):
+        self.configurations = list(configurations)  # ordre = priorité des modèles
+        self.max_wait = max_wait  # attente maximale d'une configuration saturée
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.model_error_cooldown = model_error_cooldown
+        self.auth_cooldown = auth_cooldown
+        self.keys = {
+            key: KeyState(bucket=TokenBucket(requests_per_minute / 60.0, burst))
+            for key, _ in self.configurations
+        }
+        self.configs = {config: ConfigState() for config in self.configurations}
+        self.breakers = {
+            model: CircuitBreaker(breaker_failures, breaker_cooldown)
+            for _, model in self.configurations
+        }
+        self._lock = threading.Lock()
+
+    def _is_usable(self, config, now):
+        key_state = self.keys[config[0]]
+        return (
+            key_state.cooldown_until <= now
+            and self.configs[config].cooldown_until <= now
+            and self.breakers[config[1]].allows(now)
+            and key_state.bucket.available(now)
+        )
+
+    def _wait_time(self, config, now):
+        key_state = self.keys[config[0]]
+        return max(
+            key_state.cooldown_until - now,
+            self.configs[config].cooldown_until - now,
+            self.breakers[config[1]].time_until_allowed(now),
+            key_state.bucket.time_until_token(now),
+            0.0,
+        )
+
+    def _select(self, exclude, now):
+        """Premier modèle (par priorité) ayant une clé utilisable, puis la clé la moins chargée."""
+        candidates = [c for c in self.configurations if c not in exclude]
+        for model in dict.fromkeys(model for _, model in candidates):
+            usable = [c for c in candidates if c[1] == model and self._is_usable(c, now)]
+            if usable:
+                return min(usable, key=lambda c: (self.keys[c[0]].inflight, self.keys[c[0]].requests))
+        return None
+
+    def _take(self, config, now):
+        key_state = self.keys[config[0]]
+        key_state.bucket.take(now)
+        key_state.inflight += 1
+        key_state.requests += 1
+        self.configs[config].inflight += 1
+        self.breakers[config[1]].on_dispatch(now)
+
+    def try_acquire(self, exclude=()):
+        """Retourne une configuration utilisable immédiatement, sinon None."""
+        with self._lock:
+            now = time.monotonic()
+            config = self._select(exclude, now)
+            if config:
+                self._take(config, now)
+            return config
+
+    def acquire(self, exclude=()):
+        """
+        Comme `try_acquire`, mais lève `DispatcherSaturated` avec le délai avant la
+        première configuration disponible au lieu de retourner None, ou
+        `CircuitsOpen` si tous les modèles candidats ont leur circuit ouvert. Si
+        toutes les configurations sont exclues, elles redeviennent toutes candidates.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if all(c in exclude for c in self.configurations):
+                exclude = ()
+            config = self._select(exclude, now)
+            if config is None:
+                candidates = [c for c in self.configurations if c not in exclude]
+                closed = [c for c in candidates if self.breakers[c[1]].current_state(now) != CircuitBreaker.OPEN]
+                if not closed:
+                    wait = min(self.breakers[c[1]].time_until_allowed(now) for c in candidates)
+                    raise CircuitsOpen(f"Every LLM model circuit is open, retry in {wait:.1f}s", wait)
+                wait = min(self._wait_time(c, now) for c in closed)
+                raise DispatcherSaturated(f"All LLM configurations are saturated, retry in {wait:.1f}s", wait)
+            self._take(config, now)
+            return config
+
+    def has_available(self, exclude=()):
+        """Vrai si une configuration hors `exclude` est utilisable immédiatement."""
+        with self._lock:
+            return self._select(exclude, time.monotonic()) is not None
+
+    def release(self, config, latency=None, error_class=None, retry_after=None):
+        """
+        Termine une requête et met à jour la santé de la clé, de la configuration
+        et du circuit breaker du modèle. Sans latence ni erreur, la requête est
+        considérée comme annulée.
+        """
+        with self._lock:
+            now = time.monotonic()
+            key_state = self.keys[config[0]]
+            config_state = self.configs[config]
+            breaker = self.breakers[config[1]]
+            key_state.inflight = max(0, key_state.inflight - 1)
+            config_state.inflight = max(0, config_state.inflight - 1)
+
+            if error_class == ErrorClass.RATE_LIMIT:
+                key_state.rate_limits += 1
+                key_state.cooldown_until = now + (retry_after if retry_after is not None else self.rate_limit_cooldown)
+                key_state.bucket.drain(now)
+                config_state.failures += 1
+                breaker.record_cancel()
+            elif error_class == ErrorClass.AUTH:
+                key_state.cooldown_until = now + self.auth_cooldown
+                config_state.failures += 1
+                breaker.record_cancel()
+            elif error_class == ErrorClass.MODEL:
+                config_state.cooldown_until = now + self.model_error_cooldown
+                config_state.failures += 1
+                breaker.record_failure(now)
+            elif error_class == ErrorClass.TRANSIENT:
+                config_state.failures += 1
+                breaker.record_failure(now)
+            elif error_class == ErrorClass.FATAL:
+                breaker.record_cancel()  # la requête est en cause, pas le modèle
+            elif latency is None:
+                breaker.record_cancel()
+            else:
+                breaker.record_success()
+                config_state.successes += 1
+                config_state.latency_ewma = (
+                    latency if not config_state.latency_ewma
+                    else 0.8 * config_state.latency_ewma + 0.2 * latency
+                )
+
+    def snapshot(self):
+        """État courant des clés, configurations et circuit breakers (clés masquées)."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "keys": [
+                    {
+                        "key": f"...{key[-4:]}",
+                        "inflight": state.inflight,
+                        "requests": state.requests,
+                        "rate_limits": state.rate_limits,
+                        "cooldown_remaining": round(max(0.0, state.cooldown_until - now), 1),
+                        "tokens": round(state.bucket.tokens, 2),
+                    }
+                    for key, state in self.keys.items()
+                ],
+                "configurations": [
+                    {
+                        "key": f"...{key[-4:]}",
+                        "model": model,
+                        "inflight": state.inflight,
+                        "successes": state.successes,
+                        "failures": state.failures,
+                        "latency_ewma": round(state.latency_ewma, 3),
+                        "cooldown_remaining": round(max(0.0, state.cooldown_until - now), 1),
+                    }
+                    for (key, model), state in self.configs.items()
+                ],
+                "breakers": {model: breaker.snapshot(now) for model, breaker in self.breakers.items()},
+            }
@@ -6,31 +6,107 @@ Gère les rate limits et les modèles défaillants.
 
 import os
 import time
-from itertools import cycle
+import base64
+import asyncio
+import contextvars
+from contextlib import ExitStack
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
+from llama_index.core.llms import ChatMessage, ImageBlock, MessageRole, TextBlock
 from llama_index.llms.openrouter import OpenRouter
 from llama_index.postprocessor.cohere_rerank import CohereRerank
 from openai import RateLimitError
 
+from . import http_clients, telemetry
+from .llm_dispatcher import DispatcherSaturated, LLMDispatcher
+from .prompt_packer import CODE_FORMAT_INSTRUCTIONS, PromptPacker
+from .resilience import ErrorClass, RETRY_POLICIES, classify_error, get_retry_after, retry_delay
+
 load_dotenv()
 
+logger = telemetry.get_logger("llm")
+# Compte les tokens des réponses (tokenizer de LlamaIndex)
+_token_counter = PromptPacker()
+# Intervalle minimal entre deux essais quand toutes les configurations sont saturées
+SATURATED_POLL_INTERVAL = 0.05
+
+# Modèles qui reçoivent les images elles-mêmes : sous-chaînes du nom (OPENROUTER_VISION_MODELS)
+DEFAULT_VISION_MODELS = "gpt-4o,gpt-4.1,gpt-5,claude,gemini,pixtral,vision,-vl"
+
+
+@dataclass
+class _RequestState:
+    """Configuration choisie pour la requête en cours (une par tâche asyncio)."""
+    manager: "LLMManager"
+    config: tuple
+    tried: set = field(default_factory=set)
+    acquired: bool = True
+    started_at: float = field(default_factory=time.monotonic)
+
+
+_request_state = contextvars.ContextVar("llm_request_state", default=None)
+
+
 class LLMManager:
     """Gestionnaire LLM simplifié avec fallback automatique."""
 
     def __init__(self, llm_settings=None):
         self.api_keys = self._load_api_keys()
         self.models = self._load_models()
-        self.llm_settings = llm_settings or {}
+        self.llm_settings = llm_settings or {}  # réinitialise aussi le cache config -> OpenRouter
 
         if not self.api_keys or not self.models:
             raise ValueError("Clés API ou modèles manquants dans .env")
 
-        # Configurations disponibles
+        # Configurations disponibles (ordre = priorité des modèles)
         self.configurations = [(key, model) for model in self.models for key in self.api_keys]
-        self.config_cycler = cycle(self.configurations)
-        self.current_config = next(self.config_cycler)
+        self.dispatcher = LLMDispatcher(
+            self.configurations,
+            requests_per_minute=float(os.getenv("OPENROUTER_RPM") or 60),
+            burst=float(os.getenv("OPENROUTER_BURST") or 5),
+            rate_limit_cooldown=float(os.getenv("OPENROUTER_RATE_LIMIT_COOLDOWN") or 20),
+            model_error_cooldown=float(os.getenv("OPENROUTER_MODEL_ERROR_COOLDOWN") or 60),
+            breaker_failures=int(os.getenv("OPENROUTER_BREAKER_FAILURES") or 3),
+            breaker_cooldown=float(os.getenv("OPENROUTER_BREAKER_COOLDOWN") or 30),
+            max_wait=float(os.getenv("OPENROUTER_MAX_QUEUE_WAIT") or 10),
+        )
+        # Délai avant de doubler une requête lente sur une autre configuration (0 = désactivé)
+        self.hedge_delay = float(os.getenv("OPENROUTER_HEDGE_DELAY") or 0)
+        self._config = self.configurations[0]  # hors requête (CLI)
+        self.api_base = os.getenv("OPENROUTER_API_BASE")  # ex. serveur mock local
+        vision_models = os.getenv("OPENROUTER_VISION_MODELS") or DEFAULT_VISION_MODELS
+        self.vision_models = [m.strip().lower() for m in vision_models.split(",") if m.strip()]
+
+        print(f"LLM Manager: {len(self.configurations)} configurations disponibles "
+              f"({len(self.api_keys)} clés)")
+
+    @property
+    def llm_settings(self):
+        return self._llm_settings
+
+    @llm_settings.setter
+    def llm_settings(self, settings):
+        # Les instances OpenRouter en cache sont construites avec ces paramètres
+        self._llm_settings = settings
+        self._llms = {}
 
-        print(f"LLM Manager: {len(self.configurations)} configurations disponibles")
+    def _state(self):
+        state = _request_state.get()
+        return state if state is not None and state.manager is self else None
+
+    @property
+    def current_config(self):
+        """Configuration de la requête en cours, ou configuration par défaut hors requête."""
+        state = self._state()
+        return state.config if state else self._config
+
+    @current_config.setter
+    def current_config(self, config):
+        state = self._state()
+        if state:
+            state.config = config
+        else:
+            self._config = config
 
     def _load_api_keys(self):
         """Charge les clés API depuis les variables d'environnement."""
@@ -54,169 +130,461 @@ class LLMManager:
         return []
 
     def get_llm(self):
-        """Retourne une instance OpenRouter avec la config actuelle."""
-        api_key, model_name = self.current_config
-        
-        settings = {
-            "temperature": 0.1,
-            "max_tokens": 4096,
-            "context_window": 163840,
-            **self.llm_settings,
-            "model": model_name,
-            "api_key": api_key,
-        }
-        return OpenRouter(**settings)
+        """
+        Retourne l'instance OpenRouter de la config actuelle. Elle est créée une
+        seule fois par config et utilise les clients HTTP partagés de sa clé API
+        (connexions keep-alive réutilisées d'une requête à l'autre).
+        """
+        config = self.current_config
+        llm = self._llms.get(config)
+        if llm is None:
+            api_key, model_name = config
+            settings = {
+                "temperature": 0.1,
+                "max_tokens": 4096,
+                "context_window": 163840,
+                **self.llm_settings,
+                "model": model_name,
+                "api_key": api_key,
+                "http_client": http_clients.get_sync_client(api_key),
+                "async_http_client": http_clients.get_async_client(api_key),
+            }
+            if self.api_base:
+                settings["api_base"] = self.api_base
+            llm = self._llms.setdefault(config, OpenRouter(**settings))
+        return llm
+
+    def supports_images(self, config=None):
+        """Le modèle de `config` (par défaut celle de la requête en cours) accepte-t-il des images ?"""
+        model = (config or self.current_config)[1].lower()
+        return any(pattern in model for pattern in self.vision_models)
+
+    def begin_request(self, config=None):
+        """
+        Démarre une requête : le dispatcher choisit sa configuration (clé la moins
+        chargée du meilleur modèle disponible), visible via `current_config` dans
+        la tâche courante uniquement.
+        """
+        config = config or self.dispatcher.acquire()
+        _request_state.set(_RequestState(manager=self, config=config))
+        return config
+
+    def report_result(self, error=None, cancelled=False):
+        """Libère la configuration de la requête en cours et met à jour sa santé."""
+        state = self._state()
+        if not state or not state.acquired:
+            return
+        state.acquired = False
+        if cancelled:
+            self.dispatcher.release(state.config)
+        elif error is None:
+            self.dispatcher.release(state.config, latency=time.monotonic() - state.started_at)
+        else:
+            self.dispatcher.release(
+                state.config,
+                error_class=classify_error(error),
+                retry_after=get_retry_after(error),
+            )
 
     def switch_to_next_config(self):
-        """Passe à la configuration suivante."""
-        self.current_config = next(self.config_cycler)
-        
+        """Passe à une autre configuration (pour la requête en cours si elle existe)."""
+        state = self._state()
+        if state is None:
+            # Hors requête (CLI) : configuration suivante selon le dispatcher
+            config = self.dispatcher.acquire(exclude={self._config})
+            self.dispatcher.release(config)
+            self._config = config
+            return
+
+        self.report_result(cancelled=True)
+        state.tried.add(state.config)
+        if len(state.tried) >= len(self.configurations):
+            state.tried = {state.config}
+        state.config = self.dispatcher.acquire(exclude=state.tried)
+        state.acquired = True
+        state.started_at = time.monotonic()
+
     def is_rate_limit_error(self, error):
         """Vérifie si l'erreur est due à un rate limit."""
-        if isinstance(error, RateLimitError):
-            return True
-        
-        error_str = str(error).lower()
-        rate_limit_indicators = [
-            "rate limit", "too many requests", "quota exceeded",
-            "429", "rate_limit_exceeded"
-        ]
-        return any(indicator in error_str for indicator in rate_limit_indicators)
-    
+        return isinstance(error, RateLimitError) or classify_error(error) == ErrorClass.RATE_LIMIT
+
     def is_model_error(self, error):
         """Vérifie si l'erreur est due au modèle (indisponible, etc.)."""
-        error_str = str(error).lower()
-        model_error_indicators = [
-            "model not found", "model unavailable", "invalid model",
-            "model error", "service unavailable", "502", "503"
-        ]
-        return any(indicator in error_str for indicator in model_error_indicators)
+        return classify_error(error) == ErrorClass.MODEL
+
+def image_message(prompt, images):
+    """Message utilisateur multimodal : le texte puis les images (data URLs base64)."""
+    blocks = [TextBlock(text=prompt)]
+    for image in images:
+        header, data = image.split(",", 1)
+        blocks.append(ImageBlock(image=base64.b64decode(data), image_mimetype=header[5:].split(";")[0]))
+    return ChatMessage(role=MessageRole.USER, blocks=blocks)
+
+
+async def acomplete_prompt(llm, prompt, images=None):
+    """Réponse du LLM à un prompt ; avec des images, un message de chat multimodal au lieu d'une complétion."""
+    with telemetry.span("llm", images=len(images or ())):
+        if not images:
+            return str(await llm.acomplete(prompt))
+        response = await llm.achat([image_message(prompt, images)])
+        return response.message.content or ""
+
+
+async def astream_prompt(llm, prompt, images=None):
+    """Tokens de la réponse au fil de la génération (voir `acomplete_prompt`)."""
+    with telemetry.span("llm", images=len(images or ())):
+        if images:
+            stream = await llm.astream_chat([image_message(prompt, images)])
+        else:
+            stream = await llm.astream_complete(prompt)
+        async for chunk in stream:
+            if chunk.delta:
+                yield chunk.delta
+
 
 class EnhancedChatWrapper:
-    """Wrapper qui ajoute les instructions de formatage de code à tous les assistants."""
+    """
+    Wrapper qui passe l'historique de la session (borné en tokens) et les images au
+    chat engine. Le message envoyé au chat engine est la question seule : c'est sur
+    elle que portent le retrieval (dense, BM25, symboles). Les instructions de
+    formatage sont dans le prompt système des engines (CODE_FORMAT_INSTRUCTIONS).
+    """
     
-    def __init__(self, chat_engine, conversation_history=None):
+    def __init__(self, chat_engine, conversation_history=None, packer=None):
         self.chat_engine = chat_engine
-        self.conversation_history = conversation_history or []
+        self.conversation_history = conversation_history if conversation_history is not None else []
+        # Le contexte est ajouté par le chat engine : seul l'historique est borné ici
+        self.packer = packer or PromptPacker()
     
-    def _enhance_question(self, question):
-        """Ajoute les instructions de formatage et l'historique à la question."""
-        enhanced_parts = [
-            "IMPORTANT: When showing code in your responses, ALWAYS use proper markdown code blocks with triple backticks (```) and specify the language:",
-            "```python",
-            "# Example code",
-            "import vectorbt as vbt",
-            "```",
-            "For inline code, use single backticks like `vbt.Portfolio`.",
-            ""
-        ]
-        
-        # Ajouter l'historique de conversation si disponible
-        if self.conversation_history:
-            enhanced_parts.append("=== CONVERSATION HISTORY ===")
-            for i, (q, a) in enumerate(self.conversation_history[-3:], 1):  # Derniers 3 échanges
-                enhanced_parts.append(f"Q{i}: {q}")
-                enhanced_parts.append(f"A{i}: {a}")
-            enhanced_parts.append("=== END HISTORY ===")
-            enhanced_parts.append("")
-        
-        enhanced_parts.append(f"Current question: {question}")
-        
-        return "\n".join(enhanced_parts)
+    @telemetry.span("prompt_build")
+    def _chat_history(self, question, images=None):
+        """
+        Messages qui précèdent la question : résumé et échanges les plus récents qui
+        tiennent dans PROMPT_HISTORY_TOKENS (réponses tronquées), puis les images
+        (le chat engine ne prend que du texte comme question).
+        Retourne les kwargs du chat engine (vides sans historique ni images).
+        """
+        packed = self.packer.pack(question, CODE_FORMAT_INSTRUCTIONS, history=self.conversation_history)
+        messages = []
+        if packed.summary:
+            messages.append(ChatMessage(
+                role=MessageRole.SYSTEM, content=f"Summary of the earlier conversation: {packed.summary}"
+            ))
+        for q, a in packed.history:
+            messages.append(ChatMessage(role=MessageRole.USER, content=q))
+            messages.append(ChatMessage(role=MessageRole.ASSISTANT, content=a))
+        if images:
+            messages.append(image_message("Images attached to my next question:", images))
+        return {"chat_history": messages} if messages else {}
     
-    async def achat(self, question):
-        """Chat asynchrone avec instructions de formatage."""
-        enhanced_question = self._enhance_question(question)
-        response = await self.chat_engine.achat(enhanced_question)
+    async def achat(self, question, images=None):
+        """Chat asynchrone avec l'historique de la session."""
+        history_kwargs = self._chat_history(question, images)
+        # Le chat engine fait aussi son retrieval : les étapes instrumentées en sont des sous-spans
+        with telemetry.span("llm", images=len(images or ())):
+            response = await self.chat_engine.achat(question, **history_kwargs)
         
         # Stocker dans l'historique
         self.conversation_history.append((question, response.response))
         
         return response
     
+    async def astream_chat(self, question, images=None):
+        """Chat asynchrone en streaming : produit les tokens au fil de la génération."""
+        history_kwargs = self._chat_history(question, images)
+        parts = []
+        with telemetry.span("llm", images=len(images or ())):
+            streaming_response = await self.chat_engine.astream_chat(question, **history_kwargs)
+            async for token in streaming_response.async_response_gen():
+                parts.append(token)
+                yield token
+        
+        # Stocker dans l'historique une fois la réponse complète
+        self.conversation_history.append((question, "".join(parts)))
+    
     def chat(self, question):
-        """Chat synchrone avec instructions de formatage."""
-        enhanced_question = self._enhance_question(question)
-        response = self.chat_engine.chat(enhanced_question)
+        """Chat synchrone avec l'historique de la session."""
+        response = self.chat_engine.chat(question, **self._chat_history(question))
         
         # Stocker dans l'historique
         self.conversation_history.append((question, response.response))
         
         return response
 
-async def managed_chat_request(source, question, llm_manager):
+def _open_chat_engine(stack, source, llm_manager, engine_pool=None, kb_id=None, conversation_history=None):
+    """Retourne le chat engine à utiliser pour `source` ; les ressources empruntées sont libérées par `stack`."""
+    # Determine the type of the source and create the appropriate chat engine
+    if hasattr(source, 'as_chat_engine') and engine_pool is not None:
+        base_chat_engine = stack.enter_context(engine_pool.lease(source, kb_id, llm_manager))
+        chat_engine = EnhancedChatWrapper(base_chat_engine, conversation_history)
+        logger.debug("Using pooled chat engine for %s", kb_id)
+    elif hasattr(source, 'as_chat_engine'):  # It's a VectorStoreIndex
+        llm = llm_manager.get_llm()
+        logger.debug("Creating standard chat engine with reranking")
+        # Créer le chat engine avec ou sans reranking selon la disponibilité de Cohere
+        cohere_key = os.getenv("COHERE_API_KEY")
+        if cohere_key and cohere_key.strip():
+            try:
+                base_chat_engine = source.as_chat_engine(
+                    chat_mode="context",
+                    similarity_top_k=15,
+                    node_postprocessors=[
+                        CohereRerank(api_key=cohere_key, top_n=5)
+                    ],
+                    system_prompt=CODE_FORMAT_INSTRUCTIONS,
+                    llm=llm
+                )
+                logger.debug("Cohere reranking enabled")
+            except Exception as e:
+                logger.warning("Could not use Cohere reranking: %s", e)
+                base_chat_engine = source.as_chat_engine(
+                    chat_mode="context",
+                    similarity_top_k=10,
+                    system_prompt=CODE_FORMAT_INSTRUCTIONS,
+                    llm=llm
+                )
+                logger.debug("Using fallback without reranking")
+        else:
+            base_chat_engine = source.as_chat_engine(
+                chat_mode="context",
+                similarity_top_k=10,
+                system_prompt=CODE_FORMAT_INSTRUCTIONS,
+                llm=llm
+            )
+            logger.debug("No Cohere key, using basic engine")
+        # Wrapper avec instructions de formatage
+        chat_engine = EnhancedChatWrapper(base_chat_engine, conversation_history)
+        logger.debug("Wrapped with EnhancedChatWrapper")
+    else:  # It's a custom chat object like CodeReviewChat
+        logger.debug("Using custom chat engine: %s", type(source).__name__)
+        chat_engine = source
+        # Here, we assume the custom chat object will use the llm_manager to get the llm.
+        if conversation_history is not None and hasattr(source, 'with_history'):
+            # Objet partagé (UnifiedStrategyChat) : historique de la session de la requête
+            chat_engine = source.with_history(conversation_history)
+
+    return chat_engine
+
+
+def _image_kwargs(llm_manager, images, config=None):
+    """Images à passer au chat engine si le modèle de la tentative les accepte (sinon la question les mentionne seulement)."""
+    if images and llm_manager.supports_images(config):
+        return {"images": images}
+    return {}
+
+
+async def _single_response(response):
+    """Réponse complète d'un chat engine sans streaming, produite comme un seul token."""
+    yield (await response).response
+
+
+async def _wait_for_config(llm_manager, acquire):
+    """
+    Appelle `acquire` (qui choisit une configuration) ; si toutes sont saturées,
+    attend le délai indiqué par le dispatcher puis réessaie. Au-delà de
+    `dispatcher.max_wait` secondes d'attente au total, `DispatcherSaturated` est levée.
+    """
+    waited = 0.0
+    while True:
+        try:
+            return acquire()
+        except DispatcherSaturated as e:
+            delay = max(e.retry_after, SATURATED_POLL_INTERVAL)
+            if waited + delay > llm_manager.dispatcher.max_wait:
+                raise
+            logger.debug("All configurations saturated, waiting %.2fs", delay)
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+def _plan_retry(llm_manager, error, attempt, max_retries):
+    """Délai avant la tentative suivante selon la classe d'erreur, ou None s'il ne faut pas réessayer."""
+    error_class = classify_error(error)
+    if attempt >= max_retries - 1 or not RETRY_POLICIES[error_class].retry:
+        return None
+    dispatcher = getattr(llm_manager, "dispatcher", None)
+    alternate_available = dispatcher.has_available() if isinstance(dispatcher, LLMDispatcher) else True
+    delay = retry_delay(error_class, attempt, get_retry_after(error), alternate_available)
+    logger.debug("%s error, retrying on another configuration in %.2fs", error_class, delay)
+    return delay
+
+
+async def _hedged_chat_request(source, question, llm_manager, engine_pool, kb_id, conversation_history, images=None):
+    """
+    Requête sur index via le pool, doublée sur une autre configuration si la
+    première n'a pas répondu après `llm_manager.hedge_delay` secondes. La
+    première réponse gagne, les autres tentatives sont annulées ; l'historique
+    n'est mis à jour qu'une fois, par la réponse gagnante.
+    """
+    history = conversation_history if conversation_history is not None else []
+    max_attempts = len(llm_manager.configurations)
+    tried = set()
+    pending = set()
+    last_error = None
+    failures = 0
+
+    async def attempt(config):
+        llm_manager.begin_request(config)
+        try:
+            with engine_pool.lease(source, kb_id, llm_manager) as base_chat_engine:
+                # Copie de l'historique (et de son résumé) : seule la réponse gagnante y sera ajoutée
+                response = await EnhancedChatWrapper(base_chat_engine, history.copy()).achat(
+                    question, **_image_kwargs(llm_manager, images, config)
+                )
+        except asyncio.CancelledError:
+            llm_manager.report_result(cancelled=True)
+            raise
+        except Exception as e:
+            llm_manager.report_result(error=e)
+            raise
+        llm_manager.report_result()
+        return response.response
+
+    def launch(config):
+        tried.add(config)
+        logger.debug("Hedged attempt %d/%d with model: %s", len(tried), max_attempts, config[1])
+        pending.add(asyncio.create_task(attempt(config)))
+
+    try:
+        while True:
+            if not pending:
+                if len(tried) >= max_attempts:
+                    raise last_error or Exception("All LLM configurations failed.")
+                if last_error is not None:
+                    delay = _plan_retry(llm_manager, last_error, failures - 1, max_attempts)
+                    if delay is None:
+                        raise last_error
+                    await asyncio.sleep(delay)
+                launch(await _wait_for_config(llm_manager, lambda: llm_manager.dispatcher.acquire(exclude=tried)))
+            can_hedge = len(tried) < max_attempts
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=llm_manager.hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            pending = set(pending)
+            if not done:
+                # Première tentative trop lente : on la double sur une autre configuration,
+                # s'il en reste une disponible tout de suite
+                config = llm_manager.dispatcher.try_acquire(exclude=tried)
+                if config is not None:
+                    launch(config)
+                continue
+            for task in done:
+                if task.exception() is None:
+                    history.append((question, task.result()))
+                    telemetry.record_tokens("completion", _token_counter.count(task.result()))
+                    return {"response": task.result()}
+                last_error = task.exception()
+                failures += 1
+                logger.debug("Hedged attempt failed: %.100s", last_error)
+    finally:
+        for task in pending:
+            task.cancel()
+        # Laisse les tentatives annulées libérer leur configuration
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def managed_chat_request(source, question, llm_manager, engine_pool=None, kb_id=None, conversation_history=None,
+                               images=None):
     """
     Handles a chat request with automatic fallback and retry logic.
-    This function creates a new chat engine for each request to avoid state issues.
+    Each error class has its retry policy (see `resilience.RETRY_POLICIES`):
+    fatal errors are raised at once, transient ones are retried after a
+    jittered backoff. Index sources get a fresh chat engine per attempt, or a pooled one when
+    `engine_pool` is given (engines are then keyed by `kb_id` and LLM config).
+    The configuration of each attempt is chosen by the LLM dispatcher.
+    `images` (data URLs) are sent to the attempts whose model accepts images.
     """
-    print(f"🔍 [DEBUG] managed_chat_request called")
-    print(f"🔍 [DEBUG] Source type: {type(source).__name__}")
-    print(f"🔍 [DEBUG] Has as_chat_engine: {hasattr(source, 'as_chat_engine')}")
-    print(f"🔍 [DEBUG] Available configurations: {len(llm_manager.configurations)}")
-    
+    logger.debug("managed_chat_request: source %s, %d configurations",
+                 type(source).__name__, len(llm_manager.configurations))
+
+    hedge_delay = getattr(llm_manager, "hedge_delay", 0)
+    if isinstance(hedge_delay, (int, float)) and hedge_delay > 0 and engine_pool is not None and hasattr(source, 'as_chat_engine'):
+        return await _hedged_chat_request(source, question, llm_manager, engine_pool, kb_id, conversation_history, images)
+
     max_retries = len(llm_manager.configurations)
+    await _wait_for_config(llm_manager, llm_manager.begin_request)
 
     for attempt in range(max_retries):
         try:
-            print(f"🔍 [DEBUG] Attempt {attempt + 1}/{max_retries} with config: {llm_manager.current_config}")
-            llm = llm_manager.get_llm()
-
-            # Determine the type of the source and create the appropriate chat engine
-            if hasattr(source, 'as_chat_engine'):  # It's a VectorStoreIndex
-                print(f"🔍 [DEBUG] Creating standard chat engine with reranking")
-                # Créer le chat engine avec ou sans reranking selon la disponibilité de Cohere
-                cohere_key = os.getenv("COHERE_API_KEY")
-                if cohere_key and cohere_key.strip():
-                    try:
-                        base_chat_engine = source.as_chat_engine(
-                            chat_mode="context",
-                            similarity_top_k=15,
-                            node_postprocessors=[
-                                CohereRerank(api_key=cohere_key, top_n=5)
-                            ],
-                            llm=llm
-                        )
-                        print(f"🔍 [DEBUG] Cohere reranking enabled")
-                    except Exception as e:
-                        print(f"🔍 [DEBUG] Warning: Could not use Cohere reranking: {e}")
-                        base_chat_engine = source.as_chat_engine(
-                            chat_mode="context",
-                            similarity_top_k=10,
-                            llm=llm
-                        )
-                        print(f"🔍 [DEBUG] Using fallback without reranking")
-                else:
-                    base_chat_engine = source.as_chat_engine(
-                        chat_mode="context",
-                        similarity_top_k=10,
-                        llm=llm
-                    )
-                    print(f"🔍 [DEBUG] No Cohere key, using basic engine")
-                # Wrapper avec instructions de formatage
-                chat_engine = EnhancedChatWrapper(base_chat_engine)
-                print(f"🔍 [DEBUG] Wrapped with EnhancedChatWrapper")
-            else:  # It's a custom chat object like CodeReviewChat
-                print(f"🔍 [DEBUG] Using custom chat engine: {type(source).__name__}")
-                chat_engine = source
-                # Here, we assume the custom chat object will use the llm_manager to get the llm.
-
-            response = await chat_engine.achat(question)
-            print(f"🔍 [DEBUG] Chat response received, length: {len(response.response)}")
+            logger.debug("Attempt %d/%d with model: %s", attempt + 1, max_retries, llm_manager.current_config[1])
+
+            with ExitStack() as stack:
+                chat_engine = _open_chat_engine(stack, source, llm_manager, engine_pool, kb_id, conversation_history)
+                response = await chat_engine.achat(question, **_image_kwargs(llm_manager, images))
+            llm_manager.report_result()
+            logger.debug("Chat response received, length: %d", len(response.response))
+            telemetry.record_tokens("completion", _token_counter.count(response.response))
             return {"response": response.response}
 
+        except asyncio.CancelledError:
+            llm_manager.report_result(cancelled=True)
+            raise
+
         except Exception as e:
-            print(f"🔍 [DEBUG] Attempt {attempt + 1}/{max_retries} failed: {str(e)[:100]}")
+            logger.debug("Attempt %d/%d failed: %.100s", attempt + 1, max_retries, e)
+            llm_manager.report_result(error=e)
 
-            if attempt < max_retries - 1:
-                if llm_manager.is_rate_limit_error(e) or llm_manager.is_model_error(e):
-                    print("🔍 [DEBUG] Rate limit or model error detected, switching configuration.")
-                    llm_manager.switch_to_next_config()
-                else:
-                    print("🔍 [DEBUG] Unknown error, switching configuration as a precaution.")
-                    llm_manager.switch_to_next_config()
-            else:
-                # Last attempt failed
-                print(f"🔍 [DEBUG] All attempts failed, raising exception")
+            delay = _plan_retry(llm_manager, e, attempt, max_retries)
+            if delay is None:
+                # Last attempt, or an error that would fail on every configuration
+                logger.debug("Not retrying, raising exception")
                 raise e
+            if delay:
+                await asyncio.sleep(delay)
+            await _wait_for_config(llm_manager, llm_manager.switch_to_next_config)
+
+    raise Exception("All LLM configurations failed.")
+
+async def managed_stream_request(source, question, llm_manager, engine_pool=None, kb_id=None, conversation_history=None,
+                                 images=None):
+    """
+    Streaming counterpart of `managed_chat_request`: yields response tokens as they arrive.
+    Fallback to the next configuration only happens before the first token is sent.
+    """
+    logger.debug("managed_stream_request: source %s", type(source).__name__)
+
+    max_retries = len(llm_manager.configurations)
+    await _wait_for_config(llm_manager, llm_manager.begin_request)
+    request_start = time.perf_counter()
+
+    for attempt in range(max_retries):
+        started = False
+        try:
+            logger.debug("Stream attempt %d/%d with model: %s", attempt + 1, max_retries, llm_manager.current_config[1])
+
+            parts = []
+            with ExitStack() as stack:
+                chat_engine = _open_chat_engine(stack, source, llm_manager, engine_pool, kb_id, conversation_history)
+                image_kwargs = _image_kwargs(llm_manager, images)
+                if hasattr(chat_engine, 'astream_chat'):
+                    tokens = chat_engine.astream_chat(question, **image_kwargs)
+                else:
+                    tokens = _single_response(chat_engine.achat(question, **image_kwargs))
+                async for token in tokens:
+                    if not started:
+                        started = True
+                        telemetry.FIRST_TOKEN_SECONDS.observe(time.perf_counter() - request_start)
+                    parts.append(token)
+                    yield token
+            llm_manager.report_result()
+            telemetry.record_tokens("completion", _token_counter.count("".join(parts)))
+            return
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client déconnecté pendant le streaming
+            llm_manager.report_result(cancelled=True)
+            raise
+
+        except Exception as e:
+            logger.debug("Stream attempt %d/%d failed: %.100s", attempt + 1, max_retries, e)
+            llm_manager.report_result(error=e)
 
-    raise Exception("All LLM configurations failed.")
\ No newline at end of file
+            delay = None if started else _plan_retry(llm_manager, e, attempt, max_retries)
+            if delay is None:
+                # Tokens already sent, last attempt or fatal error: the client has to see the error
+                raise
+            if delay:
+                await asyncio.sleep(delay)
+            await _wait_for_config(llm_manager, llm_manager.switch_to_next_config)
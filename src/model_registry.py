@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Registre des modèles et index partagés par tout le process.
+Le modèle d'embedding et les index Chroma sont chargés une seule fois puis
+réutilisés par toutes les knowledge bases ; le lifespan FastAPI les préchauffe.
+"""
+
+import os
+import time
+import threading
+import chromadb
+from llama_index.core import Settings, StorageContext, load_index_from_storage
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.vector_stores.chroma import ChromaVectorStore
+from .embedding_service import EmbeddingService, ServiceQueryEmbedding
+from .sparse_index import BM25Index
+from .symbol_index import SymbolIndex
+
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+_lock = threading.Lock()
+_embed_model = None
+_embedding_service = None
+_query_embed_model = None
+_cross_encoder = None
+_indexes = {}  # (persist_dir, collection_name) -> index
+_sparse_indexes = {}  # persist_dir -> BM25Index, ou None s'il n'a pas été construit
+_symbol_indexes = {}  # persist_dir -> SymbolIndex, ou None s'il n'a pas été construit
+_index_locks = {}  # (persist_dir, collection_name) -> lock de chargement
+
+
+def get_embed_model():
+    """Modèle HuggingFace partagé (documents et questions), chargé au premier appel."""
+    global _embed_model
+    with _lock:
+        if _embed_model is None:
+            print(f"Loading embedding model {EMBED_MODEL_NAME}...")
+            _embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+        return _embed_model
+
+
+def get_embedding_service():
+    """Service d'embedding des questions (lots + cache LRU), partagé par le process."""
+    global _embedding_service, _query_embed_model
+    embed_model = get_embed_model()
+    with _lock:
+        if _embedding_service is None:
+            _embedding_service = EmbeddingService(
+                embed_model,
+                window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+                max_batch=int(os.getenv("EMBED_MAX_BATCH", "32")),
+                cache_size=int(os.getenv("EMBED_CACHE_SIZE", "2048")),
+            )
+            _query_embed_model = ServiceQueryEmbedding(_embedding_service)
+        return _embedding_service
+
+
+def get_embedding_stats():
+    """Compteurs du service d'embedding, vides s'il n'a pas encore été chargé."""
+    with _lock:
+        return dict(_embedding_service.stats) if _embedding_service is not None else {}
+
+
+def get_query_embed_model():
+    """Embedding à utiliser comme `Settings.embed_model` dans le process API."""
+    get_embedding_service()
+    return _query_embed_model
+
+
+def get_cross_encoder():
+    """
+    Cross-encoder de reranking partagé, chargé au premier appel. RERANK_BACKEND
+    choisit le backend ("torch", "onnx", "openvino") et RERANK_MODEL_FILE un
+    fichier ONNX quantifié (ex. "onnx/model_qint8_avx512_vnni.onnx").
+    """
+    global _cross_encoder
+    with _lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+
+            backend = os.getenv("RERANK_BACKEND", "torch")
+            kwargs = {"max_length": 512, "device": "cpu"}
+            if backend != "torch":
+                kwargs["backend"] = backend  # sentence-transformers >= 4.0
+                if os.getenv("RERANK_MODEL_FILE"):
+                    kwargs["model_kwargs"] = {"file_name": os.getenv("RERANK_MODEL_FILE")}
+            print(f"Loading reranker {RERANK_MODEL_NAME} ({backend})...")
+            _cross_encoder = CrossEncoder(RERANK_MODEL_NAME, **kwargs)
+        return _cross_encoder
+
+
+def configure_settings():
+    """Applique les réglages globaux LlamaIndex avec les modèles partagés."""
+    Settings.embed_model = get_query_embed_model()
+    Settings.chunk_size = 512
+    Settings.chunk_overlap = 50
+
+
+def load_index(persist_dir, collection_name):
+    """Charge (une seule fois) l'index persistant d'une collection Chroma."""
+    key = (persist_dir, collection_name)
+    with _lock:
+        if key in _indexes:
+            return _indexes[key]
+        index_lock = _index_locks.setdefault(key, threading.Lock())
+
+    # Un verrou par index : deux index différents peuvent se charger en parallèle
+    with index_lock:
+        with _lock:
+            if key in _indexes:
+                return _indexes[key]
+
+        configure_settings()
+        chroma_client = chromadb.PersistentClient(path=persist_dir)
+        chroma_collection = chroma_client.get_collection(collection_name)
+        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        storage_context = StorageContext.from_defaults(
+            persist_dir=persist_dir,
+            vector_store=vector_store
+        )
+        index = load_index_from_storage(storage_context=storage_context)
+
+        with _lock:
+            _indexes[key] = index
+        return index
+
+
+def load_sparse_index(persist_dir):
+    """Charge (une seule fois) l'index BM25 persisté à côté de docstore.json, ou None."""
+    with _lock:
+        if persist_dir in _sparse_indexes:
+            return _sparse_indexes[persist_dir]
+    sparse_index = BM25Index.load(persist_dir) if persist_dir else None
+    with _lock:
+        return _sparse_indexes.setdefault(persist_dir, sparse_index)
+
+
+def load_symbol_index(persist_dir):
+    """Charge (une seule fois) la table des symboles persistée à côté de l'index BM25, ou None."""
+    with _lock:
+        if persist_dir in _symbol_indexes:
+            return _symbol_indexes[persist_dir]
+    symbol_index = SymbolIndex.load(persist_dir) if persist_dir else None
+    with _lock:
+        return _symbol_indexes.setdefault(persist_dir, symbol_index)
+
+
+def forget_index(persist_dir):
+    """Oublie les index chargés depuis `persist_dir` (après une reconstruction)."""
+    with _lock:
+        for key in [k for k in _indexes if k[0] == persist_dir]:
+            del _indexes[key]
+        _sparse_indexes.pop(persist_dir, None)
+        _symbol_indexes.pop(persist_dir, None)
+
+
+def warm_up_models():
+    """Charge le modèle d'embedding et exécute un premier forward pass."""
+    start = time.perf_counter()
+    configure_settings()
+    get_embedding_service().embed("warm up")
+    print(f"Embedding model ready in {time.perf_counter() - start:.1f}s")
+
+    if os.getenv("RERANKER", "cross_encoder") == "cross_encoder":
+        start = time.perf_counter()
+        get_cross_encoder().predict([("warm up", "warm up")], show_progress_bar=False)
+        print(f"Reranker ready in {time.perf_counter() - start:.1f}s")
+
+
+def preload_shared_models(kb_configs=()):
+    """
+    Charge les poids des modèles et les index purement Python (BM25, symboles)
+    dans le process maître, avant le fork des workers : leurs pages mémoire sont
+    partagées en copy-on-write au lieu d'être chargées une fois par worker.
+    Ni thread, ni connexion SQLite/Chroma, ni forward pass ici (ils ne survivent
+    pas au fork) : chaque worker les crée dans son lifespan (`warm_up_models`).
+    """
+    start = time.perf_counter()
+    get_embed_model()
+    if os.getenv("RERANKER", "cross_encoder") == "cross_encoder":
+        get_cross_encoder()
+    for kb_config in kb_configs:
+        if kb_config.chroma_path and os.path.exists(kb_config.chroma_path):
+            load_sparse_index(kb_config.chroma_path)
+            load_symbol_index(kb_config.chroma_path)
+    print(f"Shared models and sparse indexes loaded before fork in {time.perf_counter() - start:.1f}s")
+
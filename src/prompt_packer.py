@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Assemblage des prompts sous un budget de tokens.
+Le prompt est rempli par priorité : instructions et question, puis le contexte
+le mieux classé (chunks dédupliqués), puis l'historique le plus récent avec des
+réponses tronquées. Les tokens d'entrée — et la latence — restent bornés quelle
+que soit la longueur de la conversation.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from llama_index.core import Settings
+
+from . import telemetry
+from .code_chunker import chunk_python_source
+from .sparse_index import tokenize
+
+# Budget total du prompt, part maximale de l'historique et taille d'une réponse passée
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1200"))
+HISTORY_ANSWER_TOKENS = int(os.getenv("HISTORY_ANSWER_TOKENS", "250"))
+
+# Instructions de formatage des chat engines des knowledge bases (prompt système :
+# elles ne doivent pas entrer dans la requête de retrieval)
+CODE_FORMAT_INSTRUCTIONS = "\n".join([
+    "IMPORTANT: When showing code in your responses, ALWAYS use proper markdown code blocks with triple backticks (```) and specify the language:",
+    "```python",
+    "# Example code",
+    "import vectorbt as vbt",
+    "```",
+    "For inline code, use single backticks like `vbt.Portfolio`.",
+])
+
+# Un chunk dont 80 % des 8-grammes de mots sont déjà dans le contexte est un doublon
+SHINGLE_SIZE = 8
+DUPLICATE_RATIO = 0.8
+CODE_CHUNK_CHARS = 1500
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Ensemble des séquences de `size` mots consécutifs (le texte entier s'il est plus court)."""
+    words = text.lower().split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def split_code(code, max_chars=CODE_CHUNK_CHARS):
+    """Code collé découpé en blocs : par définition s'il se parse en Python, sinon par paragraphes."""
+    try:
+        chunks = chunk_python_source(code, max_chars=max_chars)
+    except SyntaxError:
+        return [block + "\n\n" for block in code.split("\n\n") if block.strip()]
+    # Lignes du source, sans l'en-tête `# nom (part i/n)` des parties suivantes ; les
+    # lignes vides entre deux définitions vont au bloc suivant, pour que les blocs
+    # mis bout à bout redonnent le code collé
+    lines = code.splitlines(keepends=True)
+    blocks = []
+    end = 0
+    for chunk in chunks:
+        if chunk.end_line > end:
+            blocks.append("".join(lines[end:chunk.end_line]))
+            end = chunk.end_line
+    if blocks and end < len(lines):
+        blocks[-1] += "".join(lines[end:])
+    return blocks or [code]
+
+
+def rank_by_overlap(chunks, question):
+    """Indices des chunks triés par nombre de termes de la question qu'ils contiennent."""
+    terms = set(tokenize(question))
+    scores = [len(terms.intersection(tokenize(chunk))) for chunk in chunks]
+    return sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+
+
+@dataclass
+class PackedPrompt:
+    """Ce qui tient dans le budget : contexte (ordre de priorité) et historique (ordre chronologique)."""
+
+    context: List[str] = field(default_factory=list)
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    summary: str = ""
+    tokens: int = 0
+    dropped_context: int = 0
+    dropped_turns: int = 0
+
+
+class PromptPacker:
+    """Compte les tokens avec le tokenizer de LlamaIndex et remplit un budget par priorité."""
+
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET, history_tokens=PROMPT_HISTORY_TOKENS,
+                 answer_tokens=HISTORY_ANSWER_TOKENS, tokenizer=None):
+        self.budget = budget
+        self.history_tokens = history_tokens
+        self.answer_tokens = answer_tokens
+        self._tokenizer = tokenizer
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer or Settings.tokenizer
+
+    def count(self, text):
+        return len(self.tokenizer(text)) if text else 0
+
+    def truncate(self, text, max_tokens):
+        """`text` coupé (à un espace si possible) pour tenir en `max_tokens` tokens."""
+        tokens = self.count(text)
+        if tokens <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        # Coupe proportionnelle, réduite tant que le compte dépasse
+        end = len(text) * max_tokens // tokens
+        while end > 0:
+            cut = text[:end]
+            space = cut.rfind(" ")
+            if space > end // 2:
+                cut = cut[:space]
+            cut = cut.rstrip() + " [...]"
+            if self.count(cut) <= max_tokens:
+                return cut
+            end = end * 9 // 10
+        return ""
+
+    def dedupe(self, chunks):
+        """Retire les chunks déjà couverts par un chunk mieux classé (doublons, chevauchements)."""
+        seen = set()
+        kept = []
+        for chunk in chunks:
+            chunk_shingles = shingles(chunk)
+            if not chunk_shingles:
+                continue
+            if len(chunk_shingles & seen) >= DUPLICATE_RATIO * len(chunk_shingles):
+                continue
+            seen |= chunk_shingles
+            kept.append(chunk)
+        return kept
+
+    def pack(self, question, fixed="", context=(), history=(), history_tokens=None, dedupe=True, summary=None):
+        """
+        Sélectionne le contexte et l'historique qui tiennent dans le budget.
+        `fixed` (instructions) et la question sont toujours gardés ; `context` est
+        trié du plus pertinent au moins pertinent ; `history` est une liste de
+        (question, réponse) du plus ancien au plus récent, et `summary` le résumé
+        des échanges plus anciens (par défaut `history.summary`, voir
+        `history_summarizer`), placé avant les échanges récents.
+        Une part de l'historique (au plus `history_tokens`) est réservée avant de
+        remplir le contexte, pour que les questions de suivi gardent leur fil.
+        """
+        history_tokens = self.history_tokens if history_tokens is None else history_tokens
+        packed = PackedPrompt(tokens=self.count(fixed) + self.count(question))
+        available = max(0, self.budget - packed.tokens)
+
+        if summary is None:
+            summary = getattr(history, "summary", "")
+        summary_tokens = self.count(summary)
+        # Tours les plus récents d'abord, seulement tant qu'ils peuvent tenir
+        turns = []
+        history = list(history)
+        for q, a in reversed(history):
+            turn = (q, self.truncate(a, self.answer_tokens))
+            turns.append((turn, self.count(turn[0]) + self.count(turn[1])))
+            if summary_tokens + sum(tokens for _, tokens in turns) >= history_tokens:
+                break
+        reserve = min(history_tokens, available, summary_tokens + sum(tokens for _, tokens in turns))
+
+        context = self.dedupe(context) if dedupe else list(context)
+        context_budget = available - reserve
+        for chunk in context:
+            tokens = self.count(chunk)
+            if tokens > context_budget:
+                packed.dropped_context += 1
+                continue
+            packed.context.append(chunk)
+            context_budget -= tokens
+            packed.tokens += tokens
+
+        history_budget = min(history_tokens, self.budget - packed.tokens)
+        if summary and summary_tokens <= history_budget:
+            packed.summary = summary
+            history_budget -= summary_tokens
+            packed.tokens += summary_tokens
+        for turn, tokens in turns:
+            if tokens > history_budget:
+                break
+            packed.history.insert(0, turn)
+            history_budget -= tokens
+            packed.tokens += tokens
+        packed.dropped_turns = len(history) - len(packed.history)
+        telemetry.record_tokens("prompt", packed.tokens)
+        return packed
+
+    def pack_code(self, question, code, fixed="", history=()):
+        """
+        Comme `pack`, avec du code collé comme contexte : tout le code s'il tient,
+        sinon les blocs qui partagent le plus de termes avec la question, remis
+        dans l'ordre du fichier.
+        """
+        blocks = split_code(code)
+        order = rank_by_overlap(blocks, question)
+        packed = self.pack(question, fixed, [blocks[i] for i in order], history, dedupe=False)
+        kept = set(map(id, packed.context))
+        packed.context = [block for block in blocks if id(block) in kept]
+        return packed
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Rerankers des knowledge bases, sélectionnables par `KnowledgeBaseConfig.reranker` :
+- "cross_encoder" : cross-encoder local (CPU, backend torch ou ONNX), tous les
+  candidats notés en un seul forward pass, sans aller-retour réseau ;
+- "cohere" : API Cohere Rerank (nécessite COHERE_API_KEY) ;
+- "none" : pas de reranking.
+"""
+
+import os
+from typing import List, Optional
+from pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from . import http_clients, model_registry, telemetry
+
+logger = telemetry.get_logger("rerankers")
+
+RERANKERS = ("cross_encoder", "cohere", "none")
+
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    """Reranking local : score (question, passage) par un cross-encoder partagé par le process."""
+
+    top_n: int = Field(default=5)
+    _model = PrivateAttr()
+
+    def __init__(self, model, top_n=5, **kwargs):
+        super().__init__(top_n=top_n, **kwargs)
+        self._model = model
+
+    @classmethod
+    def class_name(cls):
+        return "CrossEncoderRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes
+
+        pairs = [
+            (query_bundle.query_str, node.node.get_content(metadata_mode=MetadataMode.EMBED))
+            for node in nodes
+        ]
+        # Toutes les paires dans un seul lot : un forward pass par requête
+        with telemetry.span("rerank", candidates=len(pairs)):
+            scores = self._model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        for node, score in zip(nodes, scores):
+            node.score = float(score)
+        return sorted(nodes, key=lambda node: node.score, reverse=True)[: self.top_n]
+
+
+def build_reranker(kind, top_n=5):
+    """Construit le reranker `kind` ; retourne None s'il n'y a pas de reranking."""
+    if kind == "none":
+        return None
+
+    if kind == "cross_encoder":
+        return CrossEncoderRerank(model_registry.get_cross_encoder(), top_n=top_n)
+
+    if kind == "cohere":
+        cohere_key = os.getenv("COHERE_API_KEY")
+        if not cohere_key or not cohere_key.strip():
+            logger.warning("COHERE_API_KEY not set, Cohere reranking is disabled.")
+            return None
+        from llama_index.postprocessor.cohere_rerank import CohereRerank
+        reranker = CohereRerank(api_key=cohere_key, top_n=top_n)
+        # Connexions keep-alive partagées au lieu du client HTTP propre au SDK
+        client = http_clients.get_cohere_client(cohere_key)
+        if client is not None:
+            reranker._client = client
+        return reranker
+
+    raise ValueError(f"Unknown reranker '{kind}', expected one of {RERANKERS}")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Politiques de retry et circuit breakers pour les appels LLM.
+Les erreurs sont classées (rate limit, modèle, clé, transitoire, fatale) ; chaque
+classe a sa politique de retry avec backoff exponentiel et jitter, et chaque
+modèle a un circuit breaker qui coupe le trafic pendant une fenêtre de
+refroidissement après des échecs répétés.
+"""
+
+import re
+import random
+from dataclasses import dataclass
+
+
+class ErrorClass:
+    RATE_LIMIT = "rate_limit"  # 429 : la clé est saturée
+    MODEL = "model"            # modèle indisponible ou introuvable
+    AUTH = "auth"              # clé invalide ou sans droits
+    TRANSIENT = "transient"    # timeout, connexion, 5xx, erreur inconnue
+    FATAL = "fatal"            # requête invalide : échouera sur toutes les configurations
+
+
+RATE_LIMIT_INDICATORS = [
+    "rate limit", "too many requests", "quota exceeded",
+    "429", "rate_limit_exceeded"
+]
+MODEL_ERROR_INDICATORS = [
+    "model not found", "model unavailable", "invalid model",
+    "model error", "service unavailable", "502", "503"
+]
+AUTH_INDICATORS = [
+    "invalid api key", "unauthorized", "no auth credentials", "401", "403"
+]
+FATAL_INDICATORS = [
+    "context length", "maximum context", "context_length_exceeded",
+    "invalid request", "bad request", "content policy"
+]
+
+
+def _indicator_pattern(indicators):
+    # Limites de mot : "429" ne correspond pas à "max_tokens must be <= 4290"
+    return re.compile("|".join(rf"\b{re.escape(indicator)}\b" for indicator in indicators))
+
+
+RATE_LIMIT_RE = _indicator_pattern(RATE_LIMIT_INDICATORS)
+MODEL_ERROR_RE = _indicator_pattern(MODEL_ERROR_INDICATORS)
+AUTH_RE = _indicator_pattern(AUTH_INDICATORS)
+FATAL_RE = _indicator_pattern(FATAL_INDICATORS)
+
+
+def classify_error(error):
+    """
+    Classe une erreur (exception ou message) selon la politique de retry à appliquer.
+    Le type de l'exception et son code HTTP décident d'abord ; le message n'est
+    utilisé que pour les erreurs sans code (messages, erreurs de LlamaIndex).
+    """
+    name = type(error).__name__
+    status = getattr(error, "status_code", None)
+
+    if name in ("ExecutorSaturated", "DispatcherSaturated", "CircuitsOpen"):
+        return ErrorClass.FATAL  # serveur ou clés saturés : réessayer ailleurs ne servirait à rien
+    if name == "RateLimitError" or status == 429:
+        return ErrorClass.RATE_LIMIT
+    if name == "NotFoundError" or status in (404, 502, 503):
+        return ErrorClass.MODEL
+    if name in ("AuthenticationError", "PermissionDeniedError") or status in (401, 403):
+        return ErrorClass.AUTH
+    if name in ("BadRequestError", "UnprocessableEntityError") or status in (400, 422):
+        return ErrorClass.FATAL
+    if isinstance(status, int):
+        return ErrorClass.TRANSIENT
+
+    error_str = str(error).lower()
+    if RATE_LIMIT_RE.search(error_str):
+        return ErrorClass.RATE_LIMIT
+    if MODEL_ERROR_RE.search(error_str):
+        return ErrorClass.MODEL
+    if AUTH_RE.search(error_str):
+        return ErrorClass.AUTH
+    if FATAL_RE.search(error_str):
+        return ErrorClass.FATAL
+    return ErrorClass.TRANSIENT
+
+
+def get_retry_after(error):
+    """Délai Retry-After (secondes) indiqué par le fournisseur, sinon None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None or not hasattr(headers, "get"):
+        return None
+    value = headers.get("retry-after")
+    if not isinstance(value, (str, int, float)):
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None  # format date HTTP : on garde le backoff par défaut
+
+
+@dataclass
+class RetryPolicy:
+    """Retry d'une classe d'erreur : sur une autre configuration, après un backoff avec jitter."""
+    retry: bool = True
+    base_delay: float = 0.0
+    max_delay: float = 0.0
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + random.uniform(0, 0.1 * self.base_delay)
+        if not self.base_delay:
+            return 0.0
+        # Full jitter : évite que les requêtes concurrentes réessaient en même temps
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+RETRY_POLICIES = {
+    ErrorClass.RATE_LIMIT: RetryPolicy(base_delay=1.0, max_delay=30.0),
+    ErrorClass.MODEL: RetryPolicy(),
+    ErrorClass.AUTH: RetryPolicy(),
+    ErrorClass.TRANSIENT: RetryPolicy(base_delay=0.5, max_delay=8.0),
+    ErrorClass.FATAL: RetryPolicy(retry=False),
+}
+
+
+def retry_delay(error_class, attempt, retry_after=None, alternate_available=True):
+    """
+    Délai avant la tentative suivante. Un rate limit n'attend pas si une autre
+    clé est disponible tout de suite ; les erreurs transitoires attendent
+    toujours, pour ne pas épuiser les clés pendant une panne du fournisseur.
+    """
+    if error_class == ErrorClass.RATE_LIMIT and alternate_available:
+        return 0.0
+    return RETRY_POLICIES[error_class].delay(attempt, retry_after)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker d'un modèle : ouvert après `failure_threshold` échecs
+    consécutifs, il refuse le trafic pendant `cooldown` secondes, puis laisse
+    passer une seule requête de test (semi-ouvert) avant de se refermer.
+    Non thread-safe : protégé par le verrou du dispatcher.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probe_in_flight = False
+
+    def current_state(self, now):
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.state
+
+    def allows(self, now):
+        state = self.current_state(now)
+        if state == self.CLOSED:
+            return True
+        return state == self.HALF_OPEN and not self.probe_in_flight
+
+    def time_until_allowed(self, now):
+        if self.allows(now):
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def on_dispatch(self, now):
+        if self.current_state(now) == self.HALF_OPEN:
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, now):
+        self.probe_in_flight = False
+        if self.state == self.OPEN:
+            return  # requête partie avant l'ouverture : ne prolonge pas la fenêtre
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = now
+            self.times_opened += 1
+
+    def record_cancel(self):
+        self.probe_in_flight = False
+
+    def snapshot(self, now):
+        return {
+            "state": self.current_state(now),
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_in": round(self.time_until_allowed(now), 1),
+        }
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Récupération parallèle sur plusieurs knowledge bases.
+Chaque source est interrogée dans un thread avec son propre timeout, puis les
+classements sont fusionnés par reciprocal rank fusion (RRF).
+"""
+
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from . import telemetry
+
+logger = telemetry.get_logger("retrieval")
+
+# Timeout par source (secondes) et constante k de la RRF
+DEFAULT_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "10"))
+RRF_K = 60
+
+
+def node_key(node):
+    """Identifiant stable d'un NodeWithScore, utilisé pour dédupliquer entre sources."""
+    return node.node.node_id
+
+
+def reciprocal_rank_fusion(ranked_lists, top_n=None, k=RRF_K, key=node_key):
+    """
+    Fusionne plusieurs classements en un seul.
+
+    `ranked_lists` associe un nom de source à sa liste de résultats triés.
+    Retourne une liste de (source, résultat, score) triée par score RRF décroissant ;
+    un résultat présent dans plusieurs sources cumule ses scores et garde sa première source.
+    """
+    fused = {}
+    for source, results in ranked_lists.items():
+        for rank, result in enumerate(results, 1):
+            result_key = key(result)
+            if result_key not in fused:
+                fused[result_key] = [source, result, 0.0]
+            fused[result_key][2] += 1.0 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda item: item[2], reverse=True)
+    if top_n is not None:
+        ranked = ranked[:top_n]
+    return [tuple(item) for item in ranked]
+
+
+class FanOutRetriever:
+    """Interroge plusieurs retrievers en parallèle ; la latence est celle de la source la plus lente."""
+
+    def __init__(self, retrievers, timeout=DEFAULT_TIMEOUT, top_n=10, executor=None):
+        self.retrievers = retrievers  # nom de source -> retriever
+        self.timeout = timeout  # float, ou dict nom de source -> float
+        self.top_n = top_n
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max(4, 2 * len(retrievers)),
+            thread_name_prefix="retrieval"
+        )
+
+    def _timeout_for(self, source):
+        if isinstance(self.timeout, dict):
+            return self.timeout.get(source, DEFAULT_TIMEOUT)
+        return self.timeout
+
+    async def aretrieve(self, question):
+        """Retourne {source: résultats} sans bloquer la boucle d'événements."""
+        loop = asyncio.get_running_loop()
+
+        async def retrieve_one(source, retriever):
+            # Contexte copié : les spans du thread rejoignent la trace de la requête
+            context = contextvars.copy_context()
+            future = loop.run_in_executor(self._executor, context.run, retriever.retrieve, question)
+            try:
+                return source, await asyncio.wait_for(future, self._timeout_for(source))
+            except asyncio.TimeoutError:
+                logger.warning("Retrieval from '%s' timed out after %ss", source, self._timeout_for(source))
+            except Exception as e:
+                logger.warning("Retrieval from '%s' failed: %s", source, e)
+            return source, []
+
+        with telemetry.span("retrieval", sources=len(self.retrievers)):
+            results = await asyncio.gather(
+                *(retrieve_one(source, retriever) for source, retriever in self.retrievers.items())
+            )
+        return dict(results)
+
+    def retrieve(self, question):
+        """Version synchrone (CLI) : mêmes appels parallèles, mêmes timeouts."""
+        start = time.monotonic()
+        futures = {
+            source: self._executor.submit(retriever.retrieve, question)
+            for source, retriever in self.retrievers.items()
+        }
+
+        results = {}
+        for source, future in futures.items():
+            remaining = max(0.0, start + self._timeout_for(source) - time.monotonic())
+            try:
+                results[source] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logger.warning("Retrieval from '%s' timed out after %ss", source, self._timeout_for(source))
+                results[source] = []
+            except Exception as e:
+                logger.warning("Retrieval from '%s' failed: %s", source, e)
+                results[source] = []
+        return results
+
+    async def aretrieve_fused(self, question):
+        """Résultats de toutes les sources, fusionnés par RRF."""
+        return reciprocal_rank_fusion(await self.aretrieve(question), top_n=self.top_n)
+
+    def retrieve_fused(self, question):
+        """Version synchrone de `aretrieve_fused`."""
+        return reciprocal_rank_fusion(self.retrieve(question), top_n=self.top_n)
@@ -0,0 +1,87 @@
+"""
+Lancement de production : gunicorn avec N workers uvicorn.
+Le process maître importe l'application et charge les modèles (embedding,
+reranker) et les index BM25 / symboles une seule fois ; les workers sont forkés
+ensuite et partagent ces pages en copy-on-write. Chaque worker ouvre ses
+propres connexions (Chroma, SQLite, HTTP) dans le lifespan FastAPI.
+
+Usage:
+    python src/serve.py --workers 4 --port 8000
+"""
+
+import os
+import gc
+import sys
+import argparse
+
+# Add the project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from gunicorn.app.base import BaseApplication
+
+
+def post_fork(server, worker):
+    """Répartit les threads torch entre les workers au lieu de les faire tous tourner sur tous les cœurs."""
+    try:
+        import torch
+    except ImportError:
+        return
+    threads = int(os.getenv("TORCH_THREADS_PER_WORKER") or 0)
+    if not threads:
+        threads = max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    torch.set_num_threads(threads)
+
+
+class RAGServer(BaseApplication):
+    """Application gunicorn : `src.api:app` préchargée dans le maître, servie par des UvicornWorker."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from src import model_registry
+        from src.api import app
+        from src.knowledge_bases import KnowledgeBaseManager
+
+        model_registry.preload_shared_models(KnowledgeBaseManager().get_available_knowledge_bases())
+        # Objets chargés hors du GC : ses passages ne réécrivent pas les pages partagées
+        gc.freeze()
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RAG Assistant API with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a silent worker is restarted")
+    args = parser.parse_args()
+
+    os.chdir(project_root)
+    if args.workers > 1:
+        # Les sessions doivent être visibles de tous les workers, et un seul process
+        # doit construire un index : on les construit avec scripts/build_index.py
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+        os.environ.setdefault("AUTO_BUILD_INDEXES", "0")
+
+    print(f"Starting {args.workers} workers on http://{args.host}:{args.port}")
+    RAGServer({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "timeout": args.timeout,
+        "graceful_timeout": 30,
+        "accesslog": "-",
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
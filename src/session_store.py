@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Stockage des sessions de conversation (historiques par knowledge base et
+sessions de code review), borné en durée et en mémoire.
+Chaque session est un état JSON (code, échanges récents, résumé) dont la taille
+en octets est suivie : les sessions inactives expirent (TTL) et les moins
+récemment utilisées sont évincées quand le total dépasse le plafond (LRU).
+Le backend par défaut vit dans le process ; le backend SQLite est partagé par
+plusieurs workers uvicorn sur la même machine.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))  # Secondes d'inactivité avant expiration
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class MemorySessionBackend:
+    """Sessions du process, dans un OrderedDict du moins au plus récemment utilisé."""
+
+    def __init__(self):
+        self._items = OrderedDict()  # clé -> (payload, dernière utilisation, taille en octets)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne (payload, dernière utilisation) ou None, et marque la session comme utilisée."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items[key] = (item[0], time.time(), item[2])
+            self._items.move_to_end(key)
+            return item[:2]
+
+    def put(self, key, payload, size):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._items[key] = (payload, time.time(), size)
+            self._bytes += size
+
+    def delete(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def evict(self, ttl, max_bytes, keep=None):
+        """Supprime les sessions expirées puis les plus anciennes au-delà de `max_bytes`. Retourne le nombre supprimé."""
+        deadline = time.time() - ttl
+        evicted = 0
+        with self._lock:
+            for key in list(self._items):
+                _, last_used, size = self._items[key]
+                if last_used >= deadline and self._bytes <= max_bytes:
+                    break  # Ordre LRU : les suivantes sont plus récentes
+                if key == keep:
+                    continue
+                del self._items[key]
+                self._bytes -= size
+                evicted += 1
+        return evicted
+
+    def size(self):
+        with self._lock:
+            return len(self._items), self._bytes
+
+
+class SQLiteSessionBackend:
+    """Sessions dans une base SQLite (mode WAL), partagées par les workers qui ouvrent le même fichier."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, payload TEXT, size INTEGER, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT payload, last_used FROM sessions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE sessions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row
+
+    def put(self, key, payload, size):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            self._db.commit()
+
+    def evict(self, ttl, max_bytes, keep=None):
+        with self._lock:
+            evicted = self._db.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - ttl,)).rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+            if total > max_bytes:
+                rows = self._db.execute("SELECT key, size FROM sessions ORDER BY last_used").fetchall()
+                for key, size in rows:
+                    if total <= max_bytes:
+                        break
+                    if key == keep:
+                        continue
+                    self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+            self._db.commit()
+            return evicted
+
+    def size(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+
+
+class SessionStore:
+    """États de session JSON, avec expiration et plafond mémoire, sur un backend interchangeable."""
+
+    def __init__(self, backend=None, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES):
+        self.backend = backend or MemorySessionBackend()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Backend choisi par SESSION_BACKEND : `memory` (défaut) ou `sqlite` (SESSION_DB_PATH)."""
+        kind = os.getenv("SESSION_BACKEND", "memory")
+        if kind == "sqlite":
+            backend = SQLiteSessionBackend(os.getenv("SESSION_DB_PATH", "data/cache/sessions.sqlite"))
+        elif kind == "memory":
+            backend = MemorySessionBackend()
+        else:
+            raise ValueError(f"Unknown session backend '{kind}', expected 'memory' or 'sqlite'")
+        return cls(backend)
+
+    def get(self, key):
+        """État de la session `key`, ou None si elle n'existe pas ou a expiré."""
+        item = self.backend.get(key)
+        if item is not None and item[1] < time.time() - self.ttl:
+            self.backend.delete(key)
+            item = None
+        if item is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return json.loads(item[0])
+
+    def put(self, key, state):
+        payload = json.dumps(state)
+        self.backend.put(key, payload, len(payload.encode("utf-8")))
+        self.stats["stores"] += 1
+        self.stats["evictions"] += self.backend.evict(self.ttl, self.max_bytes, keep=key)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def get_stats(self):
+        sessions, size = self.backend.size()
+        return {**self.stats, "sessions": sessions, "bytes": size, "max_bytes": self.max_bytes}
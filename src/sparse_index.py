@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Index lexical BM25 construit à côté de la collection Chroma.
+La tokenisation garde les identifiants de code entiers (`rolling_split`,
+`portfolio.from_order_func`) en plus de leurs parties, pour que les questions
+qui nomment un symbole exact le retrouvent même quand l'embedding le rate.
+Les résultats sont fusionnés avec ceux du retriever dense par RRF.
+"""
+
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from typing import List
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from . import executors, telemetry
+from .retrieval import reciprocal_rank_fusion
+
+SPARSE_INDEX_FILE = "bm25_index.json"
+
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it of on or "
+    "that the this to use what when where which with you".split()
+)
+
+
+def tokenize(text):
+    """
+    Termes d'un texte : chaque identifiant entier (en minuscules), ses parties
+    pointées et les mots qui le composent (snake_case, CamelCase).
+    `Portfolio.from_order_func` -> portfolio.from_order_func, portfolio,
+    from_order_func, order, func.
+    """
+    terms = []
+    for identifier in IDENTIFIER_RE.findall(text):
+        lowered = identifier.lower()
+        parts = identifier.split(".")
+        if len(parts) > 1:
+            terms.append(lowered)
+        for part in parts:
+            if part.lower() not in STOPWORDS:
+                terms.append(part.lower())
+            words = [w.lower() for chunk in part.split("_") for w in CAMEL_RE.findall(chunk)]
+            if len(words) > 1:
+                terms.extend(w for w in words if len(w) > 1 and w not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """Index inversé BM25 en mémoire, persisté en JSON avec le texte des nodes."""
+
+    def __init__(self, node_ids, texts, metadatas, doc_lens, postings, k1=1.5, b=0.75):
+        self.node_ids = node_ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.doc_lens = doc_lens
+        self.postings = postings  # terme -> [(indice du node, fréquence)]
+        self.positions = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.k1 = k1
+        self.b = b
+        self.avgdl = sum(doc_lens) / len(doc_lens) if doc_lens else 0.0
+        n = len(node_ids)
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in postings.items()
+        }
+
+    @classmethod
+    def from_nodes(cls, nodes, **kwargs):
+        node_ids, texts, metadatas, doc_lens = [], [], [], []
+        postings = defaultdict(list)
+        for i, node in enumerate(nodes):
+            text = node.get_content()
+            counts = Counter(tokenize(text))
+            node_ids.append(node.node_id)
+            texts.append(text)
+            metadatas.append(node.metadata)
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((i, tf))
+        return cls(node_ids, texts, metadatas, doc_lens, dict(postings), **kwargs)
+
+    def updated(self, removed_node_ids, nodes):
+        """Nouvel index sans les nodes `removed_node_ids`, avec `nodes` en plus (builds incrémentaux)."""
+        removed_node_ids = set(removed_node_ids)
+        kept = [
+            TextNode(id_=node_id, text=text, metadata=metadata)
+            for node_id, text, metadata in zip(self.node_ids, self.texts, self.metadatas)
+            if node_id not in removed_node_ids
+        ]
+        return BM25Index.from_nodes(kept + list(nodes), k1=self.k1, b=self.b)
+
+    def search(self, query, top_k=10):
+        """Retourne [(indice du node, score)] triés par score BM25 décroissant."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for i, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[i] / self.avgdl)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def get_node(self, i):
+        return TextNode(id_=self.node_ids[i], text=self.texts[i], metadata=self.metadatas[i])
+
+    def get_node_by_id(self, node_id):
+        """Node `node_id`, ou None s'il n'est pas dans l'index."""
+        i = self.positions.get(node_id)
+        return self.get_node(i) if i is not None else None
+
+    def get_nodes(self):
+        return [self.get_node(i) for i in range(len(self.node_ids))]
+
+    def persist(self, persist_dir):
+        path = os.path.join(persist_dir, SPARSE_INDEX_FILE)
+        data = {
+            "version": 1,
+            "k1": self.k1,
+            "b": self.b,
+            "node_ids": self.node_ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "doc_lens": self.doc_lens,
+            "postings": self.postings,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, persist_dir):
+        """Charge l'index de `persist_dir`, ou retourne None s'il n'a pas été construit."""
+        path = os.path.join(persist_dir, SPARSE_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return cls(
+            data["node_ids"], data["texts"], data["metadatas"], data["doc_lens"], postings,
+            k1=data["k1"], b=data["b"],
+        )
+
+
+class BM25Retriever(BaseRetriever):
+    """Retriever LlamaIndex sur un BM25Index."""
+
+    def __init__(self, sparse_index, similarity_top_k=8):
+        super().__init__()
+        self.sparse_index = sparse_index
+        self.similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return [
+            NodeWithScore(node=self.sparse_index.get_node(i), score=score)
+            for i, score in self.sparse_index.search(query_bundle.query_str, self.similarity_top_k)
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Résultats dense (embeddings) et BM25 fusionnés par reciprocal rank fusion."""
+
+    def __init__(self, dense_retriever, sparse_retriever, top_n=10):
+        super().__init__()
+        self.dense_retriever = dense_retriever
+        self.sparse_retriever = sparse_retriever
+        self.top_n = top_n
+
+    def _fuse(self, dense, sparse):
+        fused = reciprocal_rank_fusion({"dense": dense, "sparse": sparse}, top_n=self.top_n)
+        return [NodeWithScore(node=result.node, score=score) for _, result, score in fused]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with telemetry.span("retrieval"):
+            return self._fuse(
+                self.dense_retriever.retrieve(query_bundle),
+                self.sparse_retriever.retrieve(query_bundle),
+            )
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Chroma n'a pas de requête asynchrone : dense + BM25 dans le pool de threads
+        return await executors.run_io(self._retrieve, query_bundle)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Table des symboles du code indexé (modules, classes, fonctions, méthodes et
+accessors vectorbt), construite à l'indexation à partir des métadonnées
+`qualified_name` des chunks de code (voir `code_chunker`).
+Quand une question nomme un symbole (`vbt.Portfolio.from_signals`,
+`df.vbt.returns.sharpe_ratio`), ses chunks sont récupérés par lookup dans un
+dict, sans recherche vectorielle ni reranking.
+"""
+
+import os
+import re
+import json
+import difflib
+from collections import defaultdict
+from typing import List
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from . import executors, telemetry
+from .sparse_index import IDENTIFIER_RE
+
+SYMBOL_INDEX_FILE = "symbol_index.json"
+
+# Au-delà, un nom est trop ambigu pour court-circuiter la recherche (`run`, `plot`...)
+MAX_SYMBOLS = int(os.getenv("SYMBOL_MAX_MATCHES", "3"))
+FUZZY_CUTOFF = 0.85
+FUZZY_MIN_CHARS = 5
+
+BACKTICK_RE = re.compile(r"`([^`]+)`")
+# ReturnsAccessor, ReturnsSRAccessor -> `returns` (df.vbt.returns.sharpe_ratio)
+ACCESSOR_RE = re.compile(r"^([A-Za-z0-9]+?)(?:SR|DF)?Accessor$")
+
+
+def looks_like_code(name):
+    """Un nom pointé, snake_case ou CamelCase, plutôt qu'un mot de la question."""
+    return "." in name or "_" in name or any(c.isupper() for c in name[1:])
+
+
+def symbol_keys(qualified_name):
+    """
+    Clés (en minuscules) sous lesquelles un symbole est trouvé : chaque suffixe
+    pointé de son nom qualifié, et les mêmes avec le nom d'accessor pandas.
+    `vectorbt.returns.accessors.ReturnsAccessor.sharpe_ratio` ->
+    ..., `returnsaccessor.sharpe_ratio`, `sharpe_ratio`, `returns.sharpe_ratio`.
+    """
+    parts = qualified_name.split(".")
+    variants = [parts]
+    for i, part in enumerate(parts):
+        match = ACCESSOR_RE.match(part)
+        if match:
+            variants.append(parts[:i] + [match.group(1)] + parts[i + 1:])
+    return {".".join(variant[i:]).lower() for variant in variants for i in range(len(variant))}
+
+
+class SymbolIndex:
+    """Nom qualifié -> ids des chunks, et clés de recherche -> noms qualifiés."""
+
+    def __init__(self, symbols):
+        self.symbols = symbols  # nom qualifié -> {"kind", "signature", "node_ids"}
+        self.keys = defaultdict(list)  # clé en minuscules -> noms qualifiés
+        for qualified_name in symbols:
+            for key in symbol_keys(qualified_name):
+                self.keys[key].append(qualified_name)
+        for names in self.keys.values():
+            names.sort(key=len)  # Le chemin le plus court (l'API publique) d'abord
+        # Derniers composants par première lettre, pour la recherche approchée
+        self.short_names = defaultdict(set)
+        for key in self.keys:
+            if "." not in key:
+                self.short_names[key[0]].add(key)
+        # Noms de classe exacts, reconnus même sans marque de code (`Portfolio`)
+        self.class_names = {
+            name.rsplit(".", 1)[-1] for name, symbol in symbols.items() if symbol["kind"] == "class"
+        }
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Symboles des nodes qui portent un `qualified_name`, chunks dans l'ordre des parties."""
+        parts = defaultdict(list)
+        for node in nodes:
+            metadata = node.metadata
+            qualified_name = metadata.get("qualified_name")
+            if qualified_name:
+                parts[qualified_name].append((metadata.get("part", 1), node.node_id, metadata))
+        symbols = {}
+        for qualified_name, chunks in parts.items():
+            chunks.sort(key=lambda chunk: chunk[0])
+            metadata = chunks[0][2]
+            symbols[qualified_name] = {
+                "kind": metadata.get("symbol_kind", ""),
+                "signature": metadata.get("signature", ""),
+                "node_ids": [node_id for _, node_id, _ in chunks],
+            }
+        return cls(symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def lookup(self, name):
+        """
+        Noms qualifiés correspondant exactement à `name`, en retirant les préfixes
+        inconnus (`vbt.`, `df.vbt.`, `pf.`) jusqu'à trouver une clé.
+        """
+        parts = name.strip("().").split(".")
+        for i in range(len(parts)):
+            names = self.keys.get(".".join(parts[i:]).lower())
+            if names:
+                # `Portfolio` désigne la classe plutôt que le module `portfolio`
+                suffix = "." + ".".join(parts[i:])
+                exact = [n for n in names if ("." + n).endswith(suffix)]
+                return exact or names
+        return []
+
+    def fuzzy_lookup(self, name):
+        """Noms qualifiés d'un nom mal orthographié (`from_signal`), et le score de la correspondance."""
+        parts = name.strip("().").split(".")
+        last = parts[-1].lower()
+        if len(last) < FUZZY_MIN_CHARS:
+            return [], 0.0
+        close = difflib.get_close_matches(last, self.short_names.get(last[0], ()), n=1, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return [], 0.0
+        names = self.lookup(".".join(parts[:-1] + close)) or self.lookup(close[0])
+        return names, difflib.SequenceMatcher(None, last, close[0]).ratio()
+
+    def match(self, query, max_symbols=MAX_SYMBOLS):
+        """
+        Symboles nommés par la question : [(nom qualifié, score)], 1.0 pour une
+        correspondance exacte. Les noms trop ambigus sont ignorés.
+        """
+        names = BACKTICK_RE.findall(query) + IDENTIFIER_RE.findall(query)
+        matches = {}
+        for name in names:
+            if not (looks_like_code(name) or name in self.class_names or f"`{name}`" in query):
+                continue
+            found, score = self.lookup(name), 1.0
+            if not found:
+                found, score = self.fuzzy_lookup(name)
+            if found and len(found) <= max_symbols:
+                for qualified_name in found:
+                    matches[qualified_name] = max(score, matches.get(qualified_name, 0.0))
+        ranked = sorted(matches.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:max_symbols]
+
+    def node_ids(self, qualified_name):
+        return self.symbols[qualified_name]["node_ids"]
+
+    def persist(self, persist_dir):
+        path = os.path.join(persist_dir, SYMBOL_INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "symbols": self.symbols}, f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, persist_dir):
+        """Charge la table de `persist_dir`, ou retourne None si elle n'a pas été construite."""
+        path = os.path.join(persist_dir, SYMBOL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["symbols"])
+
+
+class SymbolRetriever(BaseRetriever):
+    """Chunks des symboles nommés par la question, lus dans l'index BM25 (texte en mémoire)."""
+
+    def __init__(self, symbol_index, sparse_index, top_n=5):
+        super().__init__()
+        self.symbol_index = symbol_index
+        self.sparse_index = sparse_index
+        self.top_n = top_n
+
+    @telemetry.span("symbol_lookup")
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        results = []
+        for qualified_name, score in self.symbol_index.match(query_bundle.query_str):
+            for node_id in self.symbol_index.node_ids(qualified_name):
+                node = self.sparse_index.get_node_by_id(node_id)
+                if node is not None:
+                    results.append(NodeWithScore(node=node, score=score))
+        return results[:self.top_n]
+
+
+class SymbolFirstRetriever(BaseRetriever):
+    """
+    Essaie d'abord la table des symboles ; si la question n'en nomme aucun, passe
+    par `retriever` (dense / hybride) puis les `postprocessors` (reranking).
+    """
+
+    def __init__(self, symbol_retriever, retriever, postprocessors=None):
+        super().__init__()
+        self.symbol_retriever = symbol_retriever
+        self.retriever = retriever
+        self.postprocessors = postprocessors or []
+
+    def _postprocess(self, nodes, query_bundle):
+        for postprocessor in self.postprocessors:
+            nodes = postprocessor.postprocess_nodes(nodes, query_bundle=query_bundle)
+        return nodes
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        nodes = self.symbol_retriever.retrieve(query_bundle)
+        if nodes:
+            return nodes
+        return self._postprocess(self.retriever.retrieve(query_bundle), query_bundle)
+
+    def _retrieve_and_rerank(self, query_bundle):
+        return self._postprocess(self.retriever.retrieve(query_bundle), query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        nodes = self.symbol_retriever.retrieve(query_bundle)
+        if nodes:
+            return nodes
+        # Recherche et reranking synchrones : dans le pool de threads, hors de la boucle
+        return await executors.run_io(self._retrieve_and_rerank, query_bundle)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Traces des requêtes, métriques Prometheus et logs.
+Chaque requête ouvre une trace ; les étapes du pipeline (embedding, retrieval,
+reranking, construction du prompt, appel LLM) y ajoutent des spans avec leur
+durée et leurs attributs (tokens, hits de cache). Le temps propre de chaque
+étape (sans ses sous-étapes) alimente un histogramme par étape, exposé au
+format texte Prometheus par `/metrics`.
+Les logs passent par le logger `rag` : un message de debug n'est pas formaté
+quand le niveau LOG_LEVEL est plus élevé.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag")
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Handler du logger `rag` (ajouté une seule fois) et niveau LOG_LEVEL."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+def get_logger(name):
+    """Logger d'un module, sous `rag` (`rag.api`, `rag.llm`...)."""
+    return logger.getChild(name)
+
+
+def _format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Compteur Prometheus, une valeur par combinaison de labels."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogramme Prometheus (buckets cumulés, somme, nombre), une série par combinaison de labels."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs des labels -> [compte par bucket, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, label_values, le=repr(float(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le='+Inf')} {count}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end request latency", ("endpoint", "status"))
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each pipeline stage, sub-stages excluded", ("stage",))
+FIRST_TOKEN_SECONDS = Histogram("rag_time_to_first_token_seconds", "Streaming latency until the first token")
+TOKENS = Counter("rag_tokens_total", "Prompt and completion tokens", ("kind",))
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, FIRST_TOKEN_SECONDS, TOKENS, CACHE_LOOKUPS]
+
+
+class Span:
+    """Une étape d'une requête : durée totale, durée des sous-étapes, attributs."""
+
+    __slots__ = ("stage", "attributes", "duration", "children")
+
+    def __init__(self, stage, attributes):
+        self.stage = stage
+        self.attributes = attributes
+        self.duration = 0.0
+        self.children = 0.0
+
+    @property
+    def self_time(self):
+        # Sous-étapes parallèles : leur somme peut dépasser la durée de l'étape
+        return max(0.0, self.duration - self.children)
+
+
+class Trace:
+    """Spans terminés d'une requête, résumés en une ligne de log à la fin."""
+
+    def __init__(self, endpoint, attributes):
+        self.endpoint = endpoint
+        self.attributes = attributes
+        self.spans = []
+        self.start = time.perf_counter()
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Temps propre par étape (ms) et attributs cumulés de la requête."""
+        stages = {}
+        attributes = dict(self.attributes)
+        with self._lock:
+            for span in self.spans:
+                stages[span.stage] = stages.get(span.stage, 0.0) + span.self_time * 1000
+                for key, value in span.attributes.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        attributes[key] = attributes.get(key, 0) + value
+                    else:
+                        attributes[key] = value
+        return {
+            "endpoint": self.endpoint,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 1),
+            "stages_ms": {stage: round(ms, 1) for stage, ms in stages.items()},
+            **attributes,
+        }
+
+    def finish(self, status="ok"):
+        """Enregistre la latence de la requête et journalise son résumé (une seule fois)."""
+        if self.finished:
+            return None
+        self.finished = True
+        REQUEST_SECONDS.observe(time.perf_counter() - self.start, self.endpoint, status)
+        summary = self.summary()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("trace %s", json.dumps(summary, default=str))
+        return summary
+
+
+_trace = contextvars.ContextVar("rag_trace", default=None)
+_span = contextvars.ContextVar("rag_span", default=None)
+
+
+def start_trace(endpoint, **attributes):
+    """Ouvre la trace de la requête courante (tâche asyncio et threads lancés avec son contexte)."""
+    trace = Trace(endpoint, attributes)
+    _trace.set(trace)
+    _span.set(None)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Mesure une étape : histogramme `rag_stage_seconds{stage}` (temps propre) et,
+    dans une requête, span ajouté à sa trace. `annotate` complète ses attributs.
+    """
+    parent = _span.get()
+    current = Span(stage, attributes)
+    token = _span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - start
+        try:
+            _span.reset(token)
+        except ValueError:
+            pass  # Générateur async fermé depuis un autre contexte
+        if parent is not None:
+            parent.children += current.duration
+        STAGE_SECONDS.observe(current.self_time, stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(current)
+
+
+def annotate(**attributes):
+    """Ajoute des attributs au span en cours, sinon à la trace de la requête."""
+    current = _span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+        return
+    trace = _trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def record_tokens(kind, count):
+    TOKENS.inc(count, kind)
+    annotate(**{f"{kind}_tokens": count})
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(1, cache, "hit" if hit else "miss")
+    annotate(**{f"{cache}_cache_hit": hit})
+
+
+def render_gauges(prefix, stats, label=None):
+    """
+    Valeurs numériques d'un dict de stats (`get_stats()`) en gauges `rag_<prefix>_<clé>`.
+    Avec `label`, `stats` associe une valeur de ce label à chaque dict de stats.
+    """
+    groups = stats.items() if label else [(None, stats)]
+    samples = {}  # nom de la métrique -> lignes
+    for label_value, group in groups:
+        labels = _format_labels((label,), (label_value,)) if label else ""
+        for key, value in group.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"rag_{prefix}_{key}"
+            samples.setdefault(name, []).append(f"{name}{labels} {value}")
+    lines = []
+    for name, metric_lines in samples.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(metric_lines)
+    return lines
+
+
+def render(extra_lines=()):
+    """Métriques du process au format texte Prometheus (version 0.0.4)."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
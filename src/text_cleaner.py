@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Nettoyage du texte avant indexation, partagé par `scripts/build_index.py`
+(texte extrait des PDF et documents) et `scripts/clean_docs.py` (pages de
+documentation scrapées).
+Les expressions sont compilées une seule fois et regroupées en quelques passes ;
+les ratios de caractères sont comptés par des opérations C (regex, str.isascii)
+plutôt que caractère par caractère en Python.
+"""
+
+import re
+
+MAX_CHARS = 1_000_000  # Au-delà, le texte est tronqué
+MIN_CHARS = 10  # Minimum avant nettoyage
+MIN_CLEAN_CHARS = 50  # Minimum après nettoyage
+MIN_ALPHA_RATIO = 0.3  # Part de lettres sous laquelle une ligne est un artefact
+MIN_PRINTABLE_RATIO = 0.8
+
+# Formules LaTeX : display math avant inline, sinon `$$x$$` devient [MATH]x[MATH]
+MATH_RE = re.compile(r"\$\$([^$]*)\$\$|\$[^$]*\$")
+IMAGE_RE = re.compile(r"<image[^>]*>|\[image[^\]]*\]", re.IGNORECASE)
+CAPTION_RE = re.compile(r"(?:Figure|Table) \d+[^\n]*\n")
+LATEX_RE = re.compile(r"\\[a-zA-Z]+(?:\{[^}]*\})?")
+# Caractères de contrôle, hors ceux que `\s` traite comme des espaces (normalisés ensuite)
+CONTROL_RE = re.compile(r"[\x00-\x08\x0E-\x1B\x7F-\x84\x86-\x9F]+")
+_ASCII_CONTROLS = "".join(map(chr, [*range(0x09), *range(0x0E, 0x1C), 0x7F]))
+_C1_CONTROLS = frozenset(map(chr, [*range(0x80, 0x85), *range(0x86, 0xA0)]))
+# Espaces horizontaux (\s sauf \n) : seules les séquences à remplacer sont
+# visitées, pas chaque espace simple
+_HSPACE = "\t\r\x0b\x0c\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+HSPACE_RE = re.compile(f"[{_HSPACE}][ {_HSPACE}]*| [ {_HSPACE}]+")
+_ASCII_HSPACES = "\t\r\x0b\x0c\x1c\x1d\x1e\x1f"
+_UNICODE_SPACES = frozenset("\x85\xa0\u1680\u2028\u2029\u202f\u205f\u3000" + "".join(map(chr, range(0x2000, 0x200B))))
+_ASCII_BYTES = bytes(range(128))
+# Octets supprimés pour ne compter que les lettres : tout sauf les lettres ASCII,
+# les sauts de ligne et les octets de tête UTF-8 (un par caractère non ASCII)
+_NON_LETTER_BYTES = bytes(b for b in range(256) if not (chr(b).isalpha() and b < 128 or b == 10 or b >= 0xC0))
+
+# Documentation scrapée (scripts/clean_docs.py)
+DOC_ARTIFACTS_RE = re.compile(r"\s*¶\s*|\.<locals>\.")
+DOC_LABEL_RE = re.compile(r"(^|\n)\s*(module|class|method|property)\s*\n", re.IGNORECASE | re.MULTILINE)
+CONSOLE_PROMPT_RE = re.compile(r"^[^\S\n]*>>>.*(?:\n|$)", re.MULTILINE)
+PARAGRAPH_BREAK_RE = re.compile(r"\n\n+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _math_placeholder(match):
+    return "[EQUATION]" if match.group(1) is not None else "[MATH]"
+
+
+def non_ascii_chars(text):
+    """
+    Les caractères non ASCII de `text`, dans l'ordre. Les octets ASCII sont
+    supprimés de l'encodage UTF-8 en une passe `bytes.translate` : le reste est
+    en général une petite fraction du texte.
+    """
+    if text.isascii():
+        return ""
+    data = text.encode("utf-8", "surrogatepass").translate(None, _ASCII_BYTES)
+    return data.decode("utf-8", "surrogatepass")
+
+
+def letter_counts(text):
+    """
+    Nombre de lettres (au sens de `str.isalpha`) de chaque ligne de `text`, en
+    quelques passes C sur l'encodage UTF-8 : les caractères non ASCII qui ne sont
+    pas des lettres sont d'abord remplacés, puis tous les octets qui ne comptent
+    pas sont supprimés par `bytes.translate`.
+    """
+    data = text.encode("utf-8", "surrogatepass")
+    for char in set(non_ascii_chars(text)):
+        if not char.isalpha():
+            data = data.replace(char.encode("utf-8", "surrogatepass"), b"\x00")
+    return [len(letters) for letters in data.translate(None, _NON_LETTER_BYTES).split(b"\n")]
+
+
+def alpha_ratio(line):
+    """Part de lettres dans `line` (équivalent de `c.isalpha()` caractère par caractère)."""
+    return letter_counts(line)[0] / len(line)
+
+
+def filter_lines(text, min_ratio=MIN_ALPHA_RATIO):
+    """
+    Garde les lignes courtes (5 caractères ou moins) et celles dont la part de
+    lettres dépasse `min_ratio`.
+    """
+    lines = [line.strip() for line in text.split("\n")]
+    return "\n".join([
+        line for line, letters in zip(lines, letter_counts(text))
+        if line and (len(line) <= 5 or letters > min_ratio * len(line))
+    ])
+
+
+def printable_ratio(text, non_ascii=None):
+    """
+    Part de caractères imprimables ou d'espaces dans `text`. Tout l'ASCII restant
+    après nettoyage l'est : seuls les caractères non ASCII distincts sont examinés.
+    """
+    non_ascii = non_ascii_chars(text) if non_ascii is None else non_ascii
+    bad = sum(non_ascii.count(c) for c in set(non_ascii) if not (c.isprintable() or c.isspace()))
+    return 1 - bad / len(text)
+
+
+def _is_invalid(char):
+    return char in "\uFFFE\uFFFF" or "\uD800" <= char <= "\uDFFF"
+
+
+def clean_extracted_text(text):
+    """
+    Nettoie le texte extrait d'un document (artefacts PDF, LaTeX, caractères de
+    contrôle, lignes qui ne sont pas du texte).
+    Retourne (texte nettoyé, None), ou (None, raison) si le document doit être ignoré.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return None, "empty document"
+    text = text.strip()
+    if "\x00" in text:
+        return None, "null bytes"
+    if len(text) < MIN_CHARS:
+        return None, "too short"
+    text = text[:MAX_CHARS]
+
+    # Chaque passe n'est lancée que si son motif peut apparaître : un test `in`
+    # (memchr) parcourt le texte bien plus vite qu'une regex qui ne trouve rien
+    if "mage" in text or "MAGE" in text:
+        text = IMAGE_RE.sub("", text)
+    if "Figure " in text or "Table " in text:
+        text = CAPTION_RE.sub("", text)
+    if "$" in text:
+        text = MATH_RE.sub(_math_placeholder, text)
+    if "\\" in text:
+        text = LATEX_RE.sub("", text)
+    special = set(non_ascii_chars(text))
+    if not special.isdisjoint(_C1_CONTROLS) or any(c in text for c in _ASCII_CONTROLS):
+        text = CONTROL_RE.sub("", text)
+    if "  " in text or not special.isdisjoint(_UNICODE_SPACES) or any(c in text for c in _ASCII_HSPACES):
+        text = HSPACE_RE.sub(" ", text)
+
+    text = filter_lines(text)
+
+    if len(text) < MIN_CLEAN_CHARS:
+        return None, "too short after cleaning"
+    non_ascii = non_ascii_chars(text)
+    if not non_ascii:
+        return text, None
+    if printable_ratio(text, non_ascii) < MIN_PRINTABLE_RATIO:
+        return None, "too many non-printable characters"
+    if any(map(_is_invalid, set(non_ascii))):
+        return None, "invalid unicode characters"
+    return text, None
+
+
+def clean_scraped_text(content):
+    """
+    Nettoie une page de documentation scrapée : marqueurs `¶`, libellés isolés
+    (module, class, method, property), `.<locals>.`, invites `>>>`, puis chaque
+    paragraphe est remis sur une seule ligne.
+    """
+    content = content.replace("\r\n", "\n").replace("\r", "\n")
+    content = DOC_ARTIFACTS_RE.sub("", content)
+    content = DOC_LABEL_RE.sub("\n", content)
+    content = CONSOLE_PROMPT_RE.sub("", content)
+
+    blocks = (WHITESPACE_RE.sub(" ", block).strip() for block in PARAGRAPH_BREAK_RE.split(content))
+    return "\n\n".join(block for block in blocks if block).strip()
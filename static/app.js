@@ -3,6 +3,7 @@ class RAGAssistant {
         this.currentKnowledgeBase = null;
         this.knowledgeBases = [];
         this.chatHistories = {}; // Separate history for each knowledge base
+        this.sessionId = this.getSessionId(); // Server-side history of this tab
         this.isLoading = false;
         
         this.initializeElements();
@@ -11,6 +12,15 @@ class RAGAssistant {
         this.loadKnowledgeBases();
     }
 
+    getSessionId() {
+        let sessionId = sessionStorage.getItem('rag-session-id');
+        if (!sessionId) {
+            sessionId = crypto.randomUUID();
+            sessionStorage.setItem('rag-session-id', sessionId);
+        }
+        return sessionId;
+    }
+
     initializeElements() {
         // Mode selector
         this.modeSelector = document.getElementById('mode-selector');
@@ -80,16 +90,8 @@ class RAGAssistant {
         try {
             this.showLoadingOverlay('Chargement des bases de connaissances...');
             
-            const response = await fetch('/knowledge-bases');
-            const data = await response.json();
-            this.knowledgeBases = data.knowledge_bases;
-            this.renderKnowledgeBaseSelector();
-            
-            // Select the first available knowledge base
-            const availableKB = this.knowledgeBases.find(kb => kb.available);
-            if (availableKB) {
-                this.switchKnowledgeBase(availableKB.id);
-            }
+            // Also selects the first available knowledge base
+            await this.refreshKnowledgeBases();
             
             this.hideLoadingOverlay();
         } catch (error) {
@@ -99,9 +101,29 @@ class RAGAssistant {
         }
     }
 
+    async refreshKnowledgeBases() {
+        const response = await fetch('/knowledge-bases');
+        const data = await response.json();
+        this.knowledgeBases = data.knowledge_bases;
+        this.renderKnowledgeBaseSelector();
+
+        // Indices build in the background: poll until they are ready
+        clearTimeout(this.refreshTimer);
+        if (this.knowledgeBases.some(kb => kb.status === 'building')) {
+            this.refreshTimer = setTimeout(() => this.refreshKnowledgeBases().catch(console.error), 5000);
+        }
+        // Select the first available knowledge base
+        if (!this.currentKnowledgeBase) {
+            const availableKB = this.knowledgeBases.find(kb => kb.available);
+            if (availableKB) {
+                this.switchKnowledgeBase(availableKB.id);
+            }
+        }
+    }
+
     renderKnowledgeBaseSelector() {
         this.modeSelector.innerHTML = this.knowledgeBases.map(kb => {
-            const statusIcon = kb.available ? '' : ' ❌';
+            const statusIcon = kb.available ? '' : (kb.status === 'building' ? ' ⏳' : ' ❌');
             const disabled = kb.available ? '' : 'disabled';
             return `
                 <button 
@@ -115,6 +137,12 @@ class RAGAssistant {
             `;
         }).join('');
 
+        if (this.currentKnowledgeBase) {
+            this.modeSelector.querySelectorAll('.mode-btn').forEach(btn => {
+                btn.classList.toggle('active', btn.getAttribute('data-kb-id') === this.currentKnowledgeBase.id);
+            });
+        }
+
         // Add event listeners to knowledge base buttons
         this.modeSelector.querySelectorAll('.mode-btn:not([disabled])').forEach(btn => {
             btn.addEventListener('click', () => {
@@ -323,10 +351,24 @@ class RAGAssistant {
                 }
                 response = await this.reviewCode(code, question, imagesToSend);
             } else {
-                // Show loading overlay for database operations
+                // Show loading overlay until the first token arrives
                 this.showLoadingOverlay(`Interrogation de ${this.currentKnowledgeBase.name}...`);
-                response = await this.queryKnowledgeBase(this.currentKnowledgeBase.id, question, imagesToSend);
-                this.hideLoadingOverlay();
+                const streamingMessage = this.createStreamingMessage();
+                try {
+                    response = await this.queryKnowledgeBase(
+                        this.currentKnowledgeBase.id,
+                        question,
+                        imagesToSend,
+                        (text) => {
+                            this.hideLoadingOverlay();
+                            this.updateStreamingMessage(streamingMessage, text);
+                        }
+                    );
+                } finally {
+                    // The final message is rendered (and stored) by addMessage below
+                    streamingMessage.remove();
+                    this.hideLoadingOverlay();
+                }
             }
 
             // Add assistant response
@@ -347,9 +389,11 @@ class RAGAssistant {
         }
     }
 
-    async queryKnowledgeBase(kbId, question, images = []) {
+    async queryKnowledgeBase(kbId, question, images = [], onToken = null) {
         const formData = new FormData();
         formData.append('question', question || '');
+        formData.append('stream', 'true');
+        formData.append('session_id', this.sessionId);
         
         images.forEach((image, index) => {
             formData.append(`image_${index}`, image.file);
@@ -365,13 +409,65 @@ class RAGAssistant {
             throw new Error(error.detail || 'Erreur lors de la requête');
         }
 
-        return await response.json();
+        // Read the Server-Sent Events stream and render tokens as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let result = {};
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const event of events) {
+                if (!event.startsWith('data: ')) continue;
+                const payload = JSON.parse(event.slice(6));
+                if (payload.error) {
+                    throw new Error(payload.error);
+                }
+                if (payload.done) {
+                    result = payload;
+                } else if (payload.delta) {
+                    text += payload.delta;
+                    if (onToken) onToken(text);
+                }
+            }
+        }
+
+        return { ...result, response: text };
+    }
+
+    createStreamingMessage() {
+        const messageEl = document.createElement('div');
+        messageEl.className = 'message assistant';
+        const contentEl = document.createElement('div');
+        contentEl.className = 'message-content';
+        messageEl.appendChild(contentEl);
+        this.chatMessages.appendChild(messageEl);
+        return messageEl;
+    }
+
+    updateStreamingMessage(messageEl, text) {
+        // Re-render at most once per animation frame
+        messageEl._pendingText = text;
+        if (messageEl._renderScheduled) return;
+        messageEl._renderScheduled = true;
+        requestAnimationFrame(() => {
+            messageEl._renderScheduled = false;
+            messageEl.firstChild.innerHTML = this.formatMessage(messageEl._pendingText);
+            this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
+        });
     }
 
     async reviewCode(code, question, images = []) {
         const formData = new FormData();
         formData.append('code', code);
         formData.append('question', question || '');
+        formData.append('session_id', this.sessionId);
         
         images.forEach((image, index) => {
             formData.append(`image_${index}`, image.file);
@@ -587,14 +683,12 @@ class RAGAssistant {
         this.updateImagePreview();
         
         // Clear server-side history for this knowledge base
-        if (this.currentKnowledgeBase.type !== 'code_review') {
-            try {
-                await fetch(`/clear-history/${kbId}`, {
-                    method: 'POST'
-                });
-            } catch (error) {
-                console.error('Failed to clear server history:', error);
-            }
+        try {
+            await fetch(`/clear-history/${kbId}?session_id=${encodeURIComponent(this.sessionId)}`, {
+                method: 'POST'
+            });
+        } catch (error) {
+            console.error('Failed to clear server history:', error);
         }
         
         // Add welcome message
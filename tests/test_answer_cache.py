@@ -0,0 +1,74 @@
+import time
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.answer_cache import SemanticAnswerCache
+
+
+def test_similar_question_hits_and_other_scope_misses():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("vectorbt", "v1", "how to compute SMA", [1.0, 0.0, 0.1], "Use vbt.MA.run")
+
+    assert cache.lookup("vectorbt", "v1", [1.0, 0.05, 0.1]) == "Use vbt.MA.run"
+    assert cache.lookup("vectorbt", "v1", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("trading_papers", "v1", [1.0, 0.0, 0.1]) is None
+    assert cache.lookup("vectorbt", "v2", [1.0, 0.0, 0.1]) is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 3
+
+
+def test_entries_expire_after_ttl():
+    cache = SemanticAnswerCache(ttl=0.05)
+    cache.store("vectorbt", "v1", "q", [1.0, 0.0], "answer")
+    time.sleep(0.1)
+
+    assert cache.lookup("vectorbt", "v1", [1.0, 0.0]) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store("vectorbt", "v1", "a", [1.0, 0.0, 0.0], "A")
+    cache.store("vectorbt", "v1", "b", [0.0, 1.0, 0.0], "B")
+    cache.lookup("vectorbt", "v1", [1.0, 0.0, 0.0])  # "a" becomes most recent
+    cache.store("vectorbt", "v1", "c", [0.0, 0.0, 1.0], "C")
+
+    assert cache.lookup("vectorbt", "v1", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("vectorbt", "v1", [1.0, 0.0, 0.0]) == "A"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    SemanticAnswerCache(path=path).store("vectorbt", "v1", "q", [0.6, 0.8], "persisted")
+
+    assert SemanticAnswerCache(path=path).lookup("vectorbt", "v1", [0.6, 0.8]) == "persisted"
+
+
+def test_workers_sharing_the_file_do_not_collide(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    first, second = SemanticAnswerCache(path=path, max_entries=2), SemanticAnswerCache(path=path, max_entries=2)
+    first.store("vectorbt", "v1", "a", [1.0, 0.0, 0.0], "A")
+    second.store("vectorbt", "v1", "b", [0.0, 1.0, 0.0], "B")
+    first.store("vectorbt", "v1", "c", [0.0, 0.0, 1.0], "C")
+
+    # Pas de collision d'ids ; la table garde les entrées les plus récentes de tous les workers
+    restarted = SemanticAnswerCache(path=path, max_entries=2)
+    assert restarted.lookup("vectorbt", "v1", [0.0, 1.0, 0.0]) == "B"
+    assert restarted.lookup("vectorbt", "v1", [0.0, 0.0, 1.0]) == "C"
+    assert restarted.lookup("vectorbt", "v1", [1.0, 0.0, 0.0]) is None
+
+
+def test_workers_see_each_other_stores_and_clears(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    first, second = SemanticAnswerCache(path=path), SemanticAnswerCache(path=path)
+
+    first.store("vectorbt", "v1", "a", [1.0, 0.0], "A")
+    assert second.lookup("vectorbt", "v1", [1.0, 0.0]) == "A"
+
+    second.clear("vectorbt")
+    assert first.lookup("vectorbt", "v1", [1.0, 0.0]) is None
+    assert first.get_stats()["entries"] == 0
@@ -0,0 +1,146 @@
+import json
+import pytest
+import chromadb
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts import build_index
+from scripts.build_index import BuildOptions, MANIFEST_FILE, build_knowledge_base, diff_manifest
+from src import model_registry
+from src.embedding_service import ServiceQueryEmbedding
+from src.sparse_index import BM25Index
+
+OPTIONS = BuildOptions(parse_workers=1, embed_batch_size=2, embed_workers=1, queue_size=1)
+
+
+def fake_embed_nodes(nodes, batch_size, embed_pool=None):
+    for node in nodes:
+        node.embedding = [float(len(node.get_content())), 1.0, 0.0, 0.0]
+
+
+def fake_node_parser():
+    return SentenceSplitter(chunk_size=48, chunk_overlap=0)
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    """Knowledge base of .txt files under tmp_path, built with a fake embedding model."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("docs")
+    monkeypatch.setattr(build_index, "get_embed_model", lambda: MockEmbedding(embed_dim=4))
+    monkeypatch.setattr(build_index, "get_node_parser", fake_node_parser)
+    monkeypatch.setattr(build_index, "embed_nodes", fake_embed_nodes)
+    monkeypatch.setitem(build_index.KNOWLEDGE_BASES, "test_kb", {
+        "name": "Test KB",
+        "chroma_path": "db",
+        "collection_name": "test_docs",
+        "sources": [{"path": "docs", "extensions": [".txt"], "description": "test docs"}],
+    })
+    return tmp_path
+
+
+def write_doc(name, topic, sentences=12):
+    with open(os.path.join("docs", name), "w", encoding="utf-8") as f:
+        f.write(" ".join(f"Sentence {i} explains how {topic} works in a backtest." for i in range(sentences)))
+
+
+def vector_count():
+    return chromadb.PersistentClient(path=os.path.abspath("db")).get_collection("test_docs").count()
+
+
+def manifest_files():
+    with open(os.path.join("db", MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def full_build_count():
+    """Vectors of a clean full build of the current files, for comparison."""
+    assert build_knowledge_base("test_kb", full=True, options=OPTIONS)
+    return vector_count()
+
+
+def test_manifest_diff():
+    previous = {"a.txt": {"hash": "1"}, "b.txt": {"hash": "2"}, "c.txt": {"hash": "3"}}
+    hashes = {"a.txt": "1", "b.txt": "changed", "d.txt": "4"}
+
+    assert diff_manifest(previous, hashes) == (["d.txt"], ["b.txt"], ["c.txt"])
+    assert diff_manifest(previous, {p: e["hash"] for p, e in previous.items()}) == ([], [], [])
+
+
+def test_update_applies_added_changed_and_deleted_files(kb):
+    write_doc("a.txt", "rolling windows")
+    write_doc("b.txt", "portfolio stats")
+    assert build_knowledge_base("test_kb", options=OPTIONS)
+
+    write_doc("a.txt", "signal generation")  # changed
+    os.remove(os.path.join("docs", "b.txt"))  # deleted
+    write_doc("c.txt", "parameter sweeps")  # added
+    assert build_knowledge_base("test_kb", options=OPTIONS)
+
+    files = manifest_files()
+    assert sorted(files) == [os.path.join("docs", "a.txt"), os.path.join("docs", "c.txt")]
+    sparse_ids = {node.node_id for node in BM25Index.load("db").get_nodes()}
+    assert sparse_ids == {node_id for entry in files.values() for node_id in entry["node_ids"]}
+    texts = " ".join(node.get_content() for node in BM25Index.load("db").get_nodes())
+    assert "portfolio stats" not in texts and "rolling windows" not in texts
+    assert vector_count() == len(sparse_ids) == full_build_count()
+
+
+def test_rerun_after_a_failed_update_does_not_duplicate_vectors(kb, monkeypatch):
+    write_doc("a.txt", "rolling windows")
+    assert build_knowledge_base("test_kb", options=OPTIONS)
+    write_doc("b.txt", "portfolio stats")
+    write_doc("c.txt", "parameter sweeps")
+
+    calls = []
+
+    def failing_embed_nodes(nodes, batch_size, embed_pool=None):
+        calls.append(len(nodes))
+        if len(calls) > 1:
+            raise RuntimeError("embedding crashed")
+        fake_embed_nodes(nodes, batch_size, embed_pool)
+
+    monkeypatch.setattr(build_index, "embed_nodes", failing_embed_nodes)
+    before = vector_count()
+    assert not build_knowledge_base("test_kb", options=OPTIONS)
+    assert vector_count() > before  # The first batch reached Chroma, the manifest was not saved
+
+    monkeypatch.setattr(build_index, "embed_nodes", fake_embed_nodes)
+    assert build_knowledge_base("test_kb", options=OPTIONS)
+    node_ids = {node_id for entry in manifest_files().values() for node_id in entry["node_ids"]}
+    assert vector_count() == len(node_ids) == full_build_count()
+
+
+def test_build_leaves_the_global_settings_alone(kb, monkeypatch):
+    query_embed_model = MockEmbedding(embed_dim=4)
+    node_parser = SentenceSplitter(chunk_size=256, chunk_overlap=0)
+    monkeypatch.setattr(Settings, "_embed_model", query_embed_model)
+    monkeypatch.setattr(Settings, "_node_parser", node_parser)
+    write_doc("a.txt", "rolling windows")
+
+    assert build_knowledge_base("test_kb", options=OPTIONS)
+
+    assert Settings.embed_model is query_embed_model
+    assert Settings.node_parser is node_parser
+
+
+def test_query_embeddings_still_go_through_the_service_after_a_build(kb, monkeypatch):
+    monkeypatch.setattr(model_registry, "_embed_model", MockEmbedding(embed_dim=4))
+    monkeypatch.setattr(model_registry, "_embedding_service", None)
+    monkeypatch.setattr(model_registry, "_query_embed_model", None)
+    monkeypatch.setattr(Settings, "_embed_model", None)
+    monkeypatch.setattr(Settings, "_node_parser", None)
+    model_registry.configure_settings()  # API lifespan
+    write_doc("a.txt", "rolling windows")
+
+    assert build_knowledge_base("test_kb", options=OPTIONS)  # BuildJobManager, same process
+
+    assert isinstance(Settings.embed_model, ServiceQueryEmbedding)
+    Settings.embed_model.get_query_embedding("How do rolling windows work?")
+    assert model_registry.get_embedding_stats()["requests"] == 1
@@ -0,0 +1,53 @@
+import time
+import threading
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.build_jobs import BuildJobManager, BuildStatus
+
+
+def wait_for(job, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while job.status in (BuildStatus.QUEUED, BuildStatus.BUILDING) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_build_runs_in_background_and_reports_progress():
+    release = threading.Event()
+    completed = []
+
+    def build(kb_id, progress):
+        progress(0.5, "Embedding")
+        release.wait(timeout=2)
+        return True
+
+    manager = BuildJobManager(build, on_complete=completed.append)
+    job = manager.submit("vectorbt")
+
+    # submit() returns immediately while the build is still running
+    time.sleep(0.05)
+    assert job.status == BuildStatus.BUILDING
+    assert job.progress == 0.5
+    assert manager.submit("vectorbt") is job
+
+    release.set()
+    assert wait_for(job).status == BuildStatus.READY
+    assert job.progress == 1.0
+    assert completed == [job]
+
+
+def test_failed_build_records_the_error():
+    def build(kb_id, progress):
+        raise RuntimeError("no documents")
+
+    manager = BuildJobManager(build)
+    job = wait_for(manager.submit("trading_papers"))
+
+    assert job.status == BuildStatus.FAILED
+    assert job.error == "no documents"
+    assert manager.latest_job("trading_papers") is job
+    assert manager.get(job.id) is job
@@ -0,0 +1,98 @@
+import textwrap
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llama_index.core import Document
+
+from src.code_chunker import PythonCodeSplitter, chunk_python_source, module_name
+
+SOURCE = textwrap.dedent('''
+    """Order helpers."""
+    import numpy as np
+
+    MAX_SIZE = 10
+
+
+    @njit(cache=True)
+    def buy_nb(size: float, price: float) -> float:
+        """Buy `size` shares at `price`."""
+        return size * price
+
+
+    class Portfolio(Wrapping):
+        """Simulated portfolio."""
+
+        fees = 0.0
+
+        def from_signals(cls, close, entries=None, exits=None):
+            """Build a portfolio from signals."""
+            return cls(close)
+''')
+
+
+def test_one_chunk_per_definition():
+    chunks = chunk_python_source(SOURCE, "vectorbt.portfolio.nb")
+
+    assert [(c.qualified_name, c.kind) for c in chunks] == [
+        ("vectorbt.portfolio.nb", "module"),
+        ("vectorbt.portfolio.nb.buy_nb", "function"),
+        ("vectorbt.portfolio.nb.Portfolio", "class"),
+    ]
+    buy = chunks[1]
+    assert buy.text.startswith("@njit(cache=True)\ndef buy_nb")
+    assert buy.signature == "def buy_nb(size: float, price: float) -> float"
+    assert buy.docstring == "Buy `size` shares at `price`."
+    assert (buy.start_line, buy.end_line) == (8, 11)
+    assert chunks[0].docstring == "Order helpers."
+
+
+def test_oversized_class_is_split_into_header_and_methods():
+    chunks = chunk_python_source(SOURCE, "m", max_chars=120)
+    names = [(c.qualified_name, c.kind) for c in chunks]
+
+    assert ("m.Portfolio", "class") in names
+    assert ("m.Portfolio.from_signals", "method") in names
+    header = next(c for c in chunks if c.kind == "class")
+    assert "fees = 0.0" in header.text and "def from_signals" not in header.text
+
+
+def test_oversized_function_is_split_hierarchically():
+    body = "\n".join(f"        total += {i}" for i in range(60))
+    source = f"def run(n):\n    total = 0\n    for i in range(n):\n{body}\n    return total\n"
+    chunks = chunk_python_source(source, "m", max_chars=300)
+
+    assert len(chunks) > 1
+    assert all(len(c.text) <= 300 + 40 for c in chunks)
+    assert all(c.qualified_name == "m.run" and c.parts == len(chunks) for c in chunks)
+    assert chunks[1].text.startswith("# m.run (part 2/")
+    covered = set()
+    for c in chunks:
+        covered.update(range(c.start_line, c.end_line + 1))
+    assert covered == set(range(1, source.count("\n") + 1))
+
+
+def test_module_name_follows_packages(tmp_path):
+    package = tmp_path / "vectorbt" / "portfolio"
+    package.mkdir(parents=True)
+    (tmp_path / "vectorbt" / "__init__.py").write_text("")
+    (package / "__init__.py").write_text("")
+
+    assert module_name(str(package / "nb.py")) == "vectorbt.portfolio.nb"
+    assert module_name(str(package / "__init__.py")) == "vectorbt.portfolio"
+
+
+def test_splitter_uses_ast_for_python_and_sentences_otherwise():
+    splitter = PythonCodeSplitter(chunk_size=512, chunk_overlap=50)
+    code = Document(text=SOURCE, metadata={"file_path": "nb.py"})
+    text = Document(text="Plain documentation. " * 10, metadata={"file_path": "docs.txt"})
+
+    nodes = splitter.get_nodes_from_documents([code, text])
+
+    code_nodes = [n for n in nodes if n.metadata["file_path"] == "nb.py"]
+    assert [n.metadata["qualified_name"] for n in code_nodes] == ["nb", "nb.buy_nb", "nb.Portfolio"]
+    assert all(n.ref_doc_id == code.doc_id for n in code_nodes)
+    assert "start_line" in code_nodes[1].excluded_embed_metadata_keys
+    assert [n for n in nodes if n.metadata["file_path"] == "docs.txt"]
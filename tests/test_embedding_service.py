@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.embedding_service import EmbeddingService
+
+
+class FakeEmbedModel:
+    """Records the size of every forward pass."""
+
+    def __init__(self):
+        self.batches = []
+
+    def _embed(self, texts, prompt_name=None):
+        self.batches.append(len(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_concurrent_questions_share_one_forward_pass():
+    model = FakeEmbedModel()
+    service = EmbeddingService(model, window_ms=200)
+    questions = [f"question {i}" for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        embeddings = list(executor.map(service.embed, questions))
+
+    assert embeddings[0] == [10.0, 1.0]
+    assert model.batches == [8]
+    assert service.stats["batches"] == 1
+
+
+def test_repeated_question_is_served_from_cache():
+    model = FakeEmbedModel()
+    service = EmbeddingService(model, window_ms=1)
+
+    first = service.embed("how to compute SMA")
+    second = service.embed("how to compute SMA")
+
+    assert first == second
+    assert model.batches == [1]
+    assert service.stats["cache_hits"] == 1
+
+
+def test_cache_is_bounded():
+    service = EmbeddingService(FakeEmbedModel(), window_ms=1, cache_size=2)
+    for question in ["a", "b", "c"]:
+        service.embed(question)
+
+    assert list(service._cache) == ["b", "c"]
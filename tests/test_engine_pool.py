@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.engine_pool import ChatEnginePool
+from src.llm_manager import managed_chat_request
+
+
+class MockResponse:
+    def __init__(self, text):
+        self.response = text
+
+
+@pytest.fixture
+def llm_manager():
+    """A minimal LLM manager with two configurations."""
+    manager = MagicMock()
+    manager.configurations = [("key1", "model1"), ("key2", "model1")]
+    manager.current_config = manager.configurations[0]
+    manager.get_llm.side_effect = lambda: MagicMock()
+    return manager
+
+
+@pytest.fixture
+def pool():
+    with patch('src.engine_pool.os.getenv', return_value=None):
+        yield ChatEnginePool()
+
+
+def test_released_engine_is_reused_and_reset(pool, llm_manager):
+    index = MagicMock()
+
+    with pool.lease(index, "vectorbt", llm_manager) as first:
+        pass
+    with pool.lease(index, "vectorbt", llm_manager) as second:
+        pass
+
+    assert first is second
+    assert index.as_chat_engine.call_count == 1
+    assert first.reset.call_count == 2
+    assert pool.stats == {"built": 1, "reused": 1}
+
+
+def test_concurrent_leases_get_distinct_engines(pool, llm_manager):
+    index = MagicMock()
+    index.as_chat_engine.side_effect = lambda **kwargs: MagicMock()
+
+    with pool.lease(index, "vectorbt", llm_manager) as first:
+        with pool.lease(index, "vectorbt", llm_manager) as second:
+            assert first is not second
+
+
+def test_engines_are_keyed_by_kb_and_config(pool, llm_manager):
+    index = MagicMock()
+    index.as_chat_engine.side_effect = lambda **kwargs: MagicMock()
+
+    with pool.lease(index, "vectorbt", llm_manager) as first:
+        pass
+    llm_manager.current_config = llm_manager.configurations[1]
+    with pool.lease(index, "vectorbt", llm_manager) as other_config:
+        pass
+    with pool.lease(index, "trading_papers", llm_manager) as other_kb:
+        pass
+
+    assert len({id(first), id(other_config), id(other_kb)}) == 3
+    assert index.as_chat_engine.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_managed_chat_request_uses_pool_and_history(pool, llm_manager):
+    index = MagicMock()
+    engine = MagicMock()
+    engine.achat = AsyncMock(side_effect=[MockResponse("first"), MockResponse("second")])
+    index.as_chat_engine.return_value = engine
+    history = []
+
+    await managed_chat_request(index, "q1", llm_manager, engine_pool=pool, kb_id="vectorbt", conversation_history=history)
+    result = await managed_chat_request(index, "q2", llm_manager, engine_pool=pool, kb_id="vectorbt", conversation_history=history)
+
+    assert result["response"] == "second"
+    assert index.as_chat_engine.call_count == 1
+    assert history == [("q1", "first"), ("q2", "second")]
+    # The second request carries the first exchange as chat history; the message
+    # (what the engine retrieves on) is the question alone
+    second_call = engine.achat.call_args_list[1]
+    assert second_call.args[0] == "q2"
+    assert [m.content for m in second_call.kwargs["chat_history"]] == ["q1", "first"]
+    assert "chat_history" not in engine.achat.call_args_list[0].kwargs
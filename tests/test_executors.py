@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.executors import BoundedExecutor, ExecutorSaturated
+from src.resilience import classify_error, ErrorClass
+
+
+@pytest.fixture
+def executor():
+    executor = BoundedExecutor("test", ThreadPoolExecutor(max_workers=2), max_pending=2)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_returns_the_result_off_the_event_loop(executor):
+    caller = threading.get_ident()
+    result, thread = await executor.run(lambda x: (x * 2, threading.get_ident()), 21)
+
+    assert result == 42
+    assert thread != caller
+    assert executor.get_stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_rejects_new_tasks(executor):
+    release = threading.Event()
+    tasks = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(ExecutorSaturated):
+        await executor.run(release.wait)
+
+    release.set()
+    await asyncio.gather(*tasks)
+    stats = executor.get_stats()
+    assert stats["rejected"] == 1
+    assert stats["pending"] == 0
+    # De nouveau de la place une fois les tâches terminées
+    assert await executor.run(lambda: "ok") == "ok"
+
+
+@pytest.mark.asyncio
+async def test_failed_tasks_release_their_slot(executor):
+    def fail():
+        raise RuntimeError("boom")
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await executor.run(fail)
+    assert executor.get_stats()["pending"] == 0
+
+
+def test_saturation_is_not_retried_on_another_llm_configuration():
+    assert classify_error(ExecutorSaturated("io pool saturated (64 tasks pending)")) == ErrorClass.FATAL
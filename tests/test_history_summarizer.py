@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.history_summarizer import ConversationHistory, HistorySummarizer
+from src.prompt_packer import PromptPacker
+
+
+def words(text):
+    return text.split()
+
+
+def make_summarizer(response="summary of the early turns", **kwargs):
+    llm_manager = MagicMock()
+    llm_manager.get_llm.return_value.acomplete = AsyncMock(return_value=response)
+    summarizer = HistorySummarizer(llm_manager, packer=PromptPacker(tokenizer=words), **kwargs)
+    return summarizer, llm_manager
+
+
+def history_of(n):
+    return ConversationHistory((f"q{i}", f"answer {i}") for i in range(n))
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_folded_into_the_summary():
+    summarizer, llm_manager = make_summarizer(keep_turns=2, batch=2)
+    history = history_of(4)
+
+    assert await summarizer.summarize(history)
+
+    assert history == [("q2", "answer 2"), ("q3", "answer 3")]
+    assert history.summary == "summary of the early turns"
+    prompt = llm_manager.get_llm.return_value.acomplete.call_args[0][0]
+    assert "User: q0" in prompt and "User: q1" in prompt and "q2" not in prompt
+    llm_manager.report_result.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+async def test_short_histories_are_left_alone():
+    summarizer, llm_manager = make_summarizer(keep_turns=2, batch=2)
+    history = history_of(3)
+
+    assert summarizer.schedule(history) is None
+    assert not await summarizer.summarize(history)
+    llm_manager.get_llm.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_turns_added_while_summarizing_are_kept():
+    summarizer, llm_manager = make_summarizer(keep_turns=1, batch=2)
+    history = history_of(3)
+
+    async def slow_complete(prompt):
+        await asyncio.sleep(0)
+        history.append(("q3", "answer 3"))
+        return "summary"
+
+    llm_manager.get_llm.return_value.acomplete = slow_complete
+    await summarizer.schedule(history)
+
+    assert history == [("q2", "answer 2"), ("q3", "answer 3")]
+    assert history.summary == "summary"
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_still_bounds_the_history():
+    summarizer, llm_manager = make_summarizer(keep_turns=2, batch=2, max_turns=5)
+    llm_manager.get_llm.return_value.acomplete = AsyncMock(side_effect=RuntimeError("rate limited"))
+    history = history_of(8)
+
+    assert not await summarizer.summarize(history)
+
+    assert len(history) == 5 and history[0] == ("q3", "answer 3")
+    assert history.summary == ""
+    assert summarizer.stats["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cleared_history_ignores_a_pending_summary():
+    summarizer, llm_manager = make_summarizer(keep_turns=1, batch=1)
+    history = history_of(2)
+
+    async def complete_after_clear(prompt):
+        history.clear()
+        return "stale summary"
+
+    llm_manager.get_llm.return_value.acomplete = complete_after_clear
+
+    assert not await summarizer.summarize(history)
+    assert history == [] and history.summary == ""
+
+
+def test_packed_prompt_carries_the_summary_before_recent_turns():
+    history = ConversationHistory([("q9", "answer 9")], summary="user backtests an SMA crossover")
+
+    packed = PromptPacker(tokenizer=words, budget=100).pack("next question", history=history)
+
+    assert packed.summary == "user backtests an SMA crossover"
+    assert packed.history == [("q9", "answer 9")]
+    assert history.copy().summary == history.summary
@@ -0,0 +1,26 @@
+import pytest
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import http_clients
+
+
+def test_one_client_per_api_key():
+    first = http_clients.get_sync_client("key1")
+
+    assert http_clients.get_sync_client("key1") is first
+    assert http_clients.get_sync_client("key2") is not first
+    assert http_clients.get_async_client("key1") is http_clients.get_async_client("key1")
+
+
+@pytest.mark.asyncio
+async def test_closed_clients_are_recreated():
+    client = http_clients.get_async_client("key1")
+
+    await http_clients.aclose_all()
+
+    assert client.is_closed
+    assert http_clients.get_async_client("key1") is not client
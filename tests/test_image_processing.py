@@ -0,0 +1,69 @@
+import io
+import base64
+import pytest
+from PIL import Image
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.image_processing import ImageCache, ImageTooLarge, fit_pixel_budget, transcode_image
+
+
+def encode(width, height, format="JPEG", mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), color=128).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def decode(data_url):
+    header, data = data_url.split(",", 1)
+    assert header == "data:image/jpeg;base64"
+    return base64.b64decode(data)
+
+
+def test_pixel_budget_keeps_the_aspect_ratio():
+    assert fit_pixel_budget(800, 600, 1_000_000) == (800, 600)
+    width, height = fit_pixel_budget(4000, 3000, 1_000_000)
+    assert width * height <= 1_000_000
+    assert abs(width / height - 4 / 3) < 0.01
+
+
+def test_large_jpeg_is_reduced_to_the_pixel_budget():
+    image = Image.open(io.BytesIO(decode(transcode_image(encode(4000, 3000), pixel_budget=1_000_000))))
+
+    assert image.format == "JPEG"
+    assert image.width * image.height <= 1_000_000
+    assert image.width > 1000
+
+
+def test_small_jpeg_is_passed_through_unchanged():
+    data = encode(640, 480)
+    assert decode(transcode_image(data)) == data
+
+
+def test_png_screenshot_becomes_rgb_jpeg():
+    image = Image.open(io.BytesIO(decode(transcode_image(encode(300, 200, format="PNG", mode="RGBA")))))
+    assert image.mode == "RGB"
+    assert image.size == (300, 200)
+
+
+def test_oversized_image_is_rejected_before_decoding():
+    with pytest.raises(ImageTooLarge):
+        transcode_image(encode(2000, 2000, format="PNG"), max_input_pixels=1_000_000)
+
+
+def test_cache_is_keyed_by_content_and_bounded_in_bytes():
+    cache = ImageCache(max_bytes=25)
+    first, second = ImageCache.key(b"screenshot 1"), ImageCache.key(b"screenshot 2")
+    assert first == ImageCache.key(b"screenshot 1")
+    assert first != second
+
+    cache.put(first, "x" * 15)
+    assert cache.get(first) == "x" * 15
+    cache.put(second, "y" * 15)
+
+    assert cache.get(first) is None
+    assert cache.get(second) == "y" * 15
+    assert cache.get_stats() == {"hits": 2, "misses": 1, "entries": 1, "bytes": 15}
@@ -0,0 +1,136 @@
+import time
+import pytest
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.llm_dispatcher import CircuitsOpen, DispatcherSaturated, LLMDispatcher, TokenBucket
+from src.resilience import ErrorClass
+
+CONFIGS = [("key1", "model1"), ("key2", "model1"), ("key1", "model2"), ("key2", "model2")]
+
+
+def test_concurrent_requests_are_spread_across_keys():
+    dispatcher = LLMDispatcher(CONFIGS)
+
+    first = dispatcher.acquire()
+    second = dispatcher.acquire()
+
+    assert first[1] == second[1] == "model1"
+    assert {first[0], second[0]} == {"key1", "key2"}
+
+
+def test_rate_limited_key_cools_down():
+    dispatcher = LLMDispatcher(CONFIGS, rate_limit_cooldown=30)
+
+    config = dispatcher.acquire()
+    dispatcher.release(config, error_class=ErrorClass.RATE_LIMIT)
+
+    for _ in range(3):
+        other = dispatcher.acquire()
+        assert other[0] != config[0]
+        dispatcher.release(other, latency=0.1)
+    assert dispatcher.keys[config[0]].rate_limits == 1
+
+
+def test_retry_after_overrides_default_cooldown():
+    dispatcher = LLMDispatcher(CONFIGS, rate_limit_cooldown=30)
+
+    config = dispatcher.acquire()
+    dispatcher.release(config, error_class=ErrorClass.RATE_LIMIT, retry_after=2)
+
+    remaining = dispatcher.keys[config[0]].cooldown_until - time.monotonic()
+    assert 0 < remaining <= 2
+
+
+def test_model_error_falls_back_to_next_model():
+    dispatcher = LLMDispatcher([("key1", "model1"), ("key1", "model2")])
+
+    config = dispatcher.acquire()
+    dispatcher.release(config, error_class=ErrorClass.MODEL)
+
+    assert dispatcher.acquire() == ("key1", "model2")
+
+
+def test_exhausted_bucket_raises_with_the_wait_until_a_token():
+    dispatcher = LLMDispatcher([("key1", "model1")], requests_per_minute=1, burst=1)
+
+    assert dispatcher.try_acquire() == ("key1", "model1")
+    assert dispatcher.try_acquire() is None
+    with pytest.raises(DispatcherSaturated) as error:
+        dispatcher.acquire()
+    assert error.value.retry_after == pytest.approx(60, abs=1)
+    assert dispatcher.keys["key1"].inflight == 1
+
+
+def test_saturated_config_is_available_after_the_reported_wait():
+    dispatcher = LLMDispatcher([("key1", "model1")], requests_per_minute=600, burst=1)
+
+    dispatcher.acquire()
+    with pytest.raises(DispatcherSaturated) as error:
+        dispatcher.acquire()
+    time.sleep(error.value.retry_after)
+    assert dispatcher.acquire() == ("key1", "model1")
+
+
+def test_excluding_every_config_starts_over():
+    dispatcher = LLMDispatcher(CONFIGS)
+
+    assert dispatcher.acquire(exclude=set(CONFIGS)) in CONFIGS
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+
+    bucket.take(now)
+    assert not bucket.available(now)
+    assert bucket.time_until_token(now) == pytest.approx(0.5)
+    assert bucket.available(now + 0.5)
+
+
+def test_release_updates_inflight_and_latency():
+    dispatcher = LLMDispatcher(CONFIGS)
+
+    config = dispatcher.acquire()
+    assert dispatcher.configs[config].inflight == 1
+    dispatcher.release(config, latency=1.5)
+
+    assert dispatcher.configs[config].inflight == 0
+    assert dispatcher.configs[config].latency_ewma == 1.5
+
+
+def test_open_breaker_stops_traffic_to_model():
+    dispatcher = LLMDispatcher(CONFIGS, breaker_failures=2, breaker_cooldown=30)
+
+    for _ in range(2):
+        config = dispatcher.acquire(exclude={("key1", "model2"), ("key2", "model2")})
+        dispatcher.release(config, error_class=ErrorClass.TRANSIENT)
+
+    assert dispatcher.breakers["model1"].state == "open"
+    assert dispatcher.acquire()[1] == "model2"
+    assert dispatcher.snapshot()["breakers"]["model1"]["times_opened"] == 1
+
+
+def test_open_breakers_fail_fast_instead_of_taking_traffic():
+    dispatcher = LLMDispatcher([("key1", "model1"), ("key2", "model1")], breaker_failures=1, breaker_cooldown=30)
+
+    dispatcher.release(dispatcher.acquire(), error_class=ErrorClass.TRANSIENT)
+
+    with pytest.raises(CircuitsOpen) as error:
+        dispatcher.acquire()
+    assert 29 < error.value.retry_after <= 30
+    assert all(state.inflight == 0 for state in dispatcher.keys.values())
+
+
+def test_saturated_keys_are_waited_on_but_open_models_are_skipped():
+    dispatcher = LLMDispatcher([("key1", "model1"), ("key1", "model2")], breaker_failures=1, rate_limit_cooldown=5)
+
+    dispatcher.release(dispatcher.acquire(), error_class=ErrorClass.TRANSIENT)  # model1 open
+    dispatcher.release(dispatcher.acquire(), error_class=ErrorClass.RATE_LIMIT)  # key1 cooling down
+
+    with pytest.raises(DispatcherSaturated) as error:
+        dispatcher.acquire()
+    assert 4 < error.value.retry_after <= 5
@@ -0,0 +1,77 @@
+import textwrap
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.prompt_packer import PromptPacker
+
+# Un mot = un token : les budgets des tests se comptent à la main
+def words(text):
+    return text.split()
+
+
+def packer(**kwargs):
+    return PromptPacker(tokenizer=words, **kwargs)
+
+
+def test_context_fills_budget_by_rank():
+    chunks = [" ".join([name] * 40) for name in ("alpha", "beta", "gamma")]
+
+    packed = packer(budget=100, history_tokens=20).pack("what is beta", "be concise", chunks)
+
+    assert packed.context == chunks[:2]
+    assert packed.dropped_context == 1
+    assert packed.tokens == 5 + 80
+
+
+def test_overlapping_chunks_are_deduplicated():
+    text = " ".join(f"w{i}" for i in range(60))
+    overlapping = " ".join(f"w{i}" for i in range(5, 60))
+    other = " ".join(f"x{i}" for i in range(30))
+
+    assert packer().dedupe([text, overlapping, other, text]) == [text, other]
+
+
+def test_history_keeps_recent_turns_with_truncated_answers():
+    history = [(f"q{i}", " ".join(["answer"] * 100)) for i in range(10)]
+    context = [" ".join(["ctx"] * 500)]
+
+    packed = packer(budget=1000, history_tokens=65, answer_tokens=20).pack("question", "", context, history)
+
+    # La part réservée à l'historique n'est pas consommée par le contexte
+    assert packed.context == context
+    assert [q for q, _ in packed.history] == ["q7", "q8", "q9"]
+    assert all(len(a.split()) <= 20 and a.endswith("[...]") for _, a in packed.history)
+    assert packed.dropped_turns == 7
+    assert packed.tokens <= 1000
+
+
+def test_truncate_fits_the_token_limit():
+    text = " ".join(f"word{i}" for i in range(200))
+
+    assert len(packer().truncate(text, 50).split()) <= 50
+    assert packer().truncate("short text", 50) == "short text"
+
+
+def test_pasted_code_is_whole_when_it_fits_and_filtered_otherwise():
+    code = textwrap.dedent('''
+        import numpy as np
+
+
+        def sharpe_ratio(returns):
+            return returns.mean() / returns.std()
+
+
+        def max_drawdown(prices):
+            peak = np.maximum.accumulate(prices)
+            return ((prices - peak) / peak).min()
+    ''')
+
+    packed = packer(budget=1000).pack_code("Is sharpe_ratio correct?", code)
+    assert "".join(packed.context) == code
+
+    packed = packer(budget=10, history_tokens=0).pack_code("Is sharpe_ratio correct?", code)
+    assert len(packed.context) == 1 and "def sharpe_ratio" in packed.context[0]
+    assert packed.dropped_context == 2
@@ -1,4 +1,5 @@
 
+import time
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from openai import RateLimitError
@@ -8,6 +9,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from src.llm_dispatcher import DispatcherSaturated
 from src.llm_manager import LLMManager, managed_chat_request
 
 # Mock response object that the chat engine would return
@@ -78,3 +80,89 @@ async def test_managed_chat_request_handles_rate_limit_and_succeeds(mock_llm_man
         assert 'llm' in second_call_kwargs
         # Ensure the LLM instance was different between the two calls
         assert first_call_kwargs['llm'] is not second_call_kwargs['llm']
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged_on_another_config(mock_llm_manager):
+    """A slow first attempt is doubled on a second config; the first answer wins."""
+    import asyncio
+    from contextlib import contextmanager
+
+    mock_llm_manager.hedge_delay = 0.05
+    history = []
+
+    class Engine:
+        def __init__(self, config):
+            self.config = config
+
+        async def achat(self, question):
+            if self.config == mock_llm_manager.configurations[0]:
+                await asyncio.sleep(5)
+            return MockResponse(f"answer from {self.config[0]}")
+
+    class Pool:
+        @contextmanager
+        def lease(self, index, kb_id, llm_manager):
+            yield Engine(llm_manager.current_config)
+
+    result = await managed_chat_request(
+        MagicMock(), "test question", mock_llm_manager,
+        engine_pool=Pool(), kb_id="vectorbt", conversation_history=history
+    )
+
+    assert result["response"] == f"answer from {mock_llm_manager.configurations[1][0]}"
+    assert history == [("test question", result["response"])]
+    assert all(state.inflight == 0 for state in mock_llm_manager.dispatcher.configs.values())
+
+
+@pytest.mark.asyncio
+async def test_fatal_error_is_not_retried(mock_llm_manager):
+    """A request that would fail on every config is raised at once."""
+    mock_index = MagicMock()
+    mock_chat_engine = MagicMock()
+    mock_chat_engine.achat = AsyncMock(side_effect=Exception("This model's maximum context length is 8192 tokens"))
+    mock_index.as_chat_engine.return_value = mock_chat_engine
+
+    with pytest.raises(Exception, match="maximum context length"):
+        await managed_chat_request(mock_index, "test question", mock_llm_manager)
+
+    assert mock_index.as_chat_engine.call_count == 1
+
+@pytest.mark.asyncio
+async def test_images_are_only_sent_to_vision_models(mock_llm_manager):
+    """Images go to the chat engine only when the model of the attempt accepts them."""
+    class ImageChat:
+        def __init__(self):
+            self.images = []
+
+        async def achat(self, question, images=None):
+            self.images.append(images)
+            return MockResponse("ok")
+
+    chat = ImageChat()
+    images = ["data:image/jpeg;base64,AAAA"]
+    await managed_chat_request(chat, "What is on this chart?", mock_llm_manager, images=images)
+    mock_llm_manager.vision_models = ["model1", "model2"]
+    await managed_chat_request(chat, "What is on this chart?", mock_llm_manager, images=images)
+
+    assert chat.images == [None, images]
+
+
+@pytest.mark.asyncio
+async def test_saturated_configs_are_awaited_up_to_max_wait(mock_llm_manager):
+    """With every key out of tokens, the request waits for a refill, or fails fast past max_wait."""
+    mock_index = MagicMock()
+    mock_index.as_chat_engine.return_value.achat = AsyncMock(return_value=MockResponse("ok"))
+    for key_state in mock_llm_manager.dispatcher.keys.values():
+        key_state.bucket.tokens = 0.0
+        key_state.bucket.rate = 20.0  # one token every 50 ms
+        key_state.bucket.updated = time.monotonic()
+
+    result = await managed_chat_request(mock_index, "test question", mock_llm_manager)
+    assert result["response"] == "ok"
+
+    for key_state in mock_llm_manager.dispatcher.keys.values():
+        key_state.cooldown_until = float("inf")
+    with pytest.raises(DispatcherSaturated):
+        await managed_chat_request(mock_index, "test question", mock_llm_manager)
+    assert mock_index.as_chat_engine.call_count == 1
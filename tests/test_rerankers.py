@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from src.engine_pool import ChatEnginePool
+from src.knowledge_bases import KnowledgeBaseManager
+from src.rerankers import CrossEncoderRerank, build_reranker
+
+
+def make_nodes(texts):
+    return [NodeWithScore(node=TextNode(text=text), score=0.0) for text in texts]
+
+
+def test_cross_encoder_scores_all_pairs_in_one_batch():
+    model = MagicMock()
+    model.predict.return_value = [0.1, 0.9, 0.5]
+    reranker = CrossEncoderRerank(model, top_n=2)
+
+    ranked = reranker.postprocess_nodes(make_nodes(["a", "b", "c"]), query_bundle=QueryBundle("question"))
+
+    assert [node.node.text for node in ranked] == ["b", "c"]
+    assert model.predict.call_count == 1
+    pairs = model.predict.call_args.args[0]
+    assert len(pairs) == 3 and pairs[0][0] == "question"
+    assert model.predict.call_args.kwargs["batch_size"] == 3
+
+
+def test_build_reranker_kinds():
+    assert build_reranker("none") is None
+    with patch('src.rerankers.os.getenv', return_value=None):
+        assert build_reranker("cohere") is None
+    with pytest.raises(ValueError):
+        build_reranker("unknown")
+
+
+def test_pool_uses_reranker_of_knowledge_base():
+    kb_manager = KnowledgeBaseManager()
+    kb_manager.get_knowledge_base("vectorbt").reranker = "none"
+    pool = ChatEnginePool(kb_manager=kb_manager)
+
+    assert pool.get_reranker_kind("vectorbt") == "none"
+    assert pool.get_postprocessors("vectorbt") == []
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import MagicMock
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.resilience import CircuitBreaker, ErrorClass, RETRY_POLICIES, classify_error, get_retry_after, retry_delay
+
+
+class FakeAPIError(Exception):
+    def __init__(self, message, status_code=None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = MagicMock(headers=headers) if headers is not None else MagicMock()
+
+
+@pytest.mark.parametrize("error, expected", [
+    ("Rate limit exceeded", ErrorClass.RATE_LIMIT),
+    (FakeAPIError("slow down", status_code=429), ErrorClass.RATE_LIMIT),
+    ("Model not found", ErrorClass.MODEL),
+    ("502 Bad Gateway", ErrorClass.MODEL),
+    (FakeAPIError("No auth credentials found", status_code=401), ErrorClass.AUTH),
+    (FakeAPIError("This model's maximum context length is 8192 tokens", status_code=400), ErrorClass.FATAL),
+    (FakeAPIError("max_tokens must be <= 4290", status_code=400), ErrorClass.FATAL),
+    (FakeAPIError("prompt has 14290 tokens", status_code=400), ErrorClass.FATAL),
+    ("Request failed: 4290 tokens requested", ErrorClass.TRANSIENT),
+    ("429 error", ErrorClass.RATE_LIMIT),
+    (TimeoutError("Request timed out"), ErrorClass.TRANSIENT),
+    (Exception("something odd"), ErrorClass.TRANSIENT),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_retry_after_is_read_from_headers():
+    assert get_retry_after(FakeAPIError("429", headers={"retry-after": "7"})) == 7.0
+    assert get_retry_after(FakeAPIError("429", headers={"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})) is None
+    # MagicMock headers (no real response): ignored
+    assert get_retry_after(FakeAPIError("429")) is None
+
+
+def test_retry_delays_per_error_class():
+    assert retry_delay(ErrorClass.RATE_LIMIT, 0, alternate_available=True) == 0.0
+    assert 5.0 <= retry_delay(ErrorClass.RATE_LIMIT, 0, retry_after=5, alternate_available=False) <= 5.1
+    assert retry_delay(ErrorClass.MODEL, 3) == 0.0
+    for attempt in range(6):
+        assert 0.0 <= retry_delay(ErrorClass.TRANSIENT, attempt) <= RETRY_POLICIES[ErrorClass.TRANSIENT].max_delay
+    assert not RETRY_POLICIES[ErrorClass.FATAL].retry
+
+
+def test_circuit_breaker_opens_then_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10)
+
+    breaker.record_failure(now=0)
+    assert breaker.allows(now=0)
+    breaker.record_failure(now=1)
+    assert not breaker.allows(now=5)
+    assert breaker.time_until_allowed(now=5) == 6
+
+    # After the cooldown, a single probe request goes through
+    assert breaker.current_state(now=11) == CircuitBreaker.HALF_OPEN
+    breaker.on_dispatch(now=11)
+    assert not breaker.allows(now=11)
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allows(now=12)
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+
+    breaker.record_failure(now=0)
+    breaker.on_dispatch(now=10)
+    breaker.record_failure(now=10)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    assert not breaker.allows(now=15)
@@ -0,0 +1,71 @@
+import time
+import pytest
+from types import SimpleNamespace
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.retrieval import FanOutRetriever, reciprocal_rank_fusion
+
+
+def make_node(node_id):
+    """Minimal stand-in for a NodeWithScore."""
+    return SimpleNamespace(node=SimpleNamespace(node_id=node_id), text=node_id)
+
+
+class SlowRetriever:
+    def __init__(self, node_ids, delay):
+        self.nodes = [make_node(node_id) for node_id in node_ids]
+        self.delay = delay
+
+    def retrieve(self, question):
+        time.sleep(self.delay)
+        return self.nodes
+
+
+def test_rrf_rewards_results_found_by_several_sources():
+    fused = reciprocal_rank_fusion({
+        "VBT": [make_node("a"), make_node("shared")],
+        "PAPER": [make_node("shared"), make_node("b")],
+    })
+
+    assert [node.node.node_id for _, node, _ in fused][0] == "shared"
+    assert len(fused) == 3
+
+
+def test_rrf_interleaves_sources_and_respects_top_n():
+    fused = reciprocal_rank_fusion({
+        "VBT": [make_node("v1"), make_node("v2"), make_node("v3")],
+        "PAPER": [make_node("p1"), make_node("p2")],
+    }, top_n=4)
+
+    assert [source for source, _, _ in fused] == ["VBT", "PAPER", "VBT", "PAPER"]
+
+
+def test_sources_are_queried_in_parallel():
+    retriever = FanOutRetriever({
+        "VBT": SlowRetriever(["v1"], 0.3),
+        "PAPER": SlowRetriever(["p1"], 0.3),
+    })
+
+    start = time.monotonic()
+    results = retriever.retrieve("question")
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert set(results) == {"VBT", "PAPER"}
+
+
+@pytest.mark.asyncio
+async def test_slow_source_times_out_without_failing_the_others():
+    retriever = FanOutRetriever(
+        {"VBT": SlowRetriever(["v1"], 0.0), "PAPER": SlowRetriever(["p1"], 1.0)},
+        timeout={"VBT": 0.5, "PAPER": 0.1}
+    )
+
+    results = await retriever.aretrieve("question")
+
+    assert [node.node.node_id for node in results["VBT"]] == ["v1"]
+    assert results["PAPER"] == []
@@ -0,0 +1,71 @@
+import pytest
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.session_store import MemorySessionBackend, SQLiteSessionBackend, SessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"))
+    return MemorySessionBackend()
+
+
+def test_state_round_trip(backend):
+    store = SessionStore(backend)
+    state = {"turns": [["q", "a"]], "summary": "earlier"}
+    store.put("chat:vectorbt:s1", state)
+
+    assert store.get("chat:vectorbt:s1") == state
+    assert store.get("chat:vectorbt:s2") is None
+    assert store.get_stats()["hits"] == 1
+    assert store.get_stats()["misses"] == 1
+
+
+def test_idle_sessions_expire(backend):
+    store = SessionStore(backend, ttl=60)
+    store.put("old", {"turns": []})
+    # Inactive depuis plus longtemps que le TTL
+    if isinstance(backend, MemorySessionBackend):
+        payload, _, size = backend._items["old"]
+        backend._items["old"] = (payload, 0.0, size)
+    else:
+        backend._db.execute("UPDATE sessions SET last_used = 0")
+
+    assert store.get("old") is None
+    assert store.get_stats()["sessions"] == 0
+
+
+def test_least_recently_used_sessions_are_evicted_over_the_byte_cap(backend):
+    store = SessionStore(backend, max_bytes=130)
+    for i in range(3):
+        store.put(f"s{i}", {"text": "x" * 30})
+    store.get("s0")  # s1 devient la moins récemment utilisée
+    store.put("s3", {"text": "x" * 30})
+
+    assert store.get("s1") is None
+    assert store.get("s0") is not None
+    assert store.get("s3") is not None
+    stats = store.get_stats()
+    assert stats["bytes"] <= 130
+    assert stats["evictions"] == 1
+
+
+def test_replacing_a_session_updates_its_size(backend):
+    store = SessionStore(backend)
+    store.put("s", {"text": "x" * 100})
+    store.put("s", {"text": ""})
+
+    stats = store.get_stats()
+    assert stats["sessions"] == 1
+    assert stats["bytes"] == len('{"text": ""}')
+
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setenv("SESSION_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        SessionStore.from_env()
@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import MagicMock
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from src.llm_manager import EnhancedChatWrapper
+from src.prompt_packer import PromptPacker
+from src.sparse_index import BM25Index, BM25Retriever, HybridRetriever, tokenize
+
+DOCS = [
+    TextNode(id_="sma", text="Compute a simple moving average with vbt.MA.run(close, window=10)."),
+    TextNode(id_="split", text="rolling_split splits a time series into overlapping windows for walk-forward analysis."),
+    TextNode(id_="order", text="Portfolio.from_order_func simulates a portfolio with a custom order function."),
+    TextNode(id_="signal", text="simulate_from_signal_func_nb is the Numba core of Portfolio.from_signals."),
+]
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    terms = tokenize("How to use Portfolio.from_order_func?")
+
+    assert "portfolio.from_order_func" in terms
+    assert "from_order_func" in terms
+    assert {"portfolio", "order", "func"} <= set(terms)
+    assert "how" not in terms
+
+
+def test_exact_identifier_ranks_first():
+    index = BM25Index.from_nodes(DOCS)
+
+    for query, expected in [
+        ("What does rolling_split return?", "split"),
+        ("simulate_from_signal_func_nb arguments", "signal"),
+        ("example of Portfolio.from_order_func", "order"),
+    ]:
+        best, _ = index.search(query, top_k=1)[0]
+        assert index.node_ids[best] == expected
+
+
+def test_persist_and_load_roundtrip(tmp_path):
+    index = BM25Index.from_nodes(DOCS)
+    index.persist(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+
+    assert loaded.search("rolling_split", top_k=2) == index.search("rolling_split", top_k=2)
+    assert loaded.get_node(1).text == DOCS[1].text
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_hybrid_retriever_fuses_dense_and_sparse():
+    dense = MagicMock()
+    dense.retrieve.return_value = [NodeWithScore(node=DOCS[0], score=0.9), NodeWithScore(node=DOCS[2], score=0.8)]
+    sparse = BM25Retriever(BM25Index.from_nodes(DOCS), similarity_top_k=2)
+    retriever = HybridRetriever(dense, sparse, top_n=3)
+
+    results = retriever.retrieve(QueryBundle("Portfolio.from_order_func"))
+
+    # Found by both retrievers, the order function node comes first
+    assert results[0].node.node_id == "order"
+    assert len(results) <= 3
+
+
+def test_chat_wrapper_sends_only_the_question_to_bm25_and_dense():
+    dense = MagicMock()
+    dense.retrieve.return_value = []
+    retriever = HybridRetriever(dense, BM25Retriever(BM25Index.from_nodes(DOCS), similarity_top_k=2), top_n=2)
+
+    class ContextEngine:
+        """Retrieves on its message, like ContextChatEngine."""
+
+        def chat(self, message, chat_history=None):
+            self.nodes = retriever.retrieve(message)
+            return MagicMock(response="A list of windows.")
+
+    engine = ContextEngine()
+    history = [("How does Portfolio.from_order_func work?", "Portfolio.from_order_func calls your order function.")]
+    question = "What does rolling_split return?"
+
+    EnhancedChatWrapper(engine, history, packer=PromptPacker(tokenizer=str.split)).chat(question)
+
+    # Neither the earlier exchange nor the formatting instructions reach the retrievers
+    assert [r.node.node_id for r in engine.nodes] == ["split"]
+    assert dense.retrieve.call_args.args[0].query_str == question
+
+
+def test_updated_replaces_removed_nodes():
+    index = BM25Index.from_nodes(DOCS)
+    new_split = TextNode(id_="split_v2", text="rolling_split now returns a tuple of in-sample and out-of-sample windows.")
+
+    updated = index.updated({"split"}, [new_split])
+
+    assert sorted(updated.node_ids) == ["order", "signal", "sma", "split_v2"]
+    best, _ = updated.search("rolling_split", top_k=1)[0]
+    assert updated.node_ids[best] == "split_v2"
+    assert index.node_ids == [node.node_id for node in DOCS]
@@ -0,0 +1,36 @@
+import pytest
+from unittest.mock import MagicMock
+from openai import RateLimitError
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.llm_manager import managed_stream_request
+
+
+class FlakyStreamingChat:
+    """Custom chat object whose first stream fails before any token."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def astream_chat(self, question):
+        self.calls += 1
+        if self.calls == 1:
+            raise RateLimitError("Rate limit exceeded", response=MagicMock(), body=None)
+        for token in ["Hello", " ", "world"]:
+            yield token
+
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_before_first_token():
+    llm_manager = MagicMock()
+    llm_manager.configurations = [("key1", "model1"), ("key2", "model1")]
+    source = FlakyStreamingChat()
+
+    tokens = [token async for token in managed_stream_request(source, "question", llm_manager)]
+
+    assert tokens == ["Hello", " ", "world"]
+    llm_manager.switch_to_next_config.assert_called_once()
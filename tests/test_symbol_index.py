@@ -0,0 +1,111 @@
+from unittest.mock import MagicMock
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from src.llm_manager import EnhancedChatWrapper
+from src.prompt_packer import PromptPacker
+from src.sparse_index import BM25Index
+from src.symbol_index import SymbolFirstRetriever, SymbolIndex, SymbolRetriever
+
+
+def code_node(node_id, qualified_name, kind, part=1, parts=1):
+    return TextNode(id_=node_id, text=f"source of {qualified_name}", metadata={
+        "qualified_name": qualified_name, "symbol_kind": kind, "signature": "",
+        "part": part, "parts": parts,
+    })
+
+
+NODES = [
+    code_node("pf_module", "vectorbt.portfolio", "module"),
+    code_node("pf", "vectorbt.portfolio.base.Portfolio", "class"),
+    code_node("signals_2", "vectorbt.portfolio.base.Portfolio.from_signals", "method", part=2, parts=2),
+    code_node("signals_1", "vectorbt.portfolio.base.Portfolio.from_signals", "method", part=1, parts=2),
+    code_node("split", "vectorbt.generic.accessors.GenericAccessor.rolling_split", "method"),
+    code_node("sharpe", "vectorbt.returns.accessors.ReturnsAccessor.sharpe_ratio", "method"),
+    TextNode(id_="doc", text="Plain documentation page.", metadata={"file_path": "docs.txt"}),
+]
+
+
+def test_chunk_ids_are_grouped_by_symbol_in_part_order():
+    index = SymbolIndex.from_nodes(NODES)
+
+    assert len(index) == 5
+    assert index.node_ids("vectorbt.portfolio.base.Portfolio.from_signals") == ["signals_1", "signals_2"]
+
+
+def test_match_resolves_aliases_accessors_and_typos():
+    index = SymbolIndex.from_nodes(NODES)
+
+    for query, expected in [
+        ("What does `vbt.Portfolio.from_signals` accept?", "vectorbt.portfolio.base.Portfolio.from_signals"),
+        ("How do I use df.vbt.rolling_split?", "vectorbt.generic.accessors.GenericAccessor.rolling_split"),
+        ("rets.vbt.returns.sharpe_ratio()", "vectorbt.returns.accessors.ReturnsAccessor.sharpe_ratio"),
+        ("What is the Portfolio class?", "vectorbt.portfolio.base.Portfolio"),
+    ]:
+        assert index.match(query) == [(expected, 1.0)]
+
+    [(name, score)] = index.match("Portfolio.from_signal arguments")
+    assert name == "vectorbt.portfolio.base.Portfolio.from_signals" and 0.85 <= score < 1.0
+
+
+def test_plain_questions_do_not_match():
+    index = SymbolIndex.from_nodes(NODES)
+
+    assert index.match("How do I compute a moving average of returns?") == []
+
+
+def test_persist_and_load_roundtrip(tmp_path):
+    SymbolIndex.from_nodes(NODES).persist(str(tmp_path))
+
+    loaded = SymbolIndex.load(str(tmp_path))
+    assert loaded.match("ReturnsAccessor.sharpe_ratio") == [
+        ("vectorbt.returns.accessors.ReturnsAccessor.sharpe_ratio", 1.0)
+    ]
+    assert SymbolIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_symbol_first_retriever_skips_search_and_rerank_on_a_symbol():
+    symbol_retriever = SymbolRetriever(SymbolIndex.from_nodes(NODES), BM25Index.from_nodes(NODES))
+    fallback = MagicMock()
+    fallback.retrieve.return_value = [NodeWithScore(node=NODES[-1], score=0.5)]
+    reranker = MagicMock()
+    reranker.postprocess_nodes.side_effect = lambda nodes, query_bundle: nodes[:1]
+    retriever = SymbolFirstRetriever(symbol_retriever, fallback, [reranker])
+
+    results = retriever.retrieve(QueryBundle("Portfolio.from_signals arguments"))
+    assert [r.node.node_id for r in results] == ["signals_1", "signals_2"]
+    fallback.retrieve.assert_not_called()
+    reranker.postprocess_nodes.assert_not_called()
+
+    results = retriever.retrieve(QueryBundle("How do I compute a moving average?"))
+    assert [r.node.node_id for r in results] == ["doc"]
+    reranker.postprocess_nodes.assert_called_once()
+
+
+def test_chat_wrapper_retrieves_on_the_question_not_the_instructions_or_history():
+    symbol_retriever = SymbolRetriever(SymbolIndex.from_nodes(NODES), BM25Index.from_nodes(NODES))
+    fallback = MagicMock()
+    fallback.retrieve.return_value = [NodeWithScore(node=NODES[-1], score=0.5)]
+    retriever = SymbolFirstRetriever(symbol_retriever, fallback)
+
+    class ContextEngine:
+        """Retrieves on its message, like ContextChatEngine."""
+
+        def chat(self, message, chat_history=None):
+            self.nodes = retriever.retrieve(message)
+            return MagicMock(response="Use df.rolling(window).mean().")
+
+    engine = ContextEngine()
+    history = [("What is vbt.Portfolio?", "`vbt.Portfolio` simulates orders from signals.")]
+    wrapper = EnhancedChatWrapper(engine, history, packer=PromptPacker(tokenizer=str.split))
+
+    wrapper.chat("How do I compute a rolling mean over a DataFrame?")
+    assert [r.node.node_id for r in engine.nodes] == ["doc"]
+
+    wrapper.chat("What does `vbt.Portfolio.from_signals` accept?")
+    assert [r.node.node_id for r in engine.nodes] == ["signals_1", "signals_2"]
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+import pytest
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import telemetry
+from src.executors import BoundedExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = telemetry.Histogram("test_seconds", "Test latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "llm")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="llm",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="llm",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="llm",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="llm"} 4' in lines
+    assert "# TYPE test_seconds histogram" in lines
+
+
+def test_spans_record_their_own_time_in_the_request_trace():
+    trace = telemetry.start_trace("query", kb_id="vectorbt")
+    with telemetry.span("llm"):
+        with telemetry.span("retrieval"):
+            time.sleep(0.05)
+        telemetry.record_tokens("completion", 42)
+    telemetry.record_cache("answer", False)
+
+    summary = trace.finish()
+    # Le temps de la sous-étape n'est pas compté deux fois
+    assert summary["stages_ms"]["retrieval"] >= 50
+    assert summary["stages_ms"]["llm"] < 50
+    assert summary["kb_id"] == "vectorbt"
+    assert summary["completion_tokens"] == 42
+    assert summary["answer_cache_hit"] is False
+    # Une seule observation par requête
+    assert trace.finish() is None
+
+
+@pytest.mark.asyncio
+async def test_spans_in_executor_threads_join_the_trace():
+    executor = BoundedExecutor("test", ThreadPoolExecutor(max_workers=1), max_pending=1, copy_context=True)
+
+    def retrieve():
+        with telemetry.span("retrieval", retrieved=3):
+            return "nodes"
+
+    trace = telemetry.start_trace("query")
+    assert await executor.run(retrieve) == "nodes"
+    executor.shutdown()
+
+    summary = trace.finish()
+    assert "retrieval" in summary["stages_ms"]
+    assert summary["retrieved"] == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_have_separate_traces():
+    async def request(name):
+        trace = telemetry.start_trace(name)
+        with telemetry.span("llm"):
+            await asyncio.sleep(0.01)
+        return trace.finish()
+
+    first, second = await asyncio.gather(asyncio.create_task(request("a")), asyncio.create_task(request("b")))
+    assert list(first["stages_ms"]) == ["llm"]
+    assert list(second["stages_ms"]) == ["llm"]
+
+
+def test_gauges_skip_non_numeric_values_and_group_by_label():
+    lines = telemetry.render_gauges("executor", {
+        "io": {"pending": 2, "max_pending": 64},
+        "cpu": {"pending": 0, "max_pending": 8},
+    }, label="pool")
+
+    assert lines.count("# TYPE rag_executor_pending gauge") == 1
+    assert 'rag_executor_pending{pool="io"} 2' in lines
+    assert 'rag_executor_max_pending{pool="cpu"} 8' in lines
+    assert telemetry.render_gauges("sessions", {"backend": "sqlite", "entries": 3}) == [
+        "# TYPE rag_sessions_entries gauge",
+        "rag_sessions_entries 3",
+    ]
+
+
+def test_render_ends_with_a_newline_and_includes_extra_lines():
+    text = telemetry.render(["rag_custom 1"])
+    assert text.endswith("rag_custom 1\n")
+    assert "# TYPE rag_stage_seconds histogram" in text
+
+
+def test_debug_messages_are_not_formatted_when_disabled():
+    telemetry.configure_logging("INFO")
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("formatted")
+
+    telemetry.get_logger("test").debug("value: %s", Expensive())
+    assert not telemetry.get_logger("test").isEnabledFor(logging.DEBUG)
@@ -0,0 +1,71 @@
+import random
+
+# Make sure the app path is added to sys.path
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.text_cleaner import (
+    alpha_ratio,
+    clean_extracted_text,
+    clean_scraped_text,
+    printable_ratio,
+)
+
+SENTENCE = "Momentum strategies earn abnormal returns over twelve month horizons."
+
+
+def test_line_filter_runs_per_line():
+    # Les sauts de ligne ne sont plus remplacés avant le filtre : seules les
+    # lignes d'artefacts numériques disparaissent
+    text, reason = clean_extracted_text(f"{SENTENCE}\n12.3 45.6 78.9 10.1 11.2\n{SENTENCE}")
+
+    assert reason is None
+    assert text == f"{SENTENCE}\n{SENTENCE}"
+
+
+def test_removes_pdf_and_latex_artifacts():
+    raw = (
+        f"{SENTENCE} <image: chart> [Image 3]\n"
+        "Figure 2: cumulative returns\n"
+        f"Return is $$r_t = p_t / p_{{t-1}}$$ with $\\alpha$ and \\textbf{{bold}} \\cite text.\t\t{SENTENCE}"
+    )
+    text, _ = clean_extracted_text(raw)
+
+    assert "image" not in text.lower()
+    assert "Figure 2" not in text
+    assert "[EQUATION]" in text and "[MATH]" in text
+    assert "\\" not in text and "\t" not in text and "  " not in text
+
+
+def test_control_characters_removed_and_spaces_normalized():
+    text, _ = clean_extracted_text(f"{SENTENCE}\x01\x85{SENTENCE}  end\x0b")
+
+    assert text == f"{SENTENCE} {SENTENCE} end"
+
+
+def test_rejected_documents_give_a_reason():
+    assert clean_extracted_text("") == (None, "empty document")
+    assert clean_extracted_text("a\x00" * 20) == (None, "null bytes")
+    assert clean_extracted_text("short") == (None, "too short")
+    assert clean_extracted_text("1234567890 " * 10)[1] == "too short after cleaning"
+    assert clean_extracted_text(SENTENCE + "​" * 40)[1] == "too many non-printable characters"
+    assert clean_extracted_text(SENTENCE + "\ud800")[1] == "invalid unicode characters"
+
+
+def test_ratios_match_per_character_definitions():
+    rng = random.Random(0)
+    alphabet = "ab1 _éΩ–“ﬁ日\t.-x́​😀"
+    for _ in range(500):
+        s = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 40)))
+        assert alpha_ratio(s) == sum(c.isalpha() for c in s) / len(s)
+        assert abs(printable_ratio(s) - sum(c.isprintable() or c.isspace() for c in s) / len(s)) < 1e-12
+
+
+def test_clean_scraped_text():
+    raw = (
+        "Portfolio\r\nclass\nfrom_signals(close)\n>>> pf = vbt.Portfolio.from_signals(close)\n"
+        "Simulate ¶ signals.<locals>.run\n\n\n\nNext   paragraph"
+    )
+
+    assert clean_scraped_text(raw) == "Portfolio from_signals(close) Simulatesignalsrun\n\nNext paragraph"